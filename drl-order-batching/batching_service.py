@@ -0,0 +1,345 @@
+'''
+Code for an online batching decision service around the state, action and batching logic of the simulation model
+
+The service receives order arrivals and resource releases from the WMS and answers next batch requests of free
+pickers and shuttles with a sequencing policy (a trained PPO2 model or a heuristic) and a batching heuristic.
+Messages are JSON objects, one per line, over a TCP socket. Every message gets one response line:
+
+    {"type": "order", "orderID": 1, "arrival_time": 54000.0, "comp": "MIO", "nItems_ptg": 2, "nItems_gtp": 0,
+     "skuIDlist": [12, 40], "cutoff_time": 64800.0}
+    {"type": "next_batch", "station": "PtG", "time": 54010.0}
+    {"type": "release", "batch": 3, "time": 54100.0, "done": true}
+    {"type": "done", "batch": 3, "time": 54300.0}
+    {"type": "stats"}
+
+Usage:
+    python batching_service.py --scenario scenario_2 --policy edd --batching BOC
+    python batching_service.py --policy trained_models/scenario_2/V001_second_run --latency-budget 0.05
+'''
+from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from order_generator import COLUMNS
+from numpy_policy import NumpyPolicy
+import pandas as pd
+import numpy as np
+import concurrent.futures
+import collections
+import argparse
+import asyncio
+import bisect
+import json
+import time
+
+# Order classes of the state representation, the order category is 3 * class + earliness band
+ORDER_CLASSES = ['sio_ptg', 'sio_gtp', 'mio_ptg', 'mio_gtp', 'mio_ptg_gtp']
+
+# Pick-by-order action of every order class, used when a decision does not finish within the latency budget
+CLASS_ACTION = {0: 0, 1: 2, 2: 4, 3: 6, 4: 9}
+
+# Station where a batch starts for every route of the simulation model
+ROUTE_STATION = {1: 'PtG', 2: 'PtG', 3: 'PtG', 6: 'PtG', 4: 'GtP', 5: 'GtP'}
+
+# Heuristics of the simulation model that choose an action from the state representation
+SEQUENCING_HEURISTICS = {'edd': 'edd_sequencing', 'custom': 'custom_heuristic', 'random': 'random_policy'}
+
+
+def order_class(comp, nItems_ptg, nItems_gtp):
+    # Same split as build_state_representation, orders that fit no class return None
+    if nItems_ptg > 0 and nItems_gtp == 0:
+        return 0 if comp == 'SIO' else 2
+    if nItems_ptg == 0 and nItems_gtp > 0:
+        return 1 if comp == 'SIO' else 3
+    if nItems_ptg > 0 and nItems_gtp > 0 and comp == 'MIO':
+        return 4
+    return None
+
+
+class CategoryIndex:
+    '''
+    Open orders per order class, sorted on cutoff time. The earliness band of an order changes with the time, so
+    the 15 order categories of the state representation are found with a binary search on the band boundaries
+    (cutoff within 15 minutes, within 40 minutes, later) instead of filtering all open orders at every request.
+    The sort keys hold the order rows, a slice of the keys is a snapshot of a category.
+    '''
+
+    def __init__(self):
+        self.keys = [[] for order_class in ORDER_CLASSES]
+        self.positions = {}
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, row):
+        order_id = row[1]
+        c = order_class(row[3], row[4], row[5])
+        if c is None:
+            raise ValueError('order {0} fits no order category'.format(order_id))
+        if order_id in self.positions:
+            raise ValueError('order {0} is already open'.format(order_id))
+
+        key = (row[7], self.counter, row)
+        self.counter += 1
+        bisect.insort(self.keys[c], key)
+        self.positions[order_id] = (c, key)
+
+    def remove(self, order_ids):
+        for order_id in order_ids:
+            c, key = self.positions.pop(order_id)
+            keys = self.keys[c]
+            del keys[bisect.bisect_left(keys, key)]
+
+    def bands(self, c, t):
+        keys = self.keys[c]
+        e1_end = bisect.bisect_right(keys, (t + 15 * 60, float('inf')))
+        e3_start = bisect.bisect_left(keys, (t + 40 * 60,))
+        return [(0, e1_end), (e1_end, e3_start), (e3_start, len(keys))]
+
+    def counts(self, t):
+        return [end - start for c in range(len(ORDER_CLASSES)) for start, end in self.bands(c, t)]
+
+    def snapshot(self, t):
+        return [self.keys[c][start:end] for c in range(len(ORDER_CLASSES)) for start, end in self.bands(c, t)]
+
+    def earliest(self, c):
+        return self.keys[c][0][2] if len(self.keys[c]) > 0 else None
+
+
+class BatchingService:
+    '''
+    Keeps the open orders, the batches in progress and the KPIs of the warehouse and answers next batch requests.
+
+    A decision builds the state representation from the category index, lets the policy choose an action and
+    applies action_to_orders, the batching heuristic and select_picking_order of the solver simulation to a snapshot
+    of the order categories. Decisions run in a single worker thread that owns the solver simulation and its
+    batching state (batch list, GVNS engine, batch planner, profiler), the simulation of the service is only read
+    by the event loop. When a decision does not return within the latency budget the earliest cutoff order for the
+    free station is picked by order instead and the late result is discarded. A thread cannot be cancelled, so
+    while a late decision is still running new requests are answered with the fallback instead of queueing behind
+    it. Orders and batches are only changed by the event loop.
+
+    Args:
+            config (dict): scenario config
+            policy (str): 'edd', 'custom' or 'random', or the path of a trained PPO2 model (zip or exported npz)
+            batching (str): batching heuristic of the simulation model (LST, BOC, GRASP_VND, GRASP_MS, GVNS or None)
+            latency_budget (float): maximum time in seconds to answer a next batch request
+    '''
+
+    def __init__(self, config, policy='edd', batching='BOC', latency_budget=0.05):
+        self.config = config
+        self.policy = policy
+        self.latency_budget = latency_budget
+        self.sim = WAREHOUSESimulation(config, pd.DataFrame(columns=COLUMNS), config['environment']['t_start'],
+                                       (1, 1), batching)
+        self.solver = WAREHOUSESimulation(config, pd.DataFrame(columns=COLUMNS), config['environment']['t_start'],
+                                          (1, 1), batching)
+
+        self.model = None
+        if policy not in SEQUENCING_HEURISTICS:
+            self.model = NumpyPolicy.load(policy)
+
+        self.index = CategoryIndex()
+        self.empty_frame = pd.DataFrame(columns=COLUMNS)
+        self.batches = {}
+        self.batch_counter = 0
+        self.in_flight = {'PtG': 0, 'GtP': 0}
+        self.virtual_q = {'PtG': self.sim.virtual_q_ptg, 'GtP': self.sim.virtual_q_gtp}
+        self.finished_orders = 0
+        self.tardy_orders = 0
+        self.t = config['environment']['t_start']
+
+        self.decisions = 0
+        self.waits = 0
+        self.fallbacks = 0
+        self.busy = 0
+        self.latencies = collections.deque(maxlen=10000)
+
+        # One decision at a time, pending is the decision that runs in the worker thread
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.lock = None
+
+    def state(self, t, station=None):
+        # Resources of the other station are reported as busy, so the policy picks work for the free station
+        available = [1 if self.virtual_q[s] - self.in_flight[s] >= 1 and station in (None, s) else 0
+                     for s in ['PtG', 'GtP']]
+        return self.index.counts(t) + available + [self.finished_orders, self.tardy_orders, t]
+
+    def add_order(self, message):
+        row = (message.get('Unnamed: 0', message['orderID']), message['orderID'], float(message['arrival_time']),
+               message['comp'], int(message['nItems_ptg']), int(message['nItems_gtp']),
+               tuple(message['skuIDlist']), float(message['cutoff_time']))
+        self.index.add(row)
+        self.t = max(self.t, row[2])
+        return {'ok': True, 'open_orders': len(self.index)}
+
+    def decide(self, state, snapshot, t):
+        # Runs in the worker thread on the solver simulation, nothing of the service is changed here
+        sim = self.solver
+        if self.model is not None:
+            # Infeasible actions are masked, so the policy only chooses actions that can be executed
+            action = int(self.model.predict(sim.clip_state(state), deterministic=True,
+                                            mask=sim.available_actions(state))[0])
+        else:
+            action = getattr(sim, SEQUENCING_HEURISTICS[self.policy])(state)
+        if action == 10:
+            return action, None, None
+
+        # Only the categories of the action are used by action_to_orders and the batching heuristics
+        sim.order_categories = [self.empty_frame] * len(snapshot)
+        for category in sim.action_category_mapping[action]:
+            sim.order_categories[category] = pd.DataFrame([key[2] for key in snapshot[category]], columns=COLUMNS)
+
+        picking_order, picking_items, order_category, all_picking_items = sim.action_to_orders(action)
+        picking_items = sim.batch_orders(action, picking_items, all_picking_items, t)
+        picking_order, picking_items = sim.select_picking_order(action, picking_items)
+
+        # action_to_orders can add an order once for every SKU it shares with the first order of a batch
+        return action, picking_order, list(dict.fromkeys(picking_items['orderID'].tolist()))
+
+    def fallback(self, state, station):
+        # Pick-by-order of the open order with the earliest cutoff time that can start at a free station
+        best = None
+        for c, action in CLASS_ACTION.items():
+            row = self.index.earliest(c)
+            route = self.sim.action_route_mapping[action]
+            available = state[15] if ROUTE_STATION[route] == 'PtG' else state[16]
+            if row is not None and available > 0 and (best is None or row[7] < best[1][7]):
+                best = (action, row)
+        if best is None:
+            return 10, None, None
+        action, row = best
+        return action, [row[7], 1, row[4], row[5], self.sim.action_route_mapping[action]], [row[1]]
+
+    async def next_batch(self, message):
+        t_request = time.perf_counter()
+        t = float(message.get('time', self.t))
+        self.t = max(self.t, t)
+        station = message.get('station')
+
+        async with self.lock:
+            state = self.state(t, station)
+            fallback = False
+            if self.pending is not None and not self.pending.done():
+                # A late decision still runs on the solver, this request waits for it within its own budget
+                await asyncio.wait([asyncio.wrap_future(self.pending)],
+                                   timeout=max(self.latency_budget - (time.perf_counter() - t_request), 0))
+            if self.pending is not None and not self.pending.done():
+                action, picking_order, order_ids = self.fallback(state, station)
+                fallback = True
+                self.busy += 1
+            else:
+                self.pending = self.executor.submit(self.decide, state, self.index.snapshot(t), t)
+                try:
+                    # A running thread ignores the cancel of the timeout, the decision is discarded when it returns
+                    action, picking_order, order_ids = await asyncio.wait_for(
+                        asyncio.wrap_future(self.pending),
+                        max(self.latency_budget - (time.perf_counter() - t_request), 0))
+                except asyncio.TimeoutError:
+                    action, picking_order, order_ids = self.fallback(state, station)
+                    fallback = True
+
+            latency = time.perf_counter() - t_request
+            self.latencies.append(latency)
+            self.decisions += 1
+            self.fallbacks += fallback
+            if action == 10:
+                self.waits += 1
+                return {'action': 10, 'latency_ms': latency * 1000, 'fallback': fallback}
+
+            # Commit the batch: remove its orders from the index and occupy the start station
+            cutoff_time, nOrders, nItems_ptg, nItems_gtp, route = picking_order
+            self.index.remove(order_ids)
+            self.batch_counter += 1
+            self.batches[self.batch_counter] = {'station': ROUTE_STATION[route], 'nOrders': nOrders,
+                                                'cutoff_time': cutoff_time, 'released': False}
+            self.in_flight[ROUTE_STATION[route]] += 1
+
+        return {'action': action, 'batch': self.batch_counter, 'orders': order_ids,
+                'station': ROUTE_STATION[route], 'route': route, 'cutoff_time': float(cutoff_time),
+                'nOrders': int(nOrders), 'nItems_ptg': int(nItems_ptg), 'nItems_gtp': int(nItems_gtp),
+                'latency_ms': latency * 1000, 'fallback': fallback}
+
+    def release(self, message):
+        batch = self.batches[message['batch']]
+        if not batch['released']:
+            batch['released'] = True
+            self.in_flight[batch['station']] -= 1
+        if message.get('done', False):
+            return self.done(message)
+        return {'ok': True}
+
+    def done(self, message):
+        # The batch left the system, a batch is tardy when it finishes after the earliest cutoff time of its orders
+        batch = self.batches.pop(message['batch'])
+        if not batch['released']:
+            self.in_flight[batch['station']] -= 1
+        t = float(message.get('time', self.t))
+        self.finished_orders += batch['nOrders']
+        if batch['cutoff_time'] < t:
+            self.tardy_orders += batch['nOrders']
+        return {'ok': True}
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 95, 99]).tolist() if len(latencies) > 0 else [0, 0, 0]
+        return {'open_orders': len(self.index), 'open_batches': len(self.batches), 'in_flight': self.in_flight,
+                'finished_orders': self.finished_orders, 'tardy_orders': self.tardy_orders,
+                'decisions': self.decisions, 'waits': self.waits, 'fallbacks': self.fallbacks, 'busy': self.busy,
+                'latency_p50_ms': percentiles[0],
+                'latency_p95_ms': percentiles[1], 'latency_p99_ms': percentiles[2],
+                'latency_max_ms': float(latencies.max()) if len(latencies) > 0 else 0}
+
+    async def handle(self, message):
+        typ = message.get('type')
+        if typ == 'order':
+            return self.add_order(message)
+        elif typ == 'next_batch':
+            return await self.next_batch(message)
+        elif typ == 'release':
+            return self.release(message)
+        elif typ == 'done':
+            return self.done(message)
+        elif typ == 'stats':
+            return self.stats()
+        raise ValueError('unknown message type {0}'.format(typ))
+
+    async def handle_connection(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                response = await self.handle(json.loads(line))
+            except (ValueError, KeyError) as error:
+                response = {'error': repr(error)}
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        self.lock = asyncio.Lock()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print('Batching service listening on {0}:{1}'.format(host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online batching decision service')
+    parser.add_argument('--scenario', default='scenario_2')
+    parser.add_argument('--policy', default='edd', help='edd, custom, random or the path of a PPO2 model')
+    parser.add_argument('--batching', default='BOC', help='LST, BOC, GRASP_VND, GRASP_MS, GVNS or None')
+    parser.add_argument('--latency-budget', type=float, default=0.05, help='seconds')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    config = ScenarioConfig.load(args.scenario)
+    batching = None if args.batching == 'None' else args.batching
+    service = BatchingService(config, args.policy, batching, args.latency_budget)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+'''
+Code for benchmarking the hot paths of the simulation model on synthetic order data
+
+Usage:
+    python benchmark.py                                   # run all benchmarks, save json in benchmark_results/
+    python benchmark.py --scales 1000 6500                # only run the given scales
+    python benchmark.py --compare benchmark_results/baseline.json --threshold 0.2
+'''
+from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from order_generator import OrderGenerator
+import pandas as pd
+import numpy as np
+import contextlib
+import argparse
+import platform
+import random
+import json
+import time
+import io
+import os
+
+# Scenario that is simulated at every scale, the config throughput is set to the scale
+SCALES = {1000: 'scenario_2', 6500: 'scenario_2', 50000: 'scenario_day'}
+EPISODE_SCALES = [1000, 6500]  # full episodes at 50k orders take too long for a routine benchmark run
+SEED = 42
+STEP_DECISIONS = 1000  # decisions per repeat of the step overhead benchmarks
+SIMILARITY_SKUS = 300000  # assortment of the similarity index benchmarks
+LSH_SETTINGS = [(16, 1), (16, 2), (8, 4)]  # (bands, rows) of the similarity index, more rows retrieve less
+
+
+def synthetic_orders(n, time_window, seed=SEED, n_skus=2000):
+    return OrderGenerator(n_skus=n_skus, seed=seed).generate(n, time_window)
+
+
+def load_config(scenario, n):
+    return ScenarioConfig.load(scenario).replace('environment', throughput=n)
+
+
+def timeit(function, repeats, budget=5.0):
+    # Run at least once and at most repeats times, stop earlier when the time budget is spent
+    times = []
+    t_budget = time.perf_counter()
+    for repeat in range(repeats):
+        random.seed(SEED + repeat)
+        np.random.seed(SEED + repeat)
+        t = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t)
+        if time.perf_counter() - t_budget > budget:
+            break
+    return {'mean_s': float(np.mean(times)), 'min_s': float(np.min(times)), 'repeats': len(times)}
+
+
+def make_sim(config, data):
+    random.seed(SEED)
+    np.random.seed(SEED)
+    return WAREHOUSESimulation(config, data, config['environment']['t_start'], (1, 1), None)
+
+
+def run_episode(config, data, heuristic):
+    sim = WAREHOUSESimulation(config, data, config['environment']['t_start'], (1, 1), heuristic)
+    state_rep = sim.get_state()
+    steps = 0
+    while not sim.check_termination():
+        action = sim.edd_sequencing(state_rep)
+        sim.get_reward(action)
+        state_rep = sim.simulate(action)
+        steps += 1
+    return steps
+
+
+def separate_steps(sim, action, decisions):
+    for decision in range(decisions):
+        state = sim.get_state()
+        feasibility = sim.check_action(action, state)
+        sim.get_reward(action)
+        if feasibility:
+            state = sim.simulate(action)
+        sim.check_termination()
+        sim.available_actions(state)
+
+
+def fused_steps(sim, action, decisions):
+    for decision in range(decisions):
+        sim.step(action)
+
+
+def benchmark_scale(n, repeats, results):
+    scenario = SCALES[n]
+    config = load_config(scenario, n)
+    t_start = config['environment']['t_start']
+    data = synthetic_orders(n, config['environment']['time_window'])
+    data = data.sort_values(by='cutoff_time', ascending=True)
+    prefix = str(n) + '/'
+
+    sim = make_sim(config, data)
+    results[prefix + 'build_state_representation'] = timeit(
+        lambda: sim.build_state_representation(sim.order_data, t_start), repeats)
+
+    for action in range(10):
+        if any(len(sim.order_categories[i]) > 0 for i in sim.action_category_mapping[action]):
+            results[prefix + 'action_to_orders/' + str(action)] = timeit(lambda: sim.action_to_orders(action),
+                                                                          repeats)
+
+    # Batching heuristics for the PtG pick-by-batch actions
+    for action in [1, 5]:
+        if not any(len(sim.order_categories[i]) > 1 for i in sim.action_category_mapping[action]):
+            continue
+        picking_order, picking_items, order_category, all_picking_items = sim.action_to_orders(action)
+        if len(picking_items) < 2:
+            # The heuristics only batch when the candidate batch has more than one order
+            picking_items = all_picking_items.iloc[0:sim.max_batchsize_ptg]
+        results[prefix + 'LST_batching/' + str(action)] = timeit(
+            lambda: sim.LST_batching(action, picking_items, t_start), repeats)
+        results[prefix + 'boc_batching/' + str(action)] = timeit(
+            lambda: sim.boc_batching(action, picking_items, all_picking_items), repeats)
+        results[prefix + 'grasp_vnd/' + str(action)] = timeit(
+            lambda: sim.grasp_vnd(action, picking_items, all_picking_items, t_start), repeats)
+        results[prefix + 'GVNS_batching/' + str(action)] = timeit(
+            lambda: sim.GVNS_batching(action, picking_items, all_picking_items), repeats)
+        # The first call builds the plan of the category, the next calls repair it (the popped batch is still in
+        # the frame, so it is inserted again) and pop a batch, the cost of a planned decision
+        results[prefix + 'planned_batching/' + str(action)] = timeit(
+            lambda: sim.planned_batching(action, picking_items, all_picking_items), repeats)
+
+    # Wait action on a warm system: dispatch orders with EDD until resources are busy, then time the waits
+    sim = make_sim(config, data)
+    state_rep = sim.get_state()
+    for step in range(200):
+        action = sim.edd_sequencing(state_rep)
+        if action == 10:
+            break
+        state_rep = sim.simulate(action)
+    results[prefix + 'simulate_wait'] = timeit(lambda: sim.simulate(10), repeats * 20)
+
+    # Per-step overhead of the environment around the transition, on the warm system with an infeasible action so
+    # nothing is simulated: separate calls as WAREHOUSE.step made them (get_state, check_action, get_reward,
+    # check_termination and the available_actions of the policy mask) against the fused sim.step
+    action = sim.action_mask(sim.state_representation).index(0)
+    results[prefix + 'step_overhead/separate'] = timeit(lambda: separate_steps(sim, action, STEP_DECISIONS), repeats)
+    results[prefix + 'step_overhead/fused'] = timeit(lambda: fused_steps(sim, action, STEP_DECISIONS), repeats)
+
+    # Episode as in simulation_control.py: EDD sequencing with BOC batching, and with the batch plans of PLAN
+    if n in EPISODE_SCALES:
+        results[prefix + 'episode'] = timeit(lambda: run_episode(config, data, 'BOC'), 1)
+        results[prefix + 'episode_PLAN'] = timeit(lambda: run_episode(config, data, 'PLAN'), 1)
+
+    benchmark_similarity(n, scenario, repeats, results)
+    benchmark_reset(n, scenario, repeats, results)
+
+
+def skus_per_order(batch):
+    # Unique SKUs of a batch per order, the pick movements per order of a PtG batch
+    return len(set(sku for sku_list in batch['skuIDlist'] for sku in sku_list)) / len(batch)
+
+
+def benchmark_similarity(n, scenario, repeats, results):
+    # BOC batching and MIO batches of action_to_orders with exact similarity and with the MinHash/LSH index, on a
+    # large assortment. Batch quality is compared on the unique SKUs per order and on the batch of exact similarity
+    config = load_config(scenario, n)
+    data = synthetic_orders(n, config['environment']['time_window'], n_skus=SIMILARITY_SKUS)
+    data = data.sort_values(by='cutoff_time', ascending=True)
+    prefix = str(n) + '/similarity/'
+
+    sims = {'exact': make_sim(config, data)}
+    for bands, rows in LSH_SETTINGS:
+        lsh_config = config.replace('simulation', similarity_index=True, lsh_bands=bands, lsh_rows=rows)
+        name = 'lsh_{0}x{1}'.format(bands, rows)
+        results[prefix + name + '/index'] = timeit(lambda: make_sim(lsh_config, data), 1)
+        sims[name] = make_sim(lsh_config, data)
+
+    for action in [1, 5]:
+        if not any(len(sims['exact'].order_categories[i]) > 1 for i in sims['exact'].action_category_mapping[action]):
+            continue
+        exact_batch = None
+        for name, sim in sims.items():
+            all_picking_items = sim.action_to_orders(action)[3]
+            result = timeit(lambda: sim.boc_batching(action, all_picking_items, all_picking_items), repeats)
+            batch = sim.boc_batching(action, all_picking_items, all_picking_items)
+            exact_batch = batch if exact_batch is None else exact_batch
+            result['skus_per_order'] = skus_per_order(batch)
+            result['same_batch'] = batch['orderID'].tolist() == exact_batch['orderID'].tolist()
+            results[prefix + name + '/boc_batching/' + str(action)] = result
+
+    if any(len(sims['exact'].order_categories[i]) > 0 for i in sims['exact'].action_category_mapping[5]):
+        for name, sim in sims.items():
+            results[prefix + name + '/action_to_orders/5'] = timeit(lambda: sim.action_to_orders(5), repeats)
+
+
+def benchmark_reset(n, scenario, repeats, results):
+    # The gym environment needs gym and tensorflow, the benchmark is skipped when these are not installed
+    try:
+        from drl_env import WAREHOUSE
+    except ImportError as error:
+        results[str(n) + '/WAREHOUSE.reset'] = {'skipped': str(error)}
+        return
+
+    config = load_config(scenario, n)
+    data = synthetic_orders(max(2 * n, config['environment']['throughput']), config['environment']['time_window'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        env = WAREHOUSE(params=(1, 1), scenario=scenario, order_data=data)
+        env.n = n
+        results[str(n) + '/WAREHOUSE.reset'] = timeit(env.reset, repeats)
+
+
+def compare(results, baseline_file, threshold):
+    # A benchmark regresses when its best time is more than threshold slower than the baseline
+    with open(baseline_file) as file:
+        baseline = json.load(file)['results']
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or 'min_s' not in result or 'min_s' not in baseline[name]:
+            continue
+        ratio = result['min_s'] / baseline[name]['min_s']
+        status = 'REGRESSION' if ratio > 1 + threshold else 'ok'
+        print('{0:<45} {1:>12.6f} {2:>12.6f} {3:>8.2f}x {4}'.format(name, baseline[name]['min_s'],
+                                                                     result['min_s'], ratio, status))
+        if status == 'REGRESSION':
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the simulation model')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES.keys()))
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--output', default='benchmark_results')
+    parser.add_argument('--compare', default=None, help='json file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a regression')
+    args = parser.parse_args()
+
+    results = {}
+    for n in args.scales:
+        print('Benchmarking {0} orders'.format(n))
+        benchmark_scale(n, args.repeats, results)
+
+    run = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                    'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+                    'seed': SEED, 'scales': args.scales},
+           'results': results}
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, time.strftime('%Y%m%d_%H%M%S') + '.json')
+    with open(output_file, 'w') as file:
+        json.dump(run, file, indent=2)
+    print('Results saved to', output_file)
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.threshold)
+        if len(regressions) > 0:
+            print('{0} benchmarks regressed more than {1:.0%}'.format(len(regressions), args.threshold))
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+'''
+Code for a training driver that saves periodic checkpoints, resumes after a crash and logs throughput telemetry
+'''
+from stable_baselines import PPO2
+from stable_baselines.common.policies import MlpPolicy
+from stable_baselines.common.vec_env import DummyVecEnv, VecEnvWrapper
+from drl_env import WAREHOUSE
+import tensorflow as tf
+import numpy as np
+import random
+import pickle
+import time
+import csv
+import os
+
+
+class ResumableVecEnv(VecEnvWrapper):
+    '''
+    The PPO2 runner resets its environments when it is created. After restoring a checkpoint the environments are
+    in the middle of an episode, so the first reset returns the observations stored in the checkpoint instead.
+    The end time of the last step marks the end of a rollout for the telemetry.
+    '''
+
+    def __init__(self, venv, obs=None):
+        VecEnvWrapper.__init__(self, venv)
+        self.resume_obs = obs
+        self.t_last_step = None
+
+    def reset(self):
+        if self.resume_obs is not None:
+            obs = self.resume_obs
+            self.resume_obs = None
+            return obs
+        return self.venv.reset()
+
+    def step_wait(self):
+        result = self.venv.step_wait()
+        self.t_last_step = time.perf_counter()
+        return result
+
+
+class TelemetryCallback:
+    '''
+    Measures every rollout how the wall-clock time is spent: simulation steps, environment resets, policy
+    evaluations and gradient updates. Results and the environment attributes listed in the config are appended
+    to a csv file and written to TensorBoard when a log directory is set. Every save_every steps the driver
+    saves a checkpoint.
+
+    This is the callback(locals_, globals_) of stable-baselines 2.9, PPO2.learn calls it after the update of every
+    rollout. The rollout ends at the last environment step, the time after it is spent in the update.
+    '''
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.start_rollout()
+
+    def env_totals(self):
+        envs = self.driver.envs
+        return (sum(env.sim_time_total for env in envs), sum(env.reset_time_total for env in envs),
+                sum(env.resets for env in envs))
+
+    def start_rollout(self):
+        self.t_rollout_start = time.perf_counter()
+        self.sim_time_start, self.reset_time_start, self.resets_start = self.env_totals()
+
+    def __call__(self, locals_, globals_):
+        model = locals_['self']
+        now = time.perf_counter()
+        t_rollout_end = self.driver.venv.t_last_step or now
+        rollout_time = max(t_rollout_end - self.t_rollout_start, 1e-9)
+        sim_time, reset_time, resets = self.env_totals()
+        sim_time -= self.sim_time_start
+        reset_time -= self.reset_time_start
+        resets -= self.resets_start
+        steps = model.n_batch
+
+        # The environments run sequentially in this process, the remaining rollout time is spent in the policy
+        row = {'num_timesteps': model.num_timesteps,
+               'env_steps_per_sec': steps / rollout_time,
+               'sim_time_per_step': sim_time / steps,
+               'policy_time_per_step': max(rollout_time - sim_time - reset_time, 0) / steps,
+               'reset_time': reset_time / resets if resets > 0 else 0,
+               'update_time': now - t_rollout_end}
+        for attribute in self.driver.logs:
+            row[attribute] = float(np.mean([getattr(env, attribute) for env in self.driver.envs]))
+        self.driver.log(row, locals_.get('writer'))
+
+        # Checkpoints are taken between the update of this rollout and the start of the next one, at this point
+        # the model parameters, runner observations and random generators are consistent
+        if model.num_timesteps >= self.driver.next_save:
+            self.driver.save_checkpoint(model, locals_['runner'])
+        self.start_rollout()
+        return True
+
+
+class TrainingDriver:
+    '''
+    Trains a PPO2 agent on the simulation environment according to the main section of a scenario config:
+    n_workers parallel environments, n_steps training steps in total and a checkpoint every save_every steps.
+    A checkpoint contains the model, the pickled environments, the last observations of the runner and the
+    state of the python and numpy random generators, so an interrupted job continues where it stopped. The done
+    flags of the runner are not stored, with a feed-forward policy they only set the masks of recurrent policies.
+    Tensorflow samples actions with op-level seeds, these are re-seeded from the seed and the step of the
+    checkpoint.
+    '''
+
+    def __init__(self, path, params=(1, 1), heuristic=None, scenario='scenario_2', seed=0, tensorboard_log=None):
+        self.path = path
+        self.params = params
+        self.heuristic = heuristic
+        self.scenario = scenario
+        self.seed = seed
+        self.tensorboard_log = tensorboard_log
+
+        self.checkpoint_path = os.path.join(self.path, 'checkpoints')
+        self.telemetry_file = os.path.join(self.path, 'telemetry.csv')
+        os.makedirs(self.checkpoint_path, exist_ok=True)
+
+        self.config = WAREHOUSE.load_config(self.scenario)
+        self.save_every = self.config['main']['save_every']
+        self.logs = list(dict.fromkeys(self.config['main']['logs'] + self.config['environment']['logs']))
+
+        self.envs = []
+        self.venv = None
+        self.model = None
+        self.next_save = 0
+
+    def make_envs(self):
+        # Every worker gets its own environment instance, all instances share the compiled config
+        return [WAREHOUSE(params=self.params, heuristic=self.heuristic, scenario=self.config)
+                for worker in range(self.config['main']['n_workers'])]
+
+    def latest_checkpoint(self):
+        try:
+            with open(os.path.join(self.checkpoint_path, 'latest')) as file:
+                return os.path.join(self.checkpoint_path, file.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def save_checkpoint(self, model, runner):
+        name = 'step_' + str(model.num_timesteps)
+        checkpoint = os.path.join(self.checkpoint_path, name)
+        os.makedirs(checkpoint, exist_ok=True)
+
+        model.save(os.path.join(checkpoint, 'model.zip'))
+        state = {'envs': self.envs,
+                 'obs': runner.obs.copy(),
+                 'num_timesteps': model.num_timesteps,
+                 'next_save': self.next_save + self.save_every,
+                 'random_state': random.getstate(),
+                 'numpy_state': np.random.get_state()}
+        with open(os.path.join(checkpoint, 'state.pkl'), 'wb') as file:
+            pickle.dump(state, file)
+
+        # Only point to the new checkpoint once it is complete
+        with open(os.path.join(self.checkpoint_path, 'latest.tmp'), 'w') as file:
+            file.write(name)
+        os.replace(os.path.join(self.checkpoint_path, 'latest.tmp'), os.path.join(self.checkpoint_path, 'latest'))
+
+        self.next_save = state['next_save']
+        print('Checkpoint saved at {0} steps'.format(model.num_timesteps))
+
+    def setup(self):
+        checkpoint = self.latest_checkpoint()
+
+        if checkpoint is None:
+            random.seed(self.seed)
+            np.random.seed(self.seed)
+            self.envs = self.make_envs()
+            env = ResumableVecEnv(DummyVecEnv([lambda env=env: env for env in self.envs]))
+            model = PPO2(MlpPolicy, env, verbose=0, seed=self.seed, tensorboard_log=self.tensorboard_log)
+            model.gamma = 0.999999
+            self.next_save = self.save_every
+        else:
+            with open(os.path.join(checkpoint, 'state.pkl'), 'rb') as file:
+                state = pickle.load(file)
+            self.envs = state['envs']
+            env = ResumableVecEnv(DummyVecEnv([lambda env=env: env for env in self.envs]), obs=state['obs'])
+            model = PPO2.load(os.path.join(checkpoint, 'model.zip'), env=env,
+                              seed=self.seed + state['num_timesteps'], tensorboard_log=self.tensorboard_log)
+            model.num_timesteps = state['num_timesteps']
+            random.setstate(state['random_state'])
+            np.random.set_state(state['numpy_state'])
+            self.next_save = state['next_save']
+            print('Resumed from checkpoint at {0} steps'.format(model.num_timesteps))
+
+        self.venv = env
+        self.model = model
+        return model
+
+    def log(self, row, writer=None):
+        new_file = not os.path.exists(self.telemetry_file)
+        with open(self.telemetry_file, 'a', newline='') as file:
+            csv_writer = csv.DictWriter(file, fieldnames=list(row.keys()))
+            if new_file:
+                csv_writer.writeheader()
+            csv_writer.writerow(row)
+
+        if writer is not None:
+            values = [tf.Summary.Value(tag='telemetry/' + key, simple_value=value)
+                      for key, value in row.items() if key != 'num_timesteps']
+            writer.add_summary(tf.Summary(value=values), row['num_timesteps'])
+
+    def train(self):
+        model = self.setup()
+        remaining_steps = self.config['main']['n_steps'] - model.num_timesteps
+        if remaining_steps > 0:
+            model.learn(total_timesteps=remaining_steps, callback=TelemetryCallback(self),
+                        reset_num_timesteps=False)
+        return model
@@ -4,39 +4,81 @@ Code for defining the simulation environment into a gym environment
 import gym
 import pandas as pd
 import numpy as np
-import yaml
+import time
+import os
 
 from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from simulation_model.ActionTrace import ActionTrace
+from simulation_model.Profiler import Profiler, NullProfiler
+from order_generator import read_orders
+from order_index import OrderIndex
+from warm_start import WarmStartLibrary
 import tensorflow as tf
 tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
 
 
 class WAREHOUSE(gym.Env):
 
-    def __init__(self, params=(1, 1), heuristic=None):
+    def __init__(self, params=(1, 1), heuristic=None, scenario='scenario_2', order_data=None, weight_conditioned=None,
+                 trace_dir=None):
 
-        # Open file with parameters
-        with open(r'config/scenario_2.yml') as file:
-            config = yaml.full_load(file)
+        # Compiled config of the scenario, the scenario is a name in config/ or a compiled config
+        config = self.load_config(scenario)
 
         self.config = config
+        self.scenario = config.name
         self.heuristic = heuristic
         self.params = params
 
+        # Weight-conditioned mode: the objective weights are sampled every episode and appended to the observation,
+        # so one policy learns the trade-off between tardy orders and picking time for all weights
+        if weight_conditioned is None:
+            weight_conditioned = self.config['environment'].get('weight_conditioned', False)
+        self.weight_conditioned = weight_conditioned
+        self.weight_alpha = self.config['environment'].get('weight_alpha', [1, 1])
+        self.fixed_weights = None
+        self.weights = np.array(params, dtype=np.float32)
+
         # Set Gym variables for action space and observation space
         self.action_space = gym.spaces.Discrete(self.config['environment']['action_space'])
-        self.observation_space = gym.spaces.Box(
-            low=0, high=1,
-            shape=(self.config['environment']['observation_space'],), dtype=np.uint8)
+        if self.weight_conditioned:
+            # Float observations, the uint8 space of the standard mode would round the weights to 0 or 1
+            self.observation_space = gym.spaces.Box(
+                low=0, high=1,
+                shape=(self.config['environment']['observation_space'] + len(self.weights),), dtype=np.float32)
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=0, high=1,
+                shape=(self.config['environment']['observation_space'],), dtype=np.uint8)
 
         # Set simulation parameters and load order data
         self.n = self.config['environment']['throughput']
         self.t_start = self.config['environment']['t_start']
-        self.order_data = pd.read_csv(r'data/dummy_order_data.csv')
+        if order_data is None:
+            order_data = read_orders(r'data/dummy_order_data.csv')
+        self.order_data = order_data
+        self.order_index = OrderIndex(order_data)
+
+        # Warm start library, a share of the episodes continues a pre-simulated snapshot instead of starting at t_start
+        self.warm_start = None
+        self.warm_start_share = self.config['environment'].get('warm_start_share', 0.5)
+        if self.config['environment'].get('warm_start') is not None:
+            self.warm_start = WarmStartLibrary.load(self.config['environment']['warm_start'])
+            self.warm_start.check(self.config)
+        self.warm_starts = 0
+
+        # With a trace directory every episode that starts at t_start is recorded as an action trace, see replay.py
+        self.trace_dir = trace_dir
+        self.trace = None
+
+        # The profiler belongs to the environment and is passed to the simulation of every episode, so the phase
+        # timings accumulate over the whole training run
+        self.profiler = Profiler() if self.config['simulation'].get('profile', False) else NullProfiler()
 
         # Sample orders to simulate and initiate simulation instance
-        data = self.sample_orders(self.order_data, self.n, self.config['environment']['time_window'])
-        self.sim = WAREHOUSESimulation(self.config, data, self.t_start, params=self.params, heuristic=self.heuristic)
+        data = self.sample_orders(self.n, self.config['environment']['time_window'])
+        self.sim = self.new_simulation(data, self.weights if self.weight_conditioned else self.params)
 
         # Set parameters to capture simulation performance
         self.steps = 0
@@ -49,57 +91,115 @@ class WAREHOUSE(gym.Env):
         self.infeasible_ratio = 0
         self.tardy_orders = 0
         self.picking_time = 0
+
+        # Cumulative wall-clock time spent in the simulation, read by the training driver for its telemetry
+        self.sim_time_total = 0
+        self.reset_time_total = 0
+        self.resets = 0
         self.action_to_action = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9, 10: 10,
                                  11: 0, 12: 1, 13: 2, 14: 3, 15: 4, 16: 5, 17: 6, 18: 7, 19: 8, 20: 9, 21: 10}
 
-    # Function for sampling orders based on n and time_window
-    def sample_orders(self, data, n, time_window):
-        data_filtered = data[((data['arrival_time'] >= time_window[0] * 3600) &
-                              (data['arrival_time'] <= time_window[-1] * 3600))]
-        sample_data = data_filtered.sample(n=n, replace=False)
-        sample_data = sample_data.sort_values(by='cutoff_time', ascending=True)
-        return sample_data
+    # Function for loading the yaml file of a scenario, validated and compiled once per process
+    @staticmethod
+    def load_config(scenario):
+        return ScenarioConfig.load(scenario)
+
+    # Phase timings of all episodes of this environment, see WAREHOUSESimulation.profile_report
+    def profile_report(self):
+        return self.profiler.report()
+
+    # Fix the objective weights of the weight-conditioned mode, e.g. to evaluate a policy at one point of the front.
+    # With None the weights are sampled every episode again.
+    def set_weights(self, weights):
+        self.fixed_weights = None if weights is None else np.array(weights, dtype=np.float32)
+
+    def sample_weights(self):
+        if self.fixed_weights is not None:
+            return self.fixed_weights
+        return np.random.dirichlet(self.weight_alpha).astype(np.float32)
+
+    def observation(self, state):
+        if self.weight_conditioned:
+            return np.concatenate([np.array(state, dtype=np.float32), self.weights])
+        return np.array(state)
+
+    # Function for sampling orders based on n and time_window, the sample is sorted on cutoff time
+    def sample_orders(self, n, time_window):
+        return self.order_index.sample(n, time_window)
+
+    # Simulation of a new episode at t_start. With a trace directory the episode is recorded as an action trace, the
+    # simulation is built on the random state of the trace and the random state of the training is restored after it
+    def new_simulation(self, data, params):
+        if self.trace_dir is None:
+            self.trace = None
+            return WAREHOUSESimulation(self.config, data, self.t_start, params, self.heuristic, self.profiler)
+
+        self.trace = ActionTrace(self.config, self.heuristic, params, np.random.randint(2 ** 31), self.t_start,
+                                 data.index.values, 'mo' if self.weight_conditioned else 'scalar')
+        random_state = ActionTrace.random_state()
+        self.trace.seed_step()
+        sim = WAREHOUSESimulation(self.config, data, self.t_start, params, self.heuristic, self.profiler)
+        ActionTrace.restore_random_state(random_state)
+        return sim
 
     # Reset function for agent, saves information and reinitiates simulation instance
     def reset(self):
+        t_reset = time.perf_counter()
+
         # Print and save information about the processed episode
         print('Episode {0} finished, steps per episode: {1}'.format(self.episode, self.episode_step))
         self.sim.episode_render()
         results = self.sim.episode_render_test()
         self.tardy_orders = results['tardy_orders']
         self.picking_time = results['picking_time']
+        self.sim.close()
 
         # Sample new set of orders for the next episode
-        self.data = self.sample_orders(self.order_data, self.n, self.config['environment']['time_window'])
-
-        # Initiate simulation environment and get initial state
-        self.sim = WAREHOUSESimulation(self.config, self.data, self.t_start, self.params, self.heuristic)
+        self.data = self.sample_orders(self.n, self.config['environment']['time_window'])
+
+        # Initiate simulation environment and get initial state, or continue a sampled warm start snapshot
+        if self.weight_conditioned:
+            self.weights = self.sample_weights()
+        params = self.weights if self.weight_conditioned else self.params
+        self.trace = None
+        if self.warm_start is not None and np.random.random() < self.warm_start_share:
+            self.sim = self.warm_start.sample().resume(params, self.heuristic, self.profiler)
+            self.warm_starts += 1
+        else:
+            self.sim = self.new_simulation(self.data, params)
         state = self.sim.get_state()
         self.episode += 1
         self.episode_step = 0
         self.episode_reward_hist = self.episode_reward_copy
         self.episode_reward_copy = 0
 
-        return np.array(state)
+        self.reset_time_total += time.perf_counter() - t_reset
+        self.resets += 1
+        return self.observation(state)
 
     def step(self, action):
-        # Check whether this is a feasible action
-        state = self.sim.get_state()
-        feasibility = self.sim.check_action(action, state)
-
-        # Compute reward based on current state and action pair
-        reward = self.sim.get_reward(action)
-
-        # If the reward is feasible, simulate the action in the simulation model and observe new state
-        # If the reward is not feasible, do nothing and provide negative reward
-        if feasibility:
-            state = self.sim.simulate(action)
-            self.infeasible_actions.append(1)
+        t_step = time.perf_counter()
+
+        # A traced step draws from the random state of the trace, the random state of the training is restored after
+        # the step, so sample_orders, sample_weights and the warm starts do not follow the trace seeds
+        random_state = None
+        if self.trace is not None:
+            random_state = ActionTrace.random_state()
+            self.trace.seed_step()
+
+        # Feasibility, reward and transition in one pass of the simulation model. A feasible action is simulated, an
+        # infeasible action only gets a negative reward. In the weight-conditioned mode the reward vector
+        # [tardy orders, picking time] is scalarized with the weights of the episode. An episode is done when all
+        # orders have been processed
+        if self.weight_conditioned:
+            state, reward, done, feasibility, action_mask = self.sim.step(action, 'mo')
+            reward = float(np.dot(self.weights, reward))
         else:
-            self.infeasible_actions.append(0)
+            state, reward, done, feasibility, action_mask = self.sim.step(action)
+        self.infeasible_actions.append(1 if feasibility else 0)
 
-        # Check whether an episode is done. An episode is done when all orders have been processed
-        done = self.sim.check_termination()
+        if self.trace is not None:
+            self.trace.record(action, feasibility)
 
         # If at some point, the agent takes too many step, the episode is terminated
         if self.episode_step > 400000:
@@ -107,9 +207,14 @@ class WAREHOUSE(gym.Env):
             print('Episode stopped, {0} steps taken'.format(self.episode_step))
 
         # If an episode is done, save information
+        if done and self.trace is not None:
+            self.trace.finish(self.sim)
+            self.trace.save(os.path.join(self.trace_dir, '{0}_{1}_{2}.npz'.format(self.scenario, self.episode,
+                                                                                 self.trace.seed)))
+            self.trace = None
         if done:
             self.sim.reward_distribution['final_reward'] += (1 - self.sim.state_representation[-3] / self.sim.nOrders)**2
-            reward += ((1 - self.sim.state_representation[-3] / self.sim.nOrders) ** 2) * self.params[0]
+            reward += ((1 - self.sim.state_representation[-3] / self.sim.nOrders) ** 2) * self.sim.weight_tardy
 
         # Save information based on the step that was taken
         self.episode_reward_copy += reward
@@ -119,8 +224,11 @@ class WAREHOUSE(gym.Env):
         self.infeasible_ratio = self.infeasible_actions.count(0) / len(self.infeasible_actions)
         if len(self.infeasible_actions) > 1000:
             self.infeasible_actions = []
+        if random_state is not None:
+            ActionTrace.restore_random_state(random_state)
 
-        return np.array(state), reward, done, {}
+        self.sim_time_total += time.perf_counter() - t_step
+        return self.observation(state), reward, done, {'action_mask': action_mask, 'feasible': feasibility}
 
     def render(self, mode='human'):
         if mode != 'human':
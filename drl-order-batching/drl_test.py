@@ -1,7 +1,7 @@
 '''
 Code testing a trained DRL agent on the simulation environment
 '''
-from stable_baselines import PPO2
+from numpy_policy import NumpyPolicy
 from drl_env import WAREHOUSE
 import random
 import numpy as np
@@ -14,7 +14,7 @@ heuristic = 'BOC'
 env = WAREHOUSE(params=(1,1), heuristic=heuristic)
 
 path = "trained_models/scenario_2/V006_first_run.zip"
-model = PPO2.load(path)
+model = NumpyPolicy.load(path)  # NumPy forward pass of the PPO2 policy, no tensorflow session needed
 
 # Set lists for performance metrics
 average_results = {'tardy_orders': 0, 'pick_by_batch': 0, 'finish_time': 0,
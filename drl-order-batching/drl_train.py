@@ -1,27 +1,20 @@
 '''
 Code for training a DRL agent on the simulation environment
 '''
-from stable_baselines import PPO2
-from stable_baselines.common.policies import MlpPolicy
-from stable_baselines.common.cmd_util import make_vec_env
-from drl_env import WAREHOUSE
+from drl_driver import TrainingDriver
 
 # Set batching heuristic
 heuristic = "BOC"
 
-# Initiate 4 simulation environments in parallel
-env = WAREHOUSE(params=(1, 1), heuristic=heuristic)
-env = make_vec_env(lambda: env, n_envs=4)
-
 path = "trained_models/scenario_2/"
-model = PPO2(MlpPolicy, env, verbose=0)
+version_number = 6
 
-# Mount initiated environment on the trained agent and set gamma value
-model.set_env(env)
-model.gamma = 0.999999
+# The driver reads n_workers, n_steps, save_every and logs from the main section of the scenario config.
+# Checkpoints and telemetry.csv are written to the run directory, restarting this script resumes from the
+# latest checkpoint in that directory.
+driver = TrainingDriver(path + "V00" + str(version_number) + "_run", params=(1, 1), heuristic=heuristic,
+                        scenario='scenario_2', tensorboard_log=path + "tensorboard")
 
-# Train agent with 4M steps each and save
-version_number = 6
-model.learn(total_timesteps=100000)
+# Train agent and save
+model = driver.train()
 model.save(path+"V00"+str(version_number)+"_first_run")
-
@@ -0,0 +1,126 @@
+'''
+Code for checking that a change of the simulation model keeps fixed-seed heuristic episodes identical
+
+Every golden episode simulates synthetic orders of a fixed seed with EDD sequencing and one batching heuristic. Per
+episode the KPIs, the number of decisions and digests of the action sequence and of the finished picking orders (ID,
+orders, route and System_out) are recorded in golden/<scenario>.json. A refactor that must not change the behaviour of
+the simulation model (order bookkeeping, state representation, event handling) reproduces all recorded episodes
+exactly, the check exits with status 1 when an episode differs. After a change that is meant to change the episodes,
+record them again and commit the new file with the change.
+
+Heuristics with a time budget (gvns_time_budget, GRASP_MS) depend on the wall-clock time and are not checked.
+
+Usage:
+    python golden.py                             # check the episodes against golden/scenario_2.json
+    python golden.py --heuristics BOC LST        # only check the given heuristics
+    python golden.py --record                    # record the episodes of the current simulation model
+'''
+from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from order_generator import OrderGenerator
+import argparse
+import hashlib
+import random
+import json
+import time
+import sys
+import os
+import numpy as np
+
+# Number of orders per batching heuristic, the local search heuristics are slow on large episodes
+EPISODES = {'None': 1500, 'BOC': 1500, 'LST': 1500, 'PLAN': 1500, 'GVNS': 500, 'GRASP_VND': 500}
+SEEDS = [0, 1]
+N_SKUS = 2000
+
+
+def digest(values):
+    return hashlib.sha1(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+def run_episode(config, heuristic, n, seed):
+    # Orders of the seed in the time window of the scenario, sorted on cutoff time as sampled by the environment
+    data = OrderGenerator(n_skus=N_SKUS, seed=seed).generate(n, config['environment']['time_window'])
+    data = data.sort_values(by=['cutoff_time', 'orderID'], kind='stable')
+
+    random.seed(seed)
+    np.random.seed(seed)
+    sim = WAREHOUSESimulation(config, data, config['environment']['t_start'], (1, 1),
+                              None if heuristic == 'None' else heuristic)
+    state_rep = sim.get_state()
+    actions = []
+    while not sim.check_termination():
+        action = sim.edd_sequencing(state_rep)
+        sim.get_reward(action)
+        state_rep = sim.simulate(action)
+        actions.append(int(action))
+
+    results = sim.episode_render_test()
+    first_id = sim.finished_orders[0].ID if len(sim.finished_orders) > 0 else 0
+    finished = [[int(order.ID - first_id), int(order.nOrders), int(order.route), round(float(order.System_out), 6)]
+                for order in sim.finished_orders]
+    return {'decisions': len(actions), 'picking_orders': len(finished),
+            'tardy_orders': float(results['tardy_orders']), 'picking_time': float(results['picking_time']),
+            'actions': digest(actions), 'finished_orders': digest(finished)}
+
+
+def run_episodes(scenario, heuristics):
+    config = ScenarioConfig.load(scenario)
+    episodes = {}
+    for heuristic in heuristics:
+        for seed in SEEDS:
+            t = time.perf_counter()
+            key = '{0}/{1}'.format(heuristic, seed)
+            episodes[key] = run_episode(config, heuristic, EPISODES[heuristic], seed)
+            print('{0}: {1} decisions, picking time {2}, {3:.1f} s'.format(
+                key, episodes[key]['decisions'], episodes[key]['picking_time'], time.perf_counter() - t), flush=True)
+    return episodes
+
+
+def compare(episodes, golden):
+    # Fields of every episode that differ from the recorded episode, (recorded, current)
+    differences = {}
+    for key, episode in episodes.items():
+        recorded = golden.get(key)
+        if recorded is None:
+            differences[key] = {'episode': ('not recorded', 'simulated')}
+            continue
+        fields = {field: (recorded.get(field), value) for field, value in episode.items()
+                  if recorded.get(field) != value}
+        if fields:
+            differences[key] = fields
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check fixed-seed heuristic episodes against recorded episodes')
+    parser.add_argument('--scenario', default='scenario_2')
+    parser.add_argument('--heuristics', nargs='+', default=list(EPISODES), choices=list(EPISODES))
+    parser.add_argument('--record', action='store_true', help='record the episodes instead of checking them')
+    parser.add_argument('--golden', default=None, help='file of the recorded episodes, golden/<scenario>.json')
+    args = parser.parse_args()
+
+    path = args.golden or os.path.join('golden', args.scenario + '.json')
+    golden = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            golden = json.load(file)
+
+    episodes = run_episodes(args.scenario, args.heuristics)
+    if args.record:
+        golden.update(episodes)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(golden, file, indent=1, sort_keys=True)
+        print('{0} episodes recorded in {1}'.format(len(episodes), path))
+        return
+
+    differences = compare(episodes, golden)
+    for key, fields in differences.items():
+        for field, (recorded, current) in fields.items():
+            print('{0} {1}: recorded {2}, current {3}'.format(key, field, recorded, current))
+    print('{0} of {1} episodes identical'.format(len(episodes) - len(differences), len(episodes)))
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == '__main__':
+    main()
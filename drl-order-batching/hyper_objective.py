@@ -5,65 +5,331 @@ from stable_baselines.common.policies import MlpPolicy
 from stable_baselines import PPO2
 from stable_baselines.common.cmd_util import make_vec_env
 from drl_env import WAREHOUSE
+from numpy_policy import NumpyPolicy
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import hashlib
+import json
+import os
 import random
 import numpy as np
 
+# Environment variables that bound the number of threads of the numerical libraries within a trial
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+
+def trial_key(parameters, scenario, seed, base_model=None, **settings):
+    # Weights proposed by the optimizer are floats, round them so the same point always maps to the same key. The
+    # base model and the training and evaluation settings are part of the key, a trial with other settings is new
+    weights = ['{:.12g}'.format(float(weight)) for weight in parameters]
+    key = dict(settings, weights=weights, scenario=scenario, seed=seed)
+    if base_model is not None:
+        key['base_model'] = base_model
+    key = json.dumps(key, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class TrialCache:
+    '''
+    On-disk cache with one json file per completed trial, so that interrupted sweeps can be resumed and
+    points that are proposed twice by the optimizer are never retrained.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def model_file(self, key):
+        return os.path.join(self.path, key + '.zip')
+
+    def records(self):
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith('.json'):
+                record = self.get(name[:-len('.json')])
+                if record is not None:
+                    yield record
+
+    def get(self, key):
+        try:
+            with open(self.file(key)) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, record):
+        # Write to a temporary file first, a trial that crashes halfway never leaves a corrupt entry behind
+        tmp_file = self.file(key) + '.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(record, file)
+        os.replace(tmp_file, self.file(key))
+
+
+def init_worker(cpu_slots, cpus_per_trial):
+    # Every worker claims its own set of cpu's, so concurrent trials do not compete for the same cores
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(cpus_per_trial)
+    cpus = cpu_slots.get()
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+
+def run_trial(parameters, scenario, seed, cpus_per_trial, base_model, training_steps, evaluation_steps):
+    random.seed(seed)
+    np.random.seed(seed)
+    heuristic = "BOC"
+
+    # Instantiate the env
+    env = WAREHOUSE(params=parameters, heuristic=heuristic, scenario=scenario)
+    env = make_vec_env(lambda: env, n_envs=1)
+
+    # Retrain a base agent
+    model = PPO2.load(base_model, seed=seed, n_cpu_tf_sess=cpus_per_trial)
+    model.set_env(env)
+    model.gamma = 0.999999
+    model.learn(total_timesteps=training_steps)
+    policy = NumpyPolicy.from_model(model, seed=seed)
+
+    env = WAREHOUSE(params=parameters, heuristic=heuristic, scenario=scenario)
+    obs = env.reset()
+    results_tardy_orders = []
+    results_picking_time = []
+
+    for step in range(evaluation_steps):
+        valid_actions = env.sim.available_actions(obs)
+        valid_actions = [idx for idx, x in enumerate(valid_actions) if x > 0]
+
+        action, _states = policy.predict(obs)
+        if action in valid_actions:
+            obs, rewards, done, info = env.step(action)
+        else:
+            action = random.sample(valid_actions, 1)[0]
+            obs, rewards, done, info = env.step(action)
+
+        if done:
+            results = env.sim.episode_render_test()
+            obs = env.reset()
+            results_tardy_orders.append(results['tardy_orders'])
+            results_picking_time.append(results['picking_time'])
+
+    return float(np.mean(np.multiply(results_tardy_orders, results_picking_time)))
+
+
+def validate_model(model, parameters, scenario, validation_episodes, validation_seed):
+    # Every episode is seeded, so all candidates are evaluated on exactly the same sampled orders
+    heuristic = "BOC"
+    env = WAREHOUSE(params=parameters, heuristic=heuristic, scenario=scenario)
+    policy = NumpyPolicy.from_model(model)
+    results = []
+
+    for episode in range(validation_episodes):
+        random.seed(validation_seed + episode)
+        np.random.seed(validation_seed + episode)
+        obs = env.reset()
+        done = False
+
+        while not done:
+            valid_actions = env.sim.available_actions(obs)
+            valid_actions = [idx for idx, x in enumerate(valid_actions) if x > 0]
+
+            action, _states = policy.predict(obs, deterministic=True)
+            if action not in valid_actions:
+                action = random.sample(valid_actions, 1)[0]
+            obs, rewards, done, info = env.step(action)
+
+        results.append(env.sim.episode_render_test())
+
+    return float(np.mean([result['tardy_orders'] * result['picking_time'] for result in results]))
+
+
+def run_rung(parameters, scenario, seed, cpus_per_trial, start_model, save_model, training_steps,
+             validation_episodes, validation_seed):
+    # Continue training a candidate from its previous rung (or the warm start) and score it on the validation orders
+    random.seed(seed)
+    np.random.seed(seed)
+    heuristic = "BOC"
+
+    env = WAREHOUSE(params=parameters, heuristic=heuristic, scenario=scenario)
+    env = make_vec_env(lambda: env, n_envs=1)
+
+    model = PPO2.load(start_model, seed=seed, n_cpu_tf_sess=cpus_per_trial)
+    model.set_env(env)
+    model.gamma = 0.999999
+    model.learn(total_timesteps=training_steps, reset_num_timesteps=False)
+    model.save(save_model)
+
+    return validate_model(model, parameters, scenario, validation_episodes, validation_seed)
+
 
 class ObjectiveFunction:
-    def __init__(self):
+    '''
+    Objective for the reward weights. With budgets=None every candidate is trained for training_steps and
+    evaluated for evaluation_steps. With a list of budgets, e.g. [100000, 300000, 1000000], the multi-fidelity
+    mode is used: candidates are trained from the warm start in rungs of increasing budget, scored on a fixed
+    set of validation episodes after every rung and only the best 1/eta of a rung is promoted to the next one
+    (successive halving). A candidate that is stopped early reports its last rung score, penalized so that it is never
+    better than a full-budget score, so the optimizer learns from it without ranking it above the completed candidates.
+    '''
+    def __init__(self, scenario='scenario_2', seed=0, n_workers=1, cpus_per_trial=1, cache_path=None,
+                 base_model="./trained_models/batching_operation/benchmark/V001_second_run",
+                 training_steps=1000000, evaluation_steps=100000,
+                 budgets=None, eta=3, validation_episodes=2, validation_seed=1000):
         self.version_number = 0
         self.weight_tardy_list = []
         self.weight_picking_list = []
 
-    def objective(self, parameters):
-        weight_tardy, weight_picking = parameters
-        self.weight_tardy_list.append(weight_tardy)
-        self.weight_picking_list.append(weight_picking)
+        self.scenario = scenario
+        self.seed = seed
+        self.n_workers = n_workers
+        self.cpus_per_trial = cpus_per_trial
+        self.base_model = base_model
+        self.training_steps = training_steps
+        self.evaluation_steps = evaluation_steps
 
-        heuristic = "BOC"
+        if cache_path is None:
+            cache_path = os.path.join('optimization_results', scenario, 'trial_cache')
+        self.cache = TrialCache(cache_path)
+        self.pool = None
 
-        # Instantiate the env
-        env = WAREHOUSE(params=parameters, heuristic=heuristic)
-        env = make_vec_env(lambda: env, n_envs=1)
+        self.budgets = budgets
+        self.eta = eta
+        self.validation_episodes = validation_episodes
+        self.validation_seed = validation_seed
 
-        # Retrain a base agent
-        model = PPO2.load("./trained_models/batching_operation/benchmark/V001_second_run")
-        model.set_env(env)
-        model.gamma = 0.999999
+        # Scores of all candidates per rung, restored from the cache when a sweep is resumed
+        self.rung_scores = {}
+        if self.budgets is not None:
+            self.rung_scores = {budget: [] for budget in self.budgets}
+            for record in self.cache.records():
+                if record.get('budget') in self.rung_scores and record['scenario'] == self.scenario \
+                        and record['seed'] == self.seed and record.get('base_model') == self.base_model \
+                        and record.get('validation_episodes') == self.validation_episodes \
+                        and record.get('validation_seed') == self.validation_seed:
+                    self.rung_scores[record['budget']].append(record['result'])
 
-        models = 2
-        training_steps = 1000000
-        results_all = []
-        # wrap it
-        for i in range(1, models):
-            model.learn(total_timesteps=training_steps)
+    def key(self, parameters):
+        # Cache key of a trial with the full training budget
+        return trial_key(parameters, self.scenario, self.seed, self.base_model, training_steps=self.training_steps,
+                         evaluation_steps=self.evaluation_steps)
 
-            env = WAREHOUSE(params=parameters, heuristic=heuristic)
-            obs = env.reset()
-            steps = 100000
-            results_tardy_orders = []
-            results_picking_time = []
+    def rung_key(self, parameters, budget):
+        # Cache key of a candidate after the rung with the given budget, its first rung starts from the base model
+        return trial_key(parameters, self.scenario, self.seed, self.base_model, budget=budget,
+                         validation_episodes=self.validation_episodes, validation_seed=self.validation_seed)
+
+    def get_pool(self):
+        if self.pool is None:
+            # Tensorflow is not fork-safe, therefore workers are spawned as fresh interpreters
+            context = multiprocessing.get_context('spawn')
+            cpu_slots = context.Queue()
+            cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+            for worker in range(self.n_workers):
+                cpu_slots.put(cpus[worker * self.cpus_per_trial:(worker + 1) * self.cpus_per_trial])
+            self.pool = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=context,
+                                            initializer=init_worker, initargs=(cpu_slots, self.cpus_per_trial))
+        return self.pool
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def promote(self, budget, result):
+        # A candidate is promoted when it is within the best 1/eta of all candidates that reached this rung
+        scores = sorted(self.rung_scores[budget])
+        threshold = scores[max(1, len(scores) // self.eta) - 1]
+        return result <= threshold
+
+    def stopped_score(self, result):
+        # Score of a candidate that was stopped early: its last rung score, but not better than the worst full-budget
+        # score, lower rungs score candidates on a shorter training
+        return max([result] + self.rung_scores[self.budgets[-1]])
+
+    def successive_halving(self, parameter_list):
+        results = {}
+        survivors = []
+        for parameters in parameter_list:
+            key = trial_key(parameters, self.scenario, self.seed)
+            if key not in results:
+                results[key] = None
+                survivors.append(parameters)
 
-            for step in range(steps):
-                valid_actions = env.sim.available_actions(obs)
-                valid_actions = [idx for idx, x in enumerate(valid_actions) if x > 0]
+        previous_budget = 0
+        for rung, budget in enumerate(self.budgets):
+            # Train and validate all surviving candidates of this rung concurrently
+            futures = {}
+            for parameters in survivors:
+                key = self.rung_key(parameters, budget)
+                if self.cache.get(key) is None and key not in futures:
+                    if rung == 0:
+                        start_model = self.base_model
+                    else:
+                        start_model = self.cache.model_file(self.rung_key(parameters, previous_budget))
+                    futures[key] = (parameters, self.get_pool().submit(
+                        run_rung, list(parameters), self.scenario, self.seed, self.cpus_per_trial, start_model,
+                        self.cache.model_file(key), budget - previous_budget, self.validation_episodes,
+                        self.validation_seed))
 
-                action, _states = model.predict(obs)
-                if action in valid_actions:
-                    obs, rewards, done, info = env.step(action)
-                else:
-                    action = random.sample(valid_actions, 1)[0]
-                    obs, rewards, done, info = env.step(action)
+            for key, (parameters, future) in futures.items():
+                record = {'weights': list(parameters), 'scenario': self.scenario, 'seed': self.seed,
+                          'base_model': self.base_model, 'budget': budget,
+                          'validation_episodes': self.validation_episodes, 'validation_seed': self.validation_seed,
+                          'result': future.result()}
+                self.cache.put(key, record)
+                self.rung_scores[budget].append(record['result'])
 
-                if done:
-                    results = env.sim.episode_render_test()
-                    obs = env.reset()
-                    results_tardy_orders.append(results['tardy_orders'])
-                    results_picking_time.append(results['picking_time'])
+            for parameters in survivors:
+                result = self.cache.get(self.rung_key(parameters, budget))['result']
+                results[trial_key(parameters, self.scenario, self.seed)] = result
 
-            results_all.append(np.multiply(results_tardy_orders, results_picking_time))
+            survivors = [parameters for parameters in survivors
+                         if self.promote(budget, results[trial_key(parameters, self.scenario, self.seed)])]
+            previous_budget = budget
+            if len(survivors) == 0:
+                break
 
-        self.version_number += 1
+        # Full-budget scores of the candidates that completed the last rung, penalized scores of the stopped ones
+        full_budget = self.budgets[-1]
+        return [results[trial_key(parameters, self.scenario, self.seed)]
+                if self.cache.get(self.rung_key(parameters, full_budget)) is not None
+                else self.stopped_score(results[trial_key(parameters, self.scenario, self.seed)])
+                for parameters in parameter_list]
 
-        return np.mean(results_all[0])
+    def evaluate(self, parameter_list):
+        if self.budgets is not None:
+            for parameters in parameter_list:
+                weight_tardy, weight_picking = parameters
+                self.weight_tardy_list.append(weight_tardy)
+                self.weight_picking_list.append(weight_picking)
+            self.version_number += len(parameter_list)
+            return self.successive_halving(parameter_list)
 
+        # Submit all points that are not in the cache at once, these trials run concurrently on the pool
+        keys = [self.key(parameters) for parameters in parameter_list]
+        futures = {}
+        for parameters, key in zip(parameter_list, keys):
+            weight_tardy, weight_picking = parameters
+            self.weight_tardy_list.append(weight_tardy)
+            self.weight_picking_list.append(weight_picking)
+
+            if self.cache.get(key) is None and key not in futures:
+                futures[key] = self.get_pool().submit(run_trial, list(parameters), self.scenario, self.seed,
+                                                      self.cpus_per_trial, self.base_model, self.training_steps,
+                                                      self.evaluation_steps)
+
+        for parameters, key in zip(parameter_list, keys):
+            if key in futures:
+                record = {'weights': list(parameters), 'scenario': self.scenario, 'seed': self.seed,
+                          'base_model': self.base_model, 'training_steps': self.training_steps,
+                          'evaluation_steps': self.evaluation_steps,
+                          'result': futures[key].result()}
+                self.cache.put(key, record)
+                futures.pop(key)
+
+        self.version_number += len(parameter_list)
+        return [self.cache.get(key)['result'] for key in keys]
+
+    def objective(self, parameters):
+        return self.evaluate([parameters])[0]
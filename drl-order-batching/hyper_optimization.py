@@ -4,23 +4,69 @@ Code for the hyper optimization framework Hyperspace that optimizes parameters o
 from hyperspace.hyperdrive import hyperdrive
 from hyper_objective import ObjectiveFunction
 from hyperspace.kepler.data_utils import load_results
+from skopt import Optimizer, dump
+from skopt.utils import create_result
+import os
+
+
+def parallel_drive(objective_function, hyperparameters, results_path, n_iterations, n_workers, random_state=0):
+    # Hyperspace evaluates one point at a time, here the GP proposes n_workers points per round instead
+    # which are evaluated concurrently on the process pool of the objective function
+    # With successive halving, candidates that are stopped early are told their penalized last rung score, see
+    # ObjectiveFunction.stopped_score
+    optimizer = Optimizer(hyperparameters, base_estimator="GP", random_state=random_state)
+
+    evaluated = 0
+    while evaluated < n_iterations:
+        n_points = min(n_workers, n_iterations - evaluated)
+        points = optimizer.ask(n_points=n_points)
+        results = objective_function.evaluate(points)
+        evaluated += len(points)
+        optimizer.tell(points, results)
+        print('Iteration {0}: best result {1}'.format(evaluated, min(optimizer.yi)))
+
+    result = create_result(optimizer.Xi, optimizer.yi, optimizer.space, optimizer.rng, models=optimizer.models)
+    dump(result, results_file(results_path))
+    return result
+
+
+def results_file(results_path, prefix='hyperspace_parallel'):
+    # First unused file name, the results of earlier runs (and the hyperspace files of hyperdrive) are not overwritten
+    os.makedirs(results_path, exist_ok=True)
+    number = 0
+    while os.path.exists(os.path.join(results_path, '{0}{1:02d}'.format(prefix, number))):
+        number += 1
+    return os.path.join(results_path, '{0}{1:02d}'.format(prefix, number))
 
 
 def main():
     hparams = [(0.1, 1.5),      # weight tardy orders
                (0.1, 1.5)]      # weight picking time
 
-    objective_function = ObjectiveFunction()
+    scenario = 'scenario_2'
+    n_workers = 4         # trials running at the same time
+    cpus_per_trial = 2    # cpu's available to every trial
+    budgets = None        # training budgets per rung for successive halving, e.g. [100000, 300000, 1000000]
+
+    objective_function = ObjectiveFunction(scenario=scenario, seed=0, n_workers=n_workers,
+                                           cpus_per_trial=cpus_per_trial, budgets=budgets)
 
-    hyperdrive(objective=objective_function.objective,
-               hyperparameters=hparams,
-               results_path='optimization_results/scenario_2',
-               checkpoints_path='optimization_results/scenario_2',
-               model="GP",
-               n_iterations=50,
-               verbose=True)
+    if n_workers > 1 or budgets is not None:
+        parallel_drive(objective_function, hparams,
+                       results_path='optimization_results/' + scenario,
+                       n_iterations=50,
+                       n_workers=n_workers)
+    else:
+        hyperdrive(objective=objective_function.objective,
+                   hyperparameters=hparams,
+                   results_path='optimization_results/' + scenario,
+                   checkpoints_path='optimization_results/' + scenario,
+                   model="GP",
+                   n_iterations=50,
+                   verbose=True)
+    objective_function.shutdown()
 
-    path = './optimization_results/scenario_3'
+    path = './optimization_results/' + scenario
     results = load_results(path, sort=True)
     print('Hyperparameters of our best model:\n {}'.format(results[0].x))
 
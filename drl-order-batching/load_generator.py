@@ -0,0 +1,171 @@
+'''
+Code for a replay-driven load generator that stands in for the WMS of the batching service
+
+The orders of an order file are sent to the service at their arrival times on a replay clock that runs speedup
+times faster than the wall clock. Every PtG picker and GtP shuttle of the scenario asks the service for a next
+batch when it is free, works on the batch for the mean processing time of the scenario and releases it. Only the
+first station of a route is modelled, a batch is done when it leaves that station.
+
+Usage:
+    python batching_service.py &
+    python load_generator.py --orders data/dummy_order_data.csv --n 1000 --speedup 100
+'''
+from simulation_model.ScenarioConfig import ScenarioConfig
+from order_generator import read_orders
+import numpy as np
+import argparse
+import asyncio
+import json
+import time
+
+
+class ReplayClock:
+
+    def __init__(self, t_start, speedup):
+        self.t_start = t_start
+        self.speedup = speedup
+        self.wall_start = time.perf_counter()
+
+    def now(self):
+        return self.t_start + (time.perf_counter() - self.wall_start) * self.speedup
+
+    async def sleep(self, duration):
+        await asyncio.sleep(max(duration, 0) / self.speedup)
+
+    async def sleep_until(self, t):
+        await self.sleep(t - self.now())
+
+
+class Connection:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, message):
+        self.writer.write((json.dumps(message) + '\n').encode())
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def close(self):
+        self.writer.close()
+
+
+class LoadGenerator:
+    '''
+    Replays orders against the batching service and measures the round trip latency of next batch requests.
+
+    Args:
+            config (dict): scenario config, the number of resources and processing times are read from it
+            orders (DataFrame): orders to replay, sorted on arrival time
+            speedup (float): replay seconds per wall-clock second
+            poll_interval (float): replay seconds a free resource waits before it asks again after a wait action
+    '''
+
+    def __init__(self, config, orders, speedup=100, poll_interval=10, host='127.0.0.1', port=8765):
+        self.config = config['simulation']
+        self.orders = orders
+        self.host = host
+        self.port = port
+        self.clock = ReplayClock(config['environment']['t_start'], speedup)
+        self.poll_interval = poll_interval
+        self.stop = False
+        self.latencies = []
+        self.batches = 0
+
+    def processing_time(self, batch):
+        if batch['station'] == 'PtG':
+            return self.config['PtG_picking_time'] * batch['nItems_ptg'] + self.config['PtG_picking_constant']
+        return self.config['GtP_picking_time'] * batch['nItems_gtp']
+
+    async def send_orders(self):
+        connection = await Connection.open(self.host, self.port)
+        columns = ['orderID', 'arrival_time', 'comp', 'nItems_ptg', 'nItems_gtp', 'skuIDlist', 'cutoff_time']
+        for order in self.orders[columns].itertuples(index=False):
+            await self.clock.sleep_until(order.arrival_time)
+            await connection.request({'type': 'order', 'orderID': int(order.orderID),
+                                      'arrival_time': float(order.arrival_time), 'comp': order.comp,
+                                      'nItems_ptg': int(order.nItems_ptg), 'nItems_gtp': int(order.nItems_gtp),
+                                      'skuIDlist': [int(sku) for sku in order.skuIDlist],
+                                      'cutoff_time': float(order.cutoff_time)})
+
+        # Stop when all orders are batched and all batches are done
+        while True:
+            await self.clock.sleep(self.poll_interval)
+            stats = await connection.request({'type': 'stats'})
+            if stats['open_orders'] == 0 and stats['open_batches'] == 0:
+                break
+        self.stop = True
+        connection.close()
+
+    async def resource(self, station):
+        connection = await Connection.open(self.host, self.port)
+        while not self.stop:
+            t_request = time.perf_counter()
+            batch = await connection.request({'type': 'next_batch', 'station': station, 'time': self.clock.now()})
+            self.latencies.append(time.perf_counter() - t_request)
+            if batch['action'] == 10:
+                await self.clock.sleep(self.poll_interval)
+                continue
+
+            self.batches += 1
+            await self.clock.sleep(self.processing_time(batch))
+            await connection.request({'type': 'release', 'batch': batch['batch'], 'time': self.clock.now(),
+                                      'done': True})
+        connection.close()
+
+    async def run(self):
+        wall_start = time.perf_counter()
+        resources = [self.resource('PtG') for picker in range(self.config['nPtG_pickers'][0])]
+        resources += [self.resource('GtP') for shuttle in range(self.config['nGtP_shuttles'][0])]
+        await asyncio.gather(self.send_orders(), *resources)
+
+        connection = await Connection.open(self.host, self.port)
+        stats = await connection.request({'type': 'stats'})
+        connection.close()
+
+        latencies = np.array(self.latencies) * 1000
+        stats['wall_time_s'] = time.perf_counter() - wall_start
+        stats['batches'] = self.batches
+        stats['requests_per_sec'] = len(latencies) / stats['wall_time_s']
+        stats['round_trip_p50_ms'], stats['round_trip_p99_ms'] = np.percentile(latencies, [50, 99]).tolist()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay orders against the batching service')
+    parser.add_argument('--scenario', default='scenario_2')
+    parser.add_argument('--orders', default='data/dummy_order_data.csv')
+    parser.add_argument('--n', type=int, default=None, help='number of orders to sample from the time window')
+    parser.add_argument('--speedup', type=float, default=100)
+    parser.add_argument('--poll-interval', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    config = ScenarioConfig.load(args.scenario)
+    time_window = config['environment']['time_window']
+    orders = read_orders(args.orders)
+    orders = orders[(orders['arrival_time'] >= time_window[0] * 3600) &
+                    (orders['arrival_time'] <= time_window[-1] * 3600)]
+    if args.n is not None:
+        orders = orders.sample(n=args.n, replace=False, random_state=args.seed)
+    orders = orders.sort_values(by='arrival_time')
+
+    generator = LoadGenerator(config, orders, args.speedup, args.poll_interval, args.host, args.port)
+    stats = asyncio.run(generator.run())
+    for key, value in stats.items():
+        print('{0:<22} {1}'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+'''
+Code for running trained PPO2 MlpPolicy agents with NumPy only, without a tensorflow session
+
+Usage:
+    python numpy_policy.py export trained_models/scenario_2/V001_second_run.zip
+    python numpy_policy.py record --scenario scenario_2 --n 5000 --output observations.npz
+    python numpy_policy.py verify trained_models/scenario_2/V001_second_run.zip --observations observations.npz
+'''
+import numpy as np
+import argparse
+import zipfile
+import base64
+import pickle
+import json
+import io
+import re
+
+ACTIVATIONS = {'tanh': np.tanh, 'relu': lambda x: np.maximum(x, 0)}
+
+
+class SpaceStub:
+    # Stands in for the gym space classes when the pickled spaces of a saved model are read
+    pass
+
+
+class SpaceUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if module.startswith('gym'):
+            return SpaceStub
+        return super().find_class(module, name)
+
+
+def read_zip(path):
+    # A stable-baselines zip holds the class attributes as json (spaces are pickled in it), the parameter names
+    # and the parameters as a npz file
+    if not path.endswith('.zip'):
+        path += '.zip'
+    with zipfile.ZipFile(path) as file:
+        data = json.loads(file.read('data').decode())
+        parameter_list = json.loads(file.read('parameter_list').decode())
+        parameters = np.load(io.BytesIO(file.read('parameters')))
+        parameters = {name: parameters[name] for name in parameter_list}
+    return data, parameters
+
+
+def read_space(serialized_space):
+    space = SpaceUnpickler(io.BytesIO(base64.b64decode(serialized_space[':serialized:']))).load()
+    return space.__dict__
+
+
+class NumpyPolicy:
+    '''
+    Forward pass of the stable-baselines MlpPolicy (shared_fc, pi_fc and vf_fc layers with tanh activations
+    followed by the linear pi and vf heads) for single and batched observations.
+
+    The observation placeholder of a model has the dtype of the observation space. The environment observation
+    space is uint8, so tensorflow casts the normalized observations to uint8 when they are fed to the model.
+    The same cast is applied here, so the actions are identical to model.predict.
+
+    Args:
+            parameters (dict): parameter name (as in model.get_parameters()) to array
+            obs_dtype (str): dtype of the observation space of the model
+            act_fun (str): activation function of the hidden layers
+    '''
+
+    def __init__(self, parameters, obs_dtype='uint8', act_fun='tanh', seed=None):
+        self.obs_dtype = np.dtype(obs_dtype)
+        self.act_fun = act_fun
+        self.activation = ACTIVATIONS[act_fun]
+        self.rng = np.random.RandomState(seed)
+
+        def layers(prefix):
+            names = sorted((int(re.search(r'/' + prefix + r'(\d+)/w', name).group(1)), name)
+                           for name in parameters if re.search(r'/' + prefix + r'\d+/w', name))
+            return [(parameters[name].astype(np.float32), parameters[name.replace('/w', '/b')].astype(np.float32))
+                    for index, name in names]
+
+        def head(name):
+            w = next(key for key in parameters if key.endswith('/' + name + '/w:0'))
+            return parameters[w].astype(np.float32), parameters[w.replace('/w', '/b')].astype(np.float32)
+
+        self.shared_layers = layers('shared_fc')
+        self.pi_layers = layers('pi_fc')
+        self.vf_layers = layers('vf_fc')
+        self.pi = head('pi')
+        self.vf = head('vf')
+        self.n_actions = self.pi[0].shape[1]
+
+    @classmethod
+    def from_zip(cls, path, seed=None):
+        data, parameters = read_zip(path)
+        # The layer sizes follow from the parameters, only a different activation function is not supported
+        policy_kwargs = data.get('policy_kwargs') or {}
+        if 'act_fun' in policy_kwargs or ':serialized:' in policy_kwargs:
+            raise ValueError('policy_kwargs {0} are not supported'.format(policy_kwargs))
+        obs_dtype = read_space(data['observation_space'])['dtype']
+        return cls(parameters, obs_dtype=obs_dtype, seed=seed)
+
+    @classmethod
+    def from_model(cls, model, seed=None):
+        # Policy of a PPO2 model in memory, e.g. right after training
+        return cls(model.get_parameters(), obs_dtype=model.observation_space.dtype, seed=seed)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        # Exported npz file or stable-baselines zip
+        if path.endswith('.npz'):
+            with np.load(path) as file:
+                parameters = {name: file[name] for name in file.files if name not in ['obs_dtype', 'act_fun']}
+                return cls(parameters, obs_dtype=str(file['obs_dtype']), act_fun=str(file['act_fun']), seed=seed)
+        return cls.from_zip(path, seed=seed)
+
+    def save(self, path):
+        parameters = {}
+        for prefix, layers in [('shared_fc', self.shared_layers), ('pi_fc', self.pi_layers),
+                               ('vf_fc', self.vf_layers)]:
+            for index, (w, b) in enumerate(layers):
+                parameters['model/{0}{1}/w:0'.format(prefix, index)] = w
+                parameters['model/{0}{1}/b:0'.format(prefix, index)] = b
+        for name, (w, b) in [('pi', self.pi), ('vf', self.vf)]:
+            parameters['model/{0}/w:0'.format(name)] = w
+            parameters['model/{0}/b:0'.format(name)] = b
+        np.savez(path, obs_dtype=str(self.obs_dtype), act_fun=self.act_fun, **parameters)
+
+    def latent(self, obs):
+        x = np.asarray(obs).astype(self.obs_dtype).astype(np.float32)
+        for w, b in self.shared_layers:
+            x = self.activation(x @ w + b)
+        latent_pi = latent_vf = x
+        for w, b in self.pi_layers:
+            latent_pi = self.activation(latent_pi @ w + b)
+        for w, b in self.vf_layers:
+            latent_vf = self.activation(latent_vf @ w + b)
+        return latent_pi, latent_vf
+
+    def logits(self, obs, mask=None):
+        latent_pi, latent_vf = self.latent(obs)
+        logits = latent_pi @ self.pi[0] + self.pi[1]
+        if mask is not None:
+            logits = np.where(np.asarray(mask) > 0, logits, -np.inf)
+        return logits
+
+    def action_probability(self, obs, mask=None):
+        logits = self.logits(obs, mask)
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def value(self, obs):
+        latent_pi, latent_vf = self.latent(obs)
+        return (latent_vf @ self.vf[0] + self.vf[1])[..., 0]
+
+    def predict(self, obs, deterministic=False, mask=None):
+        '''
+        Same signature and return value as model.predict: the action for a single observation, an array of actions
+        for a batch of observations. Stochastic actions are sampled with the Gumbel-max trick as in the
+        categorical distribution of stable-baselines. Actions with a mask value of 0 are never chosen.
+        '''
+        logits = self.logits(obs, mask)
+        if not deterministic:
+            uniform = self.rng.uniform(np.finfo(np.float32).tiny, 1, logits.shape)
+            logits = logits - np.log(-np.log(uniform))
+        return np.argmax(logits, axis=-1), None
+
+
+def export(path, output=None):
+    output = output or re.sub(r'\.zip$', '', path) + '.npz'
+    NumpyPolicy.from_zip(path).save(output)
+    return output
+
+
+def record_observations(scenario, n_observations, orders='data/dummy_order_data.csv', seed=0):
+    # Observations of episodes with EDD sequencing and BOC batching, sampled as in the gym environment
+    from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+    from order_generator import read_orders
+    from simulation_model.ScenarioConfig import ScenarioConfig
+    from order_index import OrderIndex
+    import random
+
+    config = ScenarioConfig.load(scenario)
+    random.seed(seed)
+    np.random.seed(seed)
+    order_index = OrderIndex(read_orders(orders))
+
+    observations = []
+    while len(observations) < n_observations:
+        data = order_index.sample(config['environment']['throughput'], config['environment']['time_window'])
+        sim = WAREHOUSESimulation(config, data, config['environment']['t_start'], (1, 1), 'BOC')
+        obs = sim.get_state()
+        while not sim.check_termination() and len(observations) < n_observations:
+            observations.append(obs)
+            obs = sim.simulate(sim.edd_sequencing(obs))
+    return np.array(observations, dtype=np.float32)
+
+
+def verify(path, observations):
+    # Compares the action probabilities and deterministic actions with model.predict of the tensorflow model
+    from stable_baselines import PPO2
+    model = PPO2.load(path)
+    policy = NumpyPolicy.from_zip(path)
+
+    expected_probability = model.action_probability(observations)
+    expected_actions = model.predict(observations, deterministic=True)[0]
+    probability = policy.action_probability(observations)
+    actions = policy.predict(observations, deterministic=True)[0]
+    single_actions = [policy.predict(obs, deterministic=True)[0] for obs in observations[:100]]
+    return {'observations': len(observations),
+            'max_probability_difference': float(np.abs(probability - expected_probability).max()),
+            'action_agreement': float(np.mean(actions == expected_actions)),
+            'single_action_agreement': float(np.mean(np.array(single_actions) == expected_actions[:100]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NumPy inference for trained PPO2 agents')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_export = subparsers.add_parser('export', help='export the policy of a model zip to a npz file')
+    parser_export.add_argument('model')
+    parser_export.add_argument('--output', default=None)
+    parser_record = subparsers.add_parser('record', help='record observations of EDD episodes')
+    parser_record.add_argument('--scenario', default='scenario_2')
+    parser_record.add_argument('--n', type=int, default=5000)
+    parser_record.add_argument('--orders', default='data/dummy_order_data.csv')
+    parser_record.add_argument('--output', default='observations.npz')
+    parser_verify = subparsers.add_parser('verify', help='compare with model.predict on recorded observations')
+    parser_verify.add_argument('model')
+    parser_verify.add_argument('--observations', default='observations.npz')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print('Policy exported to', export(args.model, args.output))
+    elif args.command == 'record':
+        np.savez(args.output, observations=record_observations(args.scenario, args.n, args.orders))
+        print('{0} observations saved to {1}'.format(args.n, args.output))
+    elif args.command == 'verify':
+        with np.load(args.observations) as file:
+            observations = file['observations']
+        for key, value in verify(args.model, observations).items():
+            print('{0:<28} {1}'.format(key, value))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
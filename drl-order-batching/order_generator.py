@@ -0,0 +1,169 @@
+'''
+Code for generating synthetic order data for load and scaling tests of the simulation model
+
+Usage:
+    python order_generator.py --n 65000 --output data/dummy_order_data.csv
+'''
+import pandas as pd
+import numpy as np
+import argparse
+import ast
+import os
+
+# Column layout of the order data. LST_batching reads nItems_ptg, nItems_gtp and cutoff_time by position (4, 5, 7),
+# the first column is the index column that pd.read_csv adds for a csv that was saved with its index.
+COLUMNS = ['Unnamed: 0', 'orderID', 'arrival_time', 'comp', 'nItems_ptg', 'nItems_gtp', 'skuIDlist', 'cutoff_time']
+
+# Relative order arrival rate per hour of the day (0-23)
+ARRIVAL_RATE = [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.7, 1.0, 1.2, 1.3, 1.4,
+                1.4, 1.4, 1.5, 1.6, 1.6, 1.5, 1.4, 1.4, 1.5, 1.4, 1.0, 0.5]
+
+
+class OrderGenerator:
+    '''
+    Vectorized generator of order sets with the columns consumed by WAREHOUSESimulation.
+
+    Args:
+            arrival_rate (list): relative arrival rate for every hour of the day, orders arrive uniformly within an hour
+            cutoff_waves (list): cutoff moments in hours, an order gets the first wave at least cutoff_lead minutes
+                after its arrival (waves of the next day are used after the last wave)
+            cutoff_lead (float): minimum time in minutes between the arrival and the cutoff of an order
+            sio_share (float): fraction of single item orders
+            mio_items (float): mean number of items of a multi item order (at least 2, at most max_items)
+            max_items (int): maximum number of items of an order
+            n_skus (int): size of the assortment
+            zipf (float): exponent of the Zipf distribution of the SKU popularity
+            ptg_share (float): fraction of the SKUs that is stored in the PtG area, the others are stored in GtP
+    '''
+
+    def __init__(self, arrival_rate=ARRIVAL_RATE, cutoff_waves=(18, 20, 22, 24), cutoff_lead=30, sio_share=0.6,
+                 mio_items=3, max_items=10, n_skus=50000, zipf=1.1, ptg_share=0.5, seed=0):
+        self.arrival_rate = np.asarray(arrival_rate, dtype=float)
+        self.cutoff_waves = np.sort(np.asarray(cutoff_waves, dtype=float)) * 3600
+        self.cutoff_lead = cutoff_lead * 60
+        self.sio_share = sio_share
+        self.mio_items = mio_items
+        self.max_items = max_items
+        self.n_skus = n_skus
+        self.zipf = zipf
+        self.ptg_share = ptg_share
+        self.rng = np.random.default_rng(seed)
+
+        # Popularity rank r has probability proportional to 1 / r^zipf, the ranks are shuffled over the SKU ids
+        popularity = 1 / np.arange(1, n_skus + 1) ** zipf
+        self.sku_cdf = np.cumsum(popularity / popularity.sum())
+        self.sku_ids = self.rng.permutation(n_skus)
+        self.sku_ptg = self.rng.random(n_skus) < ptg_share
+
+    def arrival_times(self, n, time_window):
+        # Sample the hour of every order proportional to the arrival rate, then a uniform time within that hour
+        start, end = time_window[0] * 3600, time_window[-1] * 3600
+        hours = np.arange(int(start // 3600), int(np.ceil(end / 3600)))
+        overlap = np.minimum(end, (hours + 1) * 3600) - np.maximum(start, hours * 3600)
+        weights = self.arrival_rate[hours % 24] * overlap
+        hour = self.rng.choice(hours, size=n, p=weights / weights.sum())
+        low = np.maximum(start, hour * 3600)
+        high = np.minimum(end, (hour + 1) * 3600)
+        return np.sort(low + self.rng.random(n) * (high - low))
+
+    def cutoff_times(self, arrival_time):
+        days = int(np.max(arrival_time, initial=0) // 86400) + 3
+        waves = np.concatenate([self.cutoff_waves + day * 86400 for day in range(days)])
+        return waves[np.searchsorted(waves, arrival_time + self.cutoff_lead)]
+
+    def items_per_order(self, n):
+        sio = self.rng.random(n) < self.sio_share
+        mio_items = 2 + self.rng.poisson(max(self.mio_items - 2, 0), n)
+        return np.where(sio, 1, np.minimum(mio_items, self.max_items))
+
+    def generate(self, n, time_window=(0, 24)):
+        arrival_time = self.arrival_times(n, time_window)
+        n_items = self.items_per_order(n)
+
+        # Draw all SKUs at once and derive the storage area composition of every order
+        skus = self.sku_ids[np.searchsorted(self.sku_cdf, self.rng.random(n_items.sum()), side='right')
+                            .clip(max=self.n_skus - 1)]
+        starts = np.concatenate([[0], np.cumsum(n_items)[:-1]])
+        nItems_ptg = np.add.reduceat(self.sku_ptg[skus].astype(np.int64), starts)
+        nItems_gtp = n_items - nItems_ptg
+
+        # Build the SKU tuples per order size, each group is a 2d array whose rows are zipped into tuples
+        skuIDlist = np.empty(n, dtype=object)
+        for items in np.unique(n_items):
+            orders = np.flatnonzero(n_items == items)
+            columns = skus[starts[orders, None] + np.arange(items)].T.tolist()
+            skuIDlist[orders] = list(zip(*columns))
+
+        return pd.DataFrame({'Unnamed: 0': np.arange(n), 'orderID': np.arange(n), 'arrival_time': arrival_time,
+                             'comp': np.where(n_items == 1, 'SIO', 'MIO'), 'nItems_ptg': nItems_ptg,
+                             'nItems_gtp': nItems_gtp, 'skuIDlist': skuIDlist,
+                             'cutoff_time': self.cutoff_times(arrival_time)}, columns=COLUMNS)
+
+    def stream(self, orders_per_day, days, chunk_hours=1):
+        # Orders of consecutive days in chunks of chunk_hours hours, for streaming simulations of long horizons. The
+        # orders of a day are divided over the chunks with the arrival rate, the order ids continue over the chunks.
+        share = self.arrival_rate / self.arrival_rate.sum()
+        order_id = 0
+        for day in range(days):
+            orders_per_hour = self.rng.multinomial(orders_per_day, share)
+            for hour in range(0, 24, chunk_hours):
+                n = int(orders_per_hour[hour:hour + chunk_hours].sum())
+                if n == 0:
+                    continue
+                orders = self.generate(n, (day * 24 + hour, day * 24 + min(hour + chunk_hours, 24)))
+                orders['Unnamed: 0'] += order_id
+                orders['orderID'] += order_id
+                order_id += n
+                yield orders
+
+
+def save_orders(orders, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if path.endswith('.pkl'):
+        orders.to_pickle(path)
+    else:
+        orders.to_csv(path, index=False)
+
+
+def parse_sku_lists(orders):
+    # In a csv file the skuIDlist column is stored as text, it is parsed back into tuples of SKU ids
+    if len(orders) > 0 and isinstance(orders['skuIDlist'].iloc[0], str) and orders['skuIDlist'].iloc[0][:1] in '[(':
+        orders['skuIDlist'] = [tuple(ast.literal_eval(skus)) for skus in orders['skuIDlist']]
+    return orders
+
+
+def read_orders(path):
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+    return parse_sku_lists(pd.read_csv(path))
+
+
+def read_order_chunks(path, chunksize=10000):
+    # Orders of a csv file in chunks of chunksize orders for an OrderStream, the file is memory mapped and must be
+    # sorted on arrival time
+    for orders in pd.read_csv(path, chunksize=chunksize, memory_map=True):
+        yield parse_sku_lists(orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic order data')
+    parser.add_argument('--n', type=int, default=65000)
+    parser.add_argument('--time-window', type=float, nargs=2, default=[0, 24])
+    parser.add_argument('--cutoff-waves', type=float, nargs='+', default=[18, 20, 22, 24])
+    parser.add_argument('--sio-share', type=float, default=0.6)
+    parser.add_argument('--n-skus', type=int, default=50000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--ptg-share', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='data/dummy_order_data.csv')
+    args = parser.parse_args()
+
+    generator = OrderGenerator(cutoff_waves=args.cutoff_waves, sio_share=args.sio_share, n_skus=args.n_skus,
+                               zipf=args.zipf, ptg_share=args.ptg_share, seed=args.seed)
+    orders = generator.generate(args.n, args.time_window)
+    save_orders(orders, args.output)
+    print('{0} orders saved to {1}'.format(len(orders), args.output))
+
+
+if __name__ == '__main__':
+    main()
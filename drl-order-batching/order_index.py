@@ -0,0 +1,44 @@
+'''
+Code for sampling episode orders from large order files without filtering the whole file at every reset
+'''
+import numpy as np
+
+
+class OrderIndex:
+    '''
+    Orders sorted on arrival time with the rank of every order in cutoff order, built once when the order data is
+    loaded. A time window is resolved with a binary search on the arrival times and a sample is drawn by position
+    and sorted on the precomputed cutoff ranks, so a sample costs O(log N + n log n) for N orders in the file and
+    n sampled orders. Orders with the same cutoff time keep their arrival order.
+
+    Samples are drawn with a generator that is seeded from the global numpy random state, so np.random.seed
+    still makes the sampled orders of an episode reproducible.
+    '''
+
+    def __init__(self, data):
+        self.data = data.sort_values(by='arrival_time', kind='mergesort')
+        self.arrival_time = self.data['arrival_time'].values
+        cutoff_order = np.argsort(self.data['cutoff_time'].values, kind='stable')
+        self.cutoff_rank = np.empty(len(self.data), dtype=np.int64)
+        self.cutoff_rank[cutoff_order] = np.arange(len(self.data))
+
+    def __len__(self):
+        return len(self.data)
+
+    def window(self, time_window):
+        # Positions [start, end) of the orders with time_window[0] <= arrival time (hours) <= time_window[-1]
+        start = np.searchsorted(self.arrival_time, time_window[0] * 3600, side='left')
+        end = np.searchsorted(self.arrival_time, time_window[-1] * 3600, side='right')
+        return start, end
+
+    def sample(self, n, time_window, rng=None):
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(2 ** 31))
+        start, end = self.window(time_window)
+        if n > end - start:
+            raise ValueError('cannot sample {0} orders from the {1} orders in time window {2}'.format(
+                n, end - start, time_window))
+
+        positions = start + rng.choice(end - start, size=n, replace=False)
+        positions = positions[np.argsort(self.cutoff_rank[positions])]
+        return self.data.iloc[positions]
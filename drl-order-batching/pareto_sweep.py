@@ -0,0 +1,118 @@
+'''
+Code for tracing the tardy orders / picking time Pareto front of a weight-conditioned policy
+
+A policy trained with weight_conditioned: true in the environment section of the scenario config takes the
+objective weights as part of its observation. Instead of training a model for every weight pair, the single
+policy is evaluated at many weights on a pool of worker processes. Every weight is evaluated on the same seeded
+episodes, so differences between points come from the weights and not from the sampled orders.
+
+Usage:
+    python pareto_sweep.py trained_models/scenario_2/V001_weight_conditioned.zip --points 21 --workers 4
+'''
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import contextlib
+import argparse
+import random
+import io
+import os
+import numpy as np
+import pandas as pd
+
+# Environment and policy of a worker process, built once by init_worker
+worker = {}
+
+
+def init_worker(model, scenario, heuristic):
+    from numpy_policy import NumpyPolicy
+    from drl_env import WAREHOUSE
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker['env'] = WAREHOUSE(heuristic=heuristic, scenario=scenario, weight_conditioned=True)
+    worker['policy'] = NumpyPolicy.load(model)
+
+
+def evaluate_weights(weights, episodes, seed):
+    env = worker['env']
+    policy = worker['policy']
+    env.set_weights(weights)
+    results = []
+
+    for episode in range(episodes):
+        random.seed(seed + episode)
+        np.random.seed(seed + episode)
+        with contextlib.redirect_stdout(io.StringIO()):
+            obs = env.reset()
+            mask = env.sim.action_mask(env.sim.state_representation)
+            done = False
+            while not done:
+                # Infeasible actions are masked, the policy chooses the best feasible action. The mask of the next
+                # state comes with the step
+                action, _states = policy.predict(obs, deterministic=True, mask=mask)
+                obs, rewards, done, info = env.step(action)
+                mask = info['action_mask']
+        results.append(env.sim.episode_render_test())
+
+    return {'weight_tardy': float(weights[0]), 'weight_picking': float(weights[1]),
+            'tardy_orders': float(np.mean([result['tardy_orders'] for result in results])),
+            'picking_time': float(np.mean([result['picking_time'] for result in results]))}
+
+
+def pareto_front(points):
+    # A point is on the front when no other point is at least as good on both objectives and better on one
+    values = points[['tardy_orders', 'picking_time']].values
+    dominated = [np.any(np.all(values <= value, axis=1) & np.any(values < value, axis=1)) for value in values]
+    return ~np.array(dominated)
+
+
+def sweep(model, scenario='scenario_2', heuristic='BOC', points=21, episodes=2, seed=1000, n_workers=4):
+    weight_tardy = np.linspace(0, 1, points)
+    weights = [(w, 1 - w) for w in weight_tardy]
+
+    # Spawned workers, every worker loads the order data and the policy once
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=init_worker,
+                             initargs=(model, scenario, heuristic)) as executor:
+        results = list(executor.map(evaluate_weights, weights, [episodes] * points, [seed] * points))
+
+    results = pd.DataFrame(results)
+    results['pareto'] = pareto_front(results)
+    return results
+
+
+def plot_front(results, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    front = results[results['pareto']].sort_values(by='tardy_orders')
+    plt.figure()
+    plt.scatter(results['tardy_orders'], results['picking_time'], c=results['weight_tardy'], cmap='viridis')
+    plt.colorbar(label='weight tardy orders')
+    plt.plot(front['tardy_orders'], front['picking_time'], 'k--')
+    plt.xlabel('Tardy orders')
+    plt.ylabel('Picking time per order')
+    plt.savefig(path)
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pareto front of a weight-conditioned policy')
+    parser.add_argument('model', help='model zip or exported npz of a weight-conditioned policy')
+    parser.add_argument('--scenario', default='scenario_2')
+    parser.add_argument('--heuristic', default='BOC')
+    parser.add_argument('--points', type=int, default=21)
+    parser.add_argument('--episodes', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', default='pareto_results')
+    args = parser.parse_args()
+
+    results = sweep(args.model, args.scenario, args.heuristic, args.points, args.episodes, args.seed, args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    results.to_csv(os.path.join(args.output, 'pareto_front.csv'), index=False)
+    plot_front(results, os.path.join(args.output, 'pareto_front.png'))
+    print(results.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Code for replaying recorded action traces on the simulation model
+
+A trace (simulation_model/ActionTrace.py) holds the seed, the sampled orders and the decisions of an episode. The
+replay rebuilds the simulation on the same orders and executes the recorded decisions without a policy or heuristic
+in the loop, so an episode runs at the speed of the simulation model. The KPIs of the replay are compared to the
+recorded KPIs, a replay that differs exits with status 1. This is used to re-profile and debug recorded episodes and
+to compare versions of the simulation model on identical inputs.
+
+Heuristics with a time budget (gvns_time_budget, GRASP_MS) depend on the wall-clock time and may not replay exactly.
+
+Usage:
+    python replay.py traces/scenario_2_BOC_0.npz --orders data/dummy_order_data.csv --profile
+'''
+import argparse
+import time
+import sys
+import pandas as pd
+
+from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from simulation_model.ActionTrace import ActionTrace
+from order_generator import read_orders
+
+
+def replay(trace, order_data, config=None):
+    # Replayed simulation, its KPIs and the time spent in the recorded decisions, by default with the recorded config
+    if config is None:
+        config = trace.config
+    player = ActionTrace(config, trace.heuristic, trace.params, trace.seed, trace.t_start, trace.order_rows,
+                         trace.objective)
+    player.seed_step()
+    sim = WAREHOUSESimulation(config, order_data.loc[trace.order_rows], trace.t_start, trace.params, trace.heuristic)
+    get_reward = sim.get_reward_mo if trace.objective == 'mo' else sim.get_reward
+
+    t = time.perf_counter()
+    for action, simulated in zip(trace.actions, trace.simulated):
+        player.seed_step()
+        get_reward(action)
+        if simulated:
+            sim.simulate(action)
+        player.record(action, simulated)
+    elapsed = time.perf_counter() - t
+
+    return sim, player.finish(sim), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded action traces and verify their KPIs')
+    parser.add_argument('traces', nargs='+')
+    parser.add_argument('--orders', default=r'data/dummy_order_data.csv', help='order data the traces sampled from')
+    parser.add_argument('--scenario', default=None, help='replay with config/<scenario>.yml, not the recorded config')
+    parser.add_argument('--profile', action='store_true', help='time the phases of every step of the replay')
+    args = parser.parse_args()
+
+    order_data = read_orders(args.orders)
+    failed = 0
+    for path in args.traces:
+        trace = ActionTrace.load(path)
+        config = trace.config if args.scenario is None else ScenarioConfig.load(args.scenario)
+        if args.profile:
+            config = config.replace('simulation', profile=True)
+        sim, kpis, elapsed = replay(trace, order_data, config)
+
+        differences = trace.compare(kpis)
+        failed += len(differences) > 0
+        print('{0}: {1} decisions in {2:.2f} s ({3:.0f}/s), {4}'.format(
+            path, len(trace), elapsed, len(trace) / max(elapsed, 1e-9),
+            'KPIs match' if not differences else 'KPIs differ'))
+        for key, (recorded, replayed) in differences.items():
+            print('    {0}: recorded {1}, replayed {2}'.format(key, recorded, replayed))
+        if args.profile:
+            print(pd.DataFrame(sim.profile_report()).T.drop(columns='histogram_us'))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,24 @@
 '''
 Code for simulation environment and testing heuristics for benchmarking
 '''
-import yaml
 import pandas as pd
 import numpy as np
 import time
 from tqdm import tqdm
 from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from order_generator import read_orders
+from order_index import OrderIndex
+from simulation_model.ActionTrace import ActionTrace
 
-with open(r'config/scenario_day.yml') as file:
-    config = yaml.full_load(file)
+config = ScenarioConfig.load('scenario_day')
 
-order_data = pd.read_csv('data/dummy_order_data.csv')
+order_data = read_orders('data/dummy_order_data.csv')
+order_index = OrderIndex(order_data)
 
 
-def sample_orders(data, n, time_window=[0, 23.5]):
-    data_filtered = data[((data['arrival_time'] >= (time_window[0])*3600) &
-                          (data['arrival_time'] <= time_window[-1]*3600))]
-    sample_data = data_filtered.sample(n=n, replace=False)
-    sample_data = sample_data.sort_values(by='cutoff_time', ascending=True)
-    return sample_data
+def sample_orders(index, n, time_window=[0, 23.5]):
+    return index.sample(n, time_window)
 
 
 t_start = config['environment']['t_start']
@@ -28,16 +27,22 @@ time_window = config['environment']['time_window']
 
 # heuristic = 'LST'
 # heuristic = 'GRASP_VND'
+# heuristic = 'GRASP_MS'  # with grasp_workers: 0, the worker pool needs an if __name__ == '__main__' script
 heuristic = 'BOC'
 # heuristic = 'GVNS'
+# heuristic = 'PLAN'  # batch plans per order category, repaired between the decisions
 # heuristic = None
 
 weights = {'scenario_1': [0.860933108285528, 0.9026343218274464],
            'scenario_2': [1.3356476376785569, 0.5199800258281753],
            'scenario_3': [0.8210920808200558, 0.5199952974746439]}
+params = weights.get(config.name, [1, 1])
 
-data = sample_orders(order_data, n=n, time_window=time_window)
-sim = WAREHOUSESimulation(config, data, t_start, weights, heuristic)
+# Every episode is recorded as an action trace, replay.py re-executes it at the speed of the simulation model
+trace_dir = 'traces'
+
+data = sample_orders(order_index, n=n, time_window=time_window)
+sim = WAREHOUSESimulation(config, data, t_start, params, heuristic)
 average_results_tardy_orders = []
 average_results_pick_batch = []
 average_results_finish = []
@@ -47,8 +52,10 @@ average_results_picking_time = []
 
 episodes = 20
 for i in tqdm(range(episodes)):
-    data = sample_orders(order_data, n=n, time_window=time_window)
-    sim = WAREHOUSESimulation(config, data, t_start, weights, heuristic)
+    data = sample_orders(order_index, n=n, time_window=time_window)
+    trace = ActionTrace(config, heuristic, params, i, t_start, data.index.values)
+    trace.seed_step()
+    sim = WAREHOUSESimulation(config, data, t_start, params, heuristic)
     state_rep = sim.get_state()
     action_list = []
 
@@ -56,18 +63,23 @@ for i in tqdm(range(episodes)):
     steps_episode = 0
     while not sim.check_termination():
         action = sim.edd_sequencing(state_rep)
+        trace.seed_step()
         reward = sim.get_reward(action)
         state_rep = sim.simulate(action)
+        trace.record(action)
         steps_episode += 1
         action_list.append([action, sim.state_representation[-1]])
 
+    trace.finish(sim)
+    trace.save('{0}/{1}_{2}_{3}.npz'.format(trace_dir, config.name, heuristic, i))
+    sim.report().save(sim.res.directory, '{0}_{1}_report_{2}'.format(config.name, heuristic, i))
     results = sim.episode_render_test()
     average_results_tardy_orders.append(results['tardy_orders'])
     average_results_pick_batch.append(results['pick_by_batch'])
     average_results_finish.append(results['finish_time'])
     average_results_batch_size.append(results['batch_size'])
     average_results_picking_time.append(results['picking_time'])
-    sim.res.save_action(action_list)
+    sim.res.save_action(action_list, name='{0}_{1}_actions'.format(config.name, heuristic))
 
 print('/n')
 print('Heuristic: ', heuristic)
@@ -82,16 +94,20 @@ print('Batch size (avg): ', round(np.mean(average_results_batch_size), 4),
       round(np.std(average_results_batch_size), 4))
 print('Picking time (avg): ', round(np.mean(average_results_picking_time), 4),
       round(np.std(average_results_picking_time), 4))
+print('Order groups (last episode):')
+print(sim.report().by_group())
+print('Work stations (last episode):')
+print(pd.DataFrame(sim.station_report()).T)
 
 data = {'tardy_orders': average_results_tardy_orders, 'picking_costs': average_results_picking_time}
 df = pd.DataFrame(data=data)
 
 # sim.res.plot_cutoff_moments(sim.finished_orders)
 # sim.res.plot_avg_picking_times(sim.finished_orders)
-# sim.res.print_resource_utilization()
+# sim.res.print_resource_utilization()  # with queue_history: true in the config
 # sim.res.plot_order_progress(sim.finished_orders, 'Order progress experiment D - BOC heuristic')
 # sim.res.plot_order_progress(sim.finished_orders, 'LST heuristic')
 # sim.res.plot_tardy_orders()
 
-# sim.res.plot_QL(sim.finished_orders)
-# sim.res.plot_resource_utilization()
+# sim.res.plot_QL(sim.finished_orders)  # with queue_history: true in the config
+# sim.res.plot_resource_utilization()  # with queue_history: true in the config
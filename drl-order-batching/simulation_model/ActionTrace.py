@@ -0,0 +1,108 @@
+import json
+import os
+import random
+import numpy as np
+
+from .ScenarioConfig import ScenarioConfig
+
+
+class ActionTrace:
+    '''
+    Binary trace of an episode: the scenario config, heuristic, weights and seed, the rows of the sampled orders in the
+    order file and every decision (action and whether it was simulated), with the KPIs at the end of the episode.
+
+    The random and numpy random state are seeded from the trace seed before the simulation is built and before
+    every decision (seed_step), so the draws of the simulation do not depend on the policy or heuristic that chose
+    the actions. Replaying the decisions on the same orders therefore gives the same episode, see replay.py. A caller
+    whose own draws must not follow the trace seeds (e.g. training) saves the random state with random_state before
+    seed_step and restores it after the step. Traces are stored as .npz files without pickled objects.
+
+    Args:
+            config (ScenarioConfig): compiled scenario config of the simulation, stored with the trace
+            heuristic (str): batching heuristic of the simulation
+            params (list): reward weights of the simulation
+            seed (int): seed of the random state of the episode
+            t_start (float): start time of the simulation
+            order_rows (array): index labels of the sampled orders in the order data, in the order of the sample
+            objective (str): 'scalar' for get_reward, 'mo' for the reward vector of get_reward_mo
+    '''
+    VERSION = 1
+    KPI_KEYS = ['tardy_orders', 'pick_by_batch', 'finish_time', 'episode_reward', 'batch_size', 'picking_time',
+                'batch_size_pick_batch', 'finished_orders', 'decisions']
+
+    def __init__(self, config, heuristic, params, seed, t_start, order_rows, objective='scalar'):
+        self.config = config
+        self.heuristic = heuristic
+        self.params = np.asarray(params)
+        self.seed = int(seed)
+        self.t_start = float(t_start)
+        self.order_rows = np.asarray(order_rows, dtype=np.int64)
+        self.objective = objective
+        self.actions = []
+        self.simulated = []
+        self.kpis = None
+        self.steps = 0
+
+    def __len__(self):
+        return len(self.actions)
+
+    def seed_step(self):
+        # Seed the random state for the next step, the first step is building the simulation
+        seed = (self.seed * 1000003 + self.steps) % 2 ** 32
+        random.seed(seed)
+        np.random.seed(seed)
+        self.steps += 1
+
+    @staticmethod
+    def random_state():
+        return random.getstate(), np.random.get_state()
+
+    @staticmethod
+    def restore_random_state(state):
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+
+    def record(self, action, simulated=True):
+        self.actions.append(int(action))
+        self.simulated.append(bool(simulated))
+
+    def finish(self, sim):
+        self.kpis = self.episode_kpis(sim, len(self.actions))
+        return self.kpis
+
+    @staticmethod
+    def episode_kpis(sim, decisions):
+        # KPIs of episode_render_test, without resetting the episode reward of the simulation
+        reward_episode = sim.reward_episode
+        kpis = sim.episode_render_test()
+        sim.reward_episode = reward_episode
+        kpis['finished_orders'] = sim.finished_orders.n_orders
+        kpis['decisions'] = decisions
+        return {key: float(kpis[key]) for key in ActionTrace.KPI_KEYS}
+
+    def compare(self, kpis):
+        # KPIs of a replay that differ from the recorded KPIs, as {kpi: (recorded, replayed)}
+        return {key: (self.kpis[key], kpis[key]) for key in self.KPI_KEYS if self.kpis[key] != kpis[key]}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, version=self.VERSION, scenario=self.config.name,
+                            config=json.dumps(self.config.to_dict()), heuristic=self.heuristic or '',
+                            params=self.params, seed=self.seed, t_start=self.t_start,
+                            order_rows=self.order_rows, objective=self.objective,
+                            actions=np.array(self.actions, dtype=np.uint8),
+                            simulated=np.array(self.simulated, dtype=bool),
+                            kpis=json.dumps(self.kpis))
+
+    @staticmethod
+    def load(path):
+        with np.load(path, allow_pickle=False) as file:
+            if int(file['version']) != ActionTrace.VERSION:
+                raise ValueError('{0}: trace version {1} is not supported'.format(path, int(file['version'])))
+            config = ScenarioConfig(json.loads(str(file['config'])), str(file['scenario']))
+            trace = ActionTrace(config, str(file['heuristic']) or None, file['params'],
+                                int(file['seed']), float(file['t_start']), file['order_rows'], str(file['objective']))
+            trace.actions = file['actions'].tolist()
+            trace.simulated = file['simulated'].tolist()
+            trace.kpis = json.loads(str(file['kpis']))
+        return trace
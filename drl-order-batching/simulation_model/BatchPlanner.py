@@ -0,0 +1,163 @@
+import collections
+
+
+class Batch:
+    '''
+    Planned batch of a category plan: its orders, the SKU counts of its orders and its earliest cutoff time.
+    '''
+
+    def __init__(self):
+        self.orders = []
+        self.skus = collections.Counter()
+        self.cutoff = float('inf')
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order_id, cutoff, skus):
+        self.orders.append(order_id)
+        self.skus.update(skus)
+        self.cutoff = min(self.cutoff, cutoff)
+
+    def remove(self, order_id, cutoff, skus, cutoffs):
+        self.orders.remove(order_id)
+        self.skus.subtract(skus)
+        self.skus = +self.skus
+        if cutoff <= self.cutoff:
+            self.cutoff = min((cutoffs[order] for order in self.orders), default=float('inf'))
+
+
+class CategoryPlan:
+    '''
+    Batch plan of the orders of one order category, with the batch, cutoff time and SKUs of every planned order and
+    the number of orders that were repaired into or out of the plan since it was built.
+
+    Args:
+            max_batchsize (int): maximum number of orders in a batch
+            max_skus (int): maximum number of unique SKUs in a batch, None for no limit
+            fill (bool): add orders that share no SKUs with any batch to the batch with the earliest cutoff
+    '''
+
+    def __init__(self, max_batchsize, max_skus=None, fill=True):
+        self.max_batchsize = max_batchsize
+        self.max_skus = max_skus
+        self.fill = fill
+        self.batches = []
+        self.batch_of = {}
+        self.cutoffs = {}
+        self.sku_lists = {}
+        self.size = 0
+        self.changes = 0
+
+
+class BatchPlanner:
+    '''
+    Batch plans of the pick-by-batch decisions of the PLAN heuristic, one plan per order category.
+
+    A plan splits all released orders of a category into batches of at most max_batchsize orders and at most
+    max_skus unique SKUs, the limits of the pick-by-batch action of the category. The orders are inserted in cutoff
+    order, every order joins the batch with room that has the highest similarity with it (shared SKUs relative to the
+    SKUs of the order, as in boc_batching). An order that shares no SKUs with any batch joins the batch with the
+    earliest cutoff when the plan fills batches (PtG, as the BOC fallback) and starts a new batch otherwise (GtP, where
+    action_to_orders only batches orders with a common SKU). A decision pops the planned batch with the earliest
+    cutoff.
+
+    Between decisions the plan is repaired against the current orders of the category instead of solved again: orders
+    that were dispatched by other actions or moved to another earliness bucket are removed from their batches, orders
+    that arrived or moved into the category are inserted. A plan is built again when more than rebuild_share of its
+    orders were repaired since it was built, so the plan does not drift far from a fresh construction.
+
+    Args:
+            rebuild_share (float): share of repaired orders after which a plan is built again
+    '''
+
+    def __init__(self, rebuild_share=0.5):
+        self.rebuild_share = rebuild_share
+        self.plans = {}
+
+        # Number of plan builds, repaired orders and popped batches, for the benchmark and the profile
+        self.builds = 0
+        self.repairs = 0
+        self.pops = 0
+
+    def next_batch(self, category, orders, max_batchsize, max_skus=None, fill=True):
+        # Order IDs of the next batch of the category, orders is the current frame of the category
+        plan = self.plans.get(category)
+        if plan is None or len(plan.batches) == 0 or \
+                (plan.max_batchsize, plan.max_skus, plan.fill) != (max_batchsize, max_skus, fill):
+            plan = self.build(category, orders, max_batchsize, max_skus, fill)
+        else:
+            plan = self.repair(category, orders)
+        return self.pop(plan)
+
+    def build(self, category, orders, max_batchsize, max_skus=None, fill=True):
+        plan = CategoryPlan(max_batchsize, max_skus, fill)
+        for order_id, cutoff, skus in zip(orders['orderID'].values, orders['cutoff_time'].values,
+                                          orders['skuIDlist'].values):
+            self.insert(plan, order_id, cutoff, skus)
+        plan.size = len(orders)
+        self.plans[category] = plan
+        self.builds += 1
+        return plan
+
+    def repair(self, category, orders):
+        plan = self.plans[category]
+        order_ids = orders['orderID'].values
+        current = set(order_ids.tolist())
+        removed = [order_id for order_id in plan.batch_of if order_id not in current]
+        added = [position for position, order_id in enumerate(order_ids.tolist()) if order_id not in plan.batch_of]
+
+        plan.changes += len(removed) + len(added)
+        if plan.changes > self.rebuild_share * max(plan.size, 1):
+            return self.build(category, orders, plan.max_batchsize, plan.max_skus, plan.fill)
+
+        for order_id in removed:
+            self.delete(plan, order_id)
+        if len(added) > 0:
+            cutoffs = orders['cutoff_time'].values
+            sku_lists = orders['skuIDlist'].values
+            for position in added:
+                self.insert(plan, order_ids[position], cutoffs[position], sku_lists[position])
+        self.repairs += len(removed) + len(added)
+        return plan
+
+    def insert(self, plan, order_id, cutoff, skus):
+        best, best_similarity, earliest = None, 0, None
+        for batch in plan.batches:
+            if len(batch) >= plan.max_batchsize:
+                continue
+            if plan.max_skus is not None and \
+                    len(batch.skus) + sum(1 for sku in set(skus) if sku not in batch.skus) > plan.max_skus:
+                continue
+            similarity = sum(batch.skus[sku] for sku in skus if sku in batch.skus) / max(len(skus), 1)
+            if similarity > best_similarity:
+                best, best_similarity = batch, similarity
+            if earliest is None or batch.cutoff < earliest.cutoff:
+                earliest = batch
+
+        batch = best if best is not None or not plan.fill else earliest
+        if batch is None:
+            batch = Batch()
+            plan.batches.append(batch)
+        batch.add(order_id, cutoff, skus)
+        plan.batch_of[order_id] = batch
+        plan.cutoffs[order_id] = cutoff
+        plan.sku_lists[order_id] = skus
+
+    def delete(self, plan, order_id):
+        batch = plan.batch_of.pop(order_id)
+        batch.remove(order_id, plan.cutoffs.pop(order_id), plan.sku_lists.pop(order_id), plan.cutoffs)
+        if len(batch) == 0:
+            plan.batches.remove(batch)
+
+    def pop(self, plan):
+        # The batch with the earliest cutoff leaves the plan, its orders are removed from the order book by the
+        # simulation, so the next repair does not count them as changes
+        batch = min(plan.batches, key=lambda batch: batch.cutoff)
+        plan.batches.remove(batch)
+        for order_id in batch.orders:
+            del plan.batch_of[order_id]
+            del plan.cutoffs[order_id]
+            del plan.sku_lists[order_id]
+        self.pops += 1
+        return batch.orders
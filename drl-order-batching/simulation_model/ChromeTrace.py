@@ -0,0 +1,108 @@
+import weakref
+import json
+import os
+
+
+class ChromeTrace:
+    '''
+    Timeline of an episode in the Chrome trace-event JSON format, for ui.perfetto.dev or chrome://tracing.
+
+    Every picking order is a track in the process of its cutoff wave, with a span from its release to System_out and
+    a span for every work station it visited (waiting and service), tardy picking orders are coloured red. The WIP,
+    busy resources and resources of every work station are counters of the stations process. Events are written when
+    a picking order leaves the system and counters only when they change, so memory does not grow with the episode.
+    close adds the closing bracket of the event array and is called by the simulation when the episode terminates,
+    the viewers also read a file without it. Events after close are dropped.
+
+    Args:
+            path (str): path of the JSON file
+            outbound_time (dict): travel time to the outbound area of the last work station of a route, by station
+    '''
+    STATIONS = ['PtG', 'GtP', 'DtO', 'StO']
+
+    # Number of timelines started by this process, used in the file names of episode_path
+    episodes = 0
+
+    def __init__(self, path, outbound_time):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.outbound_time = outbound_time
+        self.file = open(path, 'w')
+        self.file.write('[\n')
+        # The file is closed when the timeline is garbage collected, e.g. when the next episode replaces the simulation
+        self.finalizer = weakref.finalize(self, ChromeTrace.finish, self.file)
+        self.first = True
+        self.waves = set()
+        self.last_counters = {}
+        self.write({'ph': 'M', 'name': 'process_name', 'pid': 0, 'args': {'name': 'Work stations'}})
+
+    @staticmethod
+    def episode_path(directory, scenario):
+        ChromeTrace.episodes += 1
+        return os.path.join(directory, '{0}_{1}_{2}.json'.format(scenario, os.getpid(), ChromeTrace.episodes))
+
+    def write(self, event):
+        if self.file.closed:
+            return
+        if not self.first:
+            self.file.write(',\n')
+        self.file.write(json.dumps(event, separators=(',', ':')))
+        self.first = False
+
+    @staticmethod
+    def ts(t):
+        # Trace-event timestamps are in microseconds
+        return round(t * 1e6)
+
+    def order(self, order):
+        # Spans of a picking order that has left the system
+        pid = int(order.cutoff_time // 60)
+        if pid not in self.waves:
+            self.waves.add(pid)
+            day, hour = divmod(order.cutoff_time / 3600, 24)
+            self.write({'ph': 'M', 'name': 'process_name', 'pid': pid,
+                        'args': {'name': 'Cutoff day {0} {1:02d}:{2:02d}'.format(int(day), int(hour),
+                                                                                 int(round(hour % 1 * 60)))}})
+            self.write({'ph': 'M', 'name': 'process_sort_index', 'pid': pid, 'args': {'sort_index': pid}})
+
+        tardy = order.System_out > order.cutoff_time
+        self.write({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': order.ID,
+                    'args': {'name': 'Order {0} route {1}'.format(order.ID, order.route)}})
+        span = {'ph': 'X', 'name': 'Picking order', 'pid': pid, 'tid': order.ID, 'ts': self.ts(order.arr_time),
+                'dur': self.ts(order.System_out - order.arr_time),
+                'args': {'orders': int(order.nOrders), 'items_ptg': int(order.nItems_ptg),
+                         'items_gtp': int(order.nItems_gtp), 'route': int(order.route), 'action': int(order.action),
+                         'cutoff_time': float(order.cutoff_time), 'tardy': bool(tardy)}}
+        if tardy:
+            span['cname'] = 'terrible'
+        self.write(span)
+
+        # Work stations in the order of the visits, a station ends at its out time, at the arrival at the next
+        # station or, for the last station of the route, at the departure to the outbound area
+        visits = sorted((getattr(order, station + '_in'), station) for station in self.STATIONS
+                        if getattr(order, station + '_in') > 0)
+        for visit, (t_in, station) in enumerate(visits):
+            t_out = getattr(order, station + '_out')
+            if t_out < t_in:
+                t_out = visits[visit + 1][0] if visit + 1 < len(visits) else \
+                    order.System_out - self.outbound_time.get(station, 0)
+            self.write({'ph': 'X', 'name': station, 'pid': pid, 'tid': order.ID, 'ts': self.ts(t_in),
+                        'dur': self.ts(max(t_out - t_in, 0))})
+
+    def counters(self, t, queues):
+        # WIP, busy resources and resources of the work stations, written when they changed
+        for queue in queues:
+            values = (len(queue), queue.in_service, queue.servers or 0)
+            if self.last_counters.get(queue.station) != values:
+                self.last_counters[queue.station] = values
+                self.write({'ph': 'C', 'name': queue.station, 'pid': 0, 'ts': self.ts(t),
+                            'args': {'wip': values[0], 'busy': values[1], 'resources': values[2]}})
+
+    def close(self):
+        self.finalizer()
+
+    @staticmethod
+    def finish(file):
+        if not file.closed:
+            file.write('\n]\n')
+            file.close()
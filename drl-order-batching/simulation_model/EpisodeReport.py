@@ -0,0 +1,138 @@
+import operator
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Order groups of the 15 order categories, three categories (cutoff classes) per group
+GROUPS = ['sio_ptg', 'sio_gtp', 'mio_ptg', 'mio_gtp', 'mio_ptg_gtp']
+
+# Attributes of a picking order that are columns of the order table
+COLUMNS = ['ID', 'arr_time', 'cutoff_time', 'nOrders', 'nItems_ptg', 'nItems_gtp', 'route', 'category', 'action',
+           'PtG_in', 'PtG_out', 'GtP_in', 'GtP_out', 'DtO_in', 'DtO_out', 'StO_in', 'StO_out', 'System_out']
+INTEGER_COLUMNS = ['ID', 'nOrders', 'nItems_ptg', 'nItems_gtp', 'route', 'category', 'action']
+
+# Routes that are picked in the PtG area, the other routes are picked in the GtP area
+PTG_ROUTES = [1, 2, 3, 6]
+
+
+def order_table(finished_orders):
+    # Columnar table of the finished picking orders, in the order in which they left the system
+    getter = operator.attrgetter(*COLUMNS)
+    values = np.array([getter(order) for order in finished_orders], dtype=np.float64).reshape(-1, len(COLUMNS))
+    columns = {column: values[:, index] for index, column in enumerate(COLUMNS)}
+    for column in INTEGER_COLUMNS:
+        columns[column] = columns[column].astype(np.int64)
+
+    # Derived columns on the arrays, the frame is built once
+    columns['group'] = columns['category'] // 3
+    columns['tardy'] = columns['cutoff_time'] < columns['System_out']
+    columns['time_in_system'] = columns['System_out'] - columns['arr_time']
+    columns['picking_time'] = columns['time_in_system'] / columns['nOrders']
+    columns['storage_area_ptg'] = np.isin(columns['route'], PTG_ROUTES)
+    columns['storage_picking_time'] = (np.where(columns['storage_area_ptg'], columns['PtG_out'], columns['GtP_out']) -
+                                       columns['arr_time']) / columns['nOrders']
+    return pd.DataFrame(columns)
+
+
+class EpisodeReport:
+    '''
+    KPIs of an episode, computed with vectorized group-bys on one table of the finished picking orders.
+
+    The table is built with a single pass over the Order objects (order_table), every KPI and table of the report
+    is computed from its columns. save writes the table with the KPIs and the work station statistics to one
+    compressed file, .npz by default or .parquet (needs pyarrow), load reads it back.
+    In streaming mode the report holds the picking orders that were not retired into the wave statistics yet.
+
+    Args:
+            orders (DataFrame): table of the finished picking orders, see order_table
+            stations (dict): statistics of the work stations, see WAREHOUSESimulation.station_report
+            finish_time (float): simulation time at the end of the episode
+    '''
+
+    def __init__(self, orders, stations=None, finish_time=None):
+        self.orders = orders
+        self.stations = stations or {}
+        self.finish_time = finish_time
+
+    @classmethod
+    def from_simulation(cls, sim):
+        return cls(order_table(sim.finished_orders), sim.station_report(), float(sim.state_representation[-1]))
+
+    def kpis(self):
+        orders = self.orders
+        n_orders = int(orders['nOrders'].sum())
+        tardy_orders = int(orders['nOrders'][orders['tardy']].sum())
+        return {'picking_orders': len(orders), 'orders': n_orders, 'tardy_orders': tardy_orders,
+                'tardy_share': tardy_orders / n_orders if n_orders else 0.0,
+                'picking_time': float(orders['picking_time'].mean()) if len(orders) else 0.0,
+                'time_in_system': float((orders['time_in_system'] * orders['nOrders']).sum() / n_orders)
+                if n_orders else 0.0,
+                'finish_time': self.finish_time}
+
+    def aggregate(self, key):
+        orders = self.orders.assign(tardy_orders=self.orders['nOrders'] * self.orders['tardy'])
+        return orders.groupby(key).agg(picking_orders=('ID', 'size'), orders=('nOrders', 'sum'),
+                                       tardy_orders=('tardy_orders', 'sum'), picking_time=('picking_time', 'mean'))
+
+    def by_group(self):
+        # Picking orders, orders, tardy orders and mean picking time per order group
+        statistics = self.aggregate('group')
+        statistics.index = [GROUPS[group] for group in statistics.index]
+        return statistics
+
+    def by_cutoff(self):
+        # Picking orders, orders, tardy orders and mean picking time per cutoff wave
+        return self.aggregate('cutoff_time')
+
+    def progress(self):
+        # Cumulative number of finished orders per order group, at the System_out of every picking order
+        finished = np.zeros((len(self.orders), len(GROUPS)), dtype=np.int64)
+        finished[np.arange(len(self.orders)), self.orders['group'].values] = self.orders['nOrders'].values
+        return pd.DataFrame(np.cumsum(finished, axis=0), columns=GROUPS,
+                            index=pd.Index(self.orders['System_out'].values, name='time'))
+
+    def tardy(self):
+        # Cutoff time, finish time and order group of the tardy picking orders
+        tardy = self.orders[self.orders['tardy']]
+        return pd.DataFrame({'cutoff_time': tardy['cutoff_time'], 'System_out': tardy['System_out'],
+                             'group': [GROUPS[group] for group in tardy['group']]})
+
+    def storage_picking_times(self):
+        # Picking time per order up to the storage area (PtG or GtP) of the picking orders
+        return pd.DataFrame({'storage_area': np.where(self.orders['storage_area_ptg'], 'ptg', 'gtp'),
+                             'picking_time': self.orders['storage_picking_time'],
+                             'time': self.orders['System_out']})
+
+    def metadata(self):
+        return {'kpis': self.kpis(), 'stations': self.stations, 'finish_time': self.finish_time}
+
+    def save(self, directory, name='episode', format='npz'):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '{0}.{1}'.format(name, format))
+        if format == 'npz':
+            np.savez_compressed(path, metadata=json.dumps(self.metadata()),
+                                **{column: self.orders[column].values for column in self.orders.columns})
+        elif format == 'parquet':
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pandas(self.orders, preserve_index=False)
+            table = table.replace_schema_metadata(dict(table.schema.metadata or {},
+                                                       episode_report=json.dumps(self.metadata())))
+            pyarrow.parquet.write_table(table, path, compression='zstd')
+        else:
+            raise ValueError('unknown report format {0}, use npz or parquet'.format(format))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.parquet'):
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(path)
+            metadata = json.loads(table.schema.metadata[b'episode_report'])
+            orders = table.to_pandas()
+        else:
+            with np.load(path, allow_pickle=False) as file:
+                metadata = json.loads(str(file['metadata']))
+                orders = pd.DataFrame({column: file[column] for column in file.files if column != 'metadata'})
+        return cls(orders, metadata['stations'], metadata['finish_time'])
@@ -1,14 +1,22 @@
 class Event:
     ARRIVAL = 0
     DEPARTURE = 1
+    # Calendar events, scheduled at fixed times and not tied to an order
+    SHIFT = 2
+    REBALANCE = 3
 
-    def __init__(self, typ, station, time, order):  # type is a reserved word
+    def __init__(self, typ, station, time, order, shift=None):  # type is a reserved word
         self.type = typ
         self.station = station
         self.time = time
         self.order = order
+        self.shift = shift
 
     def __str__(self):
+        if self.type == Event.SHIFT:
+            return 'Start of shift ' + str(self.shift) + ' at t = ' + str(self.time)
+        if self.type == Event.REBALANCE:
+            return 'Rebalance check at t = ' + str(self.time)
         s = ('Arrival', 'Departure')
         return s[self.type] + " at station " + str(self.station) + ' at t = ' + str(self.time) + ' of order ' + str(
             self.order.ID)
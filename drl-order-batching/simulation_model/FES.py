@@ -5,9 +5,25 @@ class FES:
 
     def __init__(self):
         self.events = []
+        # Calendar events (shift starts, rebalance checks) in their own heap, so the order events are scanned
+        # without them and a step only compares the time of the next calendar event
+        self.calendar = []
 
     def add(self, event):
         heapq.heappush(self.events, event)
 
+    def schedule(self, event):
+        heapq.heappush(self.calendar, event)
+
+    def next_calendar_time(self):
+        return self.calendar[0].time if self.calendar else float('inf')
+
+    def pop_calendar(self, t):
+        # Calendar events at or before t, in time order
+        due = []
+        while self.calendar and self.calendar[0].time <= t:
+            due.append(heapq.heappop(self.calendar))
+        return due
+
 
 
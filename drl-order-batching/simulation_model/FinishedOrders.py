@@ -0,0 +1,97 @@
+import heapq
+import pandas as pd
+
+
+class FinishedOrders:
+    '''
+    Picking orders that have left the system, with the number of customer orders they hold as a running total.
+
+    With retire switched on (streaming mode) a finished picking order is kept until its cutoff wave has closed and is
+    then folded into the statistics of its wave, so memory follows the orders in progress and not the length of the
+    horizon. Without retire all finished picking orders are kept for the plots of SimResults.
+
+    Args:
+            retire (bool): fold the picking orders of closed cutoff waves into the wave statistics
+            timeline (ChromeTrace): timeline that gets the spans of every finished picking order, None for no timeline
+    '''
+
+    def __init__(self, retire=False, timeline=None):
+        self.retire_orders = retire
+        self.timeline = timeline
+        self.orders = []
+        self.n_orders = 0
+        # Statistics per cutoff time: picking orders, customer orders, tardy orders, total time in the system
+        self.waves = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __getstate__(self):
+        # Pickled without the timeline, like the simulation
+        state = self.__dict__.copy()
+        state['timeline'] = None
+        return state
+
+    def __getitem__(self, index):
+        if self.retire_orders:
+            return self.orders[index][2]
+        return self.orders[index]
+
+    def __iter__(self):
+        if self.retire_orders:
+            return (order for cutoff_time, order_id, order in self.orders)
+        return iter(self.orders)
+
+    def append(self, order):
+        self.n_orders += order.nOrders
+        if self.timeline is not None:
+            self.timeline.order(order)
+        if self.retire_orders:
+            heapq.heappush(self.orders, (order.cutoff_time, order.ID, order))
+        else:
+            self.orders.append(order)
+
+    def retire(self, t):
+        # Fold the picking orders of the cutoff waves that closed at or before t into the wave statistics
+        while self.retire_orders and self.orders and self.orders[0][0] <= t:
+            self.add_to_wave(heapq.heappop(self.orders)[2], self.waves)
+
+    @staticmethod
+    def add_to_wave(order, waves):
+        wave = waves.setdefault(order.cutoff_time, [0, 0, 0, 0.0])
+        wave[0] += 1
+        wave[1] += order.nOrders
+        wave[2] += order.nOrders if order.cutoff_time < order.System_out else 0
+        wave[3] += (order.System_out - order.arr_time) * order.nOrders
+
+    def wave_statistics(self):
+        # Picking orders, customer orders, tardy orders and the mean time in the system per cutoff wave, of the
+        # retired and the kept picking orders
+        waves = {cutoff_time: list(wave) for cutoff_time, wave in self.waves.items()}
+        for order in self:
+            self.add_to_wave(order, waves)
+        statistics = pd.DataFrame.from_dict(waves, orient='index',
+                                            columns=['picking_orders', 'orders', 'tardy_orders', 'time_in_system'])
+        statistics['time_in_system'] /= statistics['orders']
+        statistics.index.name = 'cutoff_time'
+        return statistics.sort_index()
+
+
+class RunningMean:
+    '''
+    Count and total of a KPI that is registered every decision, in place of a list that grows with the horizon.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        self.count += 1
+        self.total += value
+
+    def mean(self):
+        return self.total / self.count
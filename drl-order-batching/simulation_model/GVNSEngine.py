@@ -0,0 +1,195 @@
+import time
+import numpy as np
+import pandas as pd
+
+
+class GVNSEngine:
+    '''
+    Anytime general variable neighbourhood search (GVNS) for the PtG pick-by-batch decisions of the GVNS heuristic.
+
+    A solution assigns every candidate order to a batch, stored as an integer array, and every move works on a copy
+    of it, so candidate solutions never change the incumbent. The search starts from the EDD construction (the
+    orders in cutoff order in batches of batch_size orders). Every iteration shakes the incumbent with k random moves
+    of the shake neighbourhood (k = 1..k_max) and improves the result with a VND over the neighbourhoods in the given
+    order. The search stops after max_iterations iterations, when the time budget has passed or after max_stall
+    iterations without improvement. The incumbent is available at any time, so the budget can be tuned against
+    decision latency with the convergence traces.
+
+    A solution is evaluated on the picking time of its batches, the number of unique SKUs of a batch times the mean
+    picking time per item plus the picking constant. The longest batch is minimized, ties are broken by the total
+    picking time. The mean picking time keeps the objective deterministic, so solutions are compared on their
+    batches and not on sampled picking times.
+
+    Neighbourhoods:
+            insert: move one order to a batch with less than max_batchsize orders
+            swap: swap two orders of different batches
+            swap_2_1: swap two orders of a batch with one order of a batch with less than max_batchsize orders
+
+    Args:
+            max_batchsize (int): maximum number of orders in a batch
+            picking_time (float): mean picking time per unique SKU
+            picking_constant (float): picking time per batch
+            neighbourhoods (list): VND neighbourhoods in the order they are searched
+            shake (str): neighbourhood of the shake moves
+            k_max (int): maximum number of shake moves
+            max_iterations (int): maximum number of shake plus VND iterations per decision
+            time_budget (float): wall-clock seconds per decision, None for no budget
+            max_stall (int): iterations without improvement before the search stops, None for no limit
+            vnd_samples (int): random moves tried in a neighbourhood before the VND moves to the next one
+            batch_size (int): orders per batch of the EDD construction
+    '''
+
+    def __init__(self, max_batchsize, picking_time, picking_constant, neighbourhoods=('insert', 'swap'),
+                 shake='insert', k_max=2, max_iterations=5, time_budget=None, max_stall=None, vnd_samples=20,
+                 batch_size=None):
+        self.max_batchsize = max_batchsize
+        self.picking_time = picking_time
+        self.picking_constant = picking_constant
+        self.moves = {'insert': self.insert, 'swap': self.swap, 'swap_2_1': self.swap_2_1}
+        for neighbourhood in list(neighbourhoods) + [shake]:
+            if neighbourhood not in self.moves:
+                raise ValueError('unknown neighbourhood {0}, use one of {1}'.format(neighbourhood, list(self.moves)))
+        self.neighbourhoods = list(neighbourhoods)
+        self.shake = shake
+        self.k_max = k_max
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.max_stall = max_stall
+        self.vnd_samples = vnd_samples
+        self.batch_size = batch_size or max_batchsize
+
+        # Convergence trace of every decision: (seconds, iteration, evaluations, longest batch, total picking time)
+        # of the construction and of every improvement of the incumbent
+        self.traces = []
+
+    def load(self, orders):
+        # Compact problem arrays: the (order, SKU) pairs of the candidate orders with SKUs numbered 0..n_skus-1
+        sku_lists = orders['skuIDlist'].values
+        self.n_orders = len(orders)
+        self.pair_order = np.repeat(np.arange(self.n_orders), [len(sku_list) for sku_list in sku_lists])
+        skus = np.fromiter((sku for sku_list in sku_lists for sku in sku_list), dtype=np.int64,
+                           count=len(self.pair_order))
+        skus, self.pair_sku = np.unique(skus, return_inverse=True)
+        self.n_skus = max(len(skus), 1)
+        self.n_batches = -(-self.n_orders // self.batch_size)
+        self.sku_in_batch = np.zeros(self.n_batches * self.n_skus, dtype=bool)
+        self.evaluations = 0
+
+    def evaluate(self, batch_of):
+        self.evaluations += 1
+        keys = batch_of[self.pair_order] * self.n_skus + self.pair_sku
+        self.sku_in_batch[keys] = True
+        unique_skus = self.sku_in_batch.reshape(self.n_batches, self.n_skus).sum(axis=1)
+        self.sku_in_batch[keys] = False
+
+        picking_times = unique_skus * self.picking_time + self.picking_constant
+        picking_times = picking_times[np.bincount(batch_of, minlength=self.n_batches) > 0]
+        return picking_times.max(), picking_times.sum()
+
+    def insert(self, batch_of, rng):
+        sizes = np.bincount(batch_of, minlength=self.n_batches)
+        order = rng.integers(self.n_orders)
+        batches_in = np.flatnonzero(sizes < self.max_batchsize)
+        batches_in = batches_in[batches_in != batch_of[order]]
+        if len(batches_in) == 0:
+            return None
+        solution = batch_of.copy()
+        solution[order] = batches_in[rng.integers(len(batches_in))]
+        return solution
+
+    def swap(self, batch_of, rng):
+        order_1, order_2 = rng.integers(self.n_orders, size=2)
+        if batch_of[order_1] == batch_of[order_2]:
+            return None
+        solution = batch_of.copy()
+        solution[order_1], solution[order_2] = batch_of[order_2], batch_of[order_1]
+        return solution
+
+    def swap_2_1(self, batch_of, rng):
+        sizes = np.bincount(batch_of, minlength=self.n_batches)
+        batches_out = np.flatnonzero(sizes >= 2)
+        batches_in = np.flatnonzero((sizes >= 1) & (sizes < self.max_batchsize))
+        if len(batches_out) == 0 or len(batches_in) == 0:
+            return None
+        batch_out = batches_out[rng.integers(len(batches_out))]
+        batch_in = batches_in[rng.integers(len(batches_in))]
+        if batch_out == batch_in:
+            return None
+        orders_out = rng.choice(np.flatnonzero(batch_of == batch_out), size=2, replace=False)
+        order_in = rng.choice(np.flatnonzero(batch_of == batch_in))
+        solution = batch_of.copy()
+        solution[orders_out] = batch_in
+        solution[order_in] = batch_out
+        return solution
+
+    def vnd(self, batch_of, value, rng, deadline):
+        # First improvement over random moves of every neighbourhood, back to the first neighbourhood on improvement
+        neighbourhood = 0
+        while neighbourhood < len(self.neighbourhoods):
+            move = self.moves[self.neighbourhoods[neighbourhood]]
+            improved = False
+            for sample in range(self.vnd_samples):
+                solution = move(batch_of, rng)
+                if solution is None:
+                    continue
+                solution_value = self.evaluate(solution)
+                if solution_value < value:
+                    batch_of, value, improved = solution, solution_value, True
+                    break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            neighbourhood = 0 if improved else neighbourhood + 1
+        return batch_of, value
+
+    def solve(self, orders, rng=None):
+        '''
+        Searches batches for the candidate orders, sorted on cutoff time.
+
+        Returns:
+                positions of the orders in the batch of the first order (the order with the earliest cutoff time)
+        '''
+        t_start = time.perf_counter()
+        deadline = None if self.time_budget is None else t_start + self.time_budget
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(2 ** 31))
+        self.load(orders)
+
+        best = np.arange(self.n_orders) // self.batch_size
+        best_value = self.evaluate(best)
+        trace = [(0.0, 0, self.evaluations) + best_value]
+
+        iteration = 0
+        stall = 0
+        while iteration < self.max_iterations and (self.max_stall is None or stall < self.max_stall):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            improved = False
+            k = 1
+            while k <= self.k_max:
+                # Shake with k random moves, then descend from the shaken solution
+                solution = best
+                for move in range(k):
+                    solution = self.moves[self.shake](solution, rng)
+                    if solution is None:
+                        solution = best
+                solution, value = self.vnd(solution, self.evaluate(solution), rng, deadline)
+                if value < best_value:
+                    best, best_value, improved = solution, value, True
+                    trace.append((time.perf_counter() - t_start, iteration + 1, self.evaluations) + best_value)
+                    k = 1
+                else:
+                    k += 1
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+            iteration += 1
+            stall = 0 if improved else stall + 1
+
+        self.traces.append(trace)
+        return np.flatnonzero(best == best[0])
+
+    def trace_frame(self):
+        # Convergence traces of all decisions as one frame, to tune the termination criteria against latency
+        columns = ['seconds', 'iteration', 'evaluations', 'longest_batch', 'total_picking_time']
+        frames = [pd.DataFrame(trace, columns=columns).assign(decision=decision)
+                  for decision, trace in enumerate(self.traces)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns + ['decision'])
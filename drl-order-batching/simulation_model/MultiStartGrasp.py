@@ -0,0 +1,132 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import random
+import copy
+import time
+import numpy as np
+
+# Attributes of the simulation used by grasp_construct, vnd_grasp and the methods they call
+SOLVER_ATTRIBUTES = ['config', 'actions_pick_by_batch', 'max_batchsize_ptg', 'max_batchsize_ptg_items', 'PtG_Out_time',
+                     'PtG_GtP_time', 'StO_time', 'GtP_StO_time', 'GtP_picking_time', 'PtG_picking_item',
+                     'PtG_picking_time', 'PtG_picking_constant']
+
+# Shared incumbent of a worker process, set by init_worker
+worker = {}
+
+
+def init_worker(incumbent):
+    # The solver copies are unpickled with the simulation model, import it before the first decision
+    from .WAREHOUSESimulation import WAREHOUSESimulation
+    worker['incumbent'] = incumbent
+
+
+def make_solver(sim):
+    # Copy of the simulation without the episode state (orders, events, queues, results), sent to the workers
+    solver = copy.copy(sim)
+    solver.__dict__ = {name: sim.__dict__[name] for name in SOLVER_ATTRIBUTES}
+    solver.batch_list = []
+    return solver
+
+
+def run_starts(solver, action, all_picking_items, t, deadline, max_starts, seed=None, incumbent=None):
+    '''
+    Runs GRASP starts (construction plus VND) until max_starts starts are done or the time.time() deadline has
+    passed. The first start always runs, so every call returns a solution.
+
+    Every start result is compared with the incumbent that is shared by all workers. Only a solution that holds the
+    incumbent is sent back, the solutions of the other workers are dropped in the worker.
+
+    Returns:
+            best result, best solution (None when another worker holds the incumbent) and the number of starts
+    '''
+    if incumbent is None:
+        incumbent = worker['incumbent']
+    if seed is not None:
+        # Every worker samples its own moves and picking times. The picking time distribution is pickled with a
+        # copy of the random state of the simulation process, so it gets its own seed as well.
+        random.seed(seed)
+        np.random.seed(seed)
+        solver.PtG_picking_item.dist.random_state = seed
+        solver.PtG_picking_item.resample()
+
+    best_solution, best_result, starts = None, np.inf, 0
+    while starts < max_starts and (starts == 0 or time.time() < deadline):
+        solution, result = solver.vnd_grasp(solver.grasp_construct(action, all_picking_items, t), deadline,
+                                            copy_moves=True)
+        starts += 1
+        if result < best_result:
+            best_solution, best_result = solution, result
+        with incumbent.get_lock():
+            if result < incumbent.value:
+                incumbent.value = result
+
+    if best_result > incumbent.value:
+        best_solution = None
+    return best_result, best_solution, starts
+
+
+class MultiStartGrasp:
+    '''
+    Multi-start GRASP for the pick-by-batch decisions of the GRASP_MS heuristic.
+
+    A decision runs independent randomized constructions, each followed by VND, on a pool of worker processes until
+    max_starts starts are done or the time budget has passed, and returns the best solution of all starts. The best
+    result found so far is shared by the workers. The pool is started once and shared by all instances with the same
+    number of workers. Workers are spawned, so a script that uses the pool must create its simulations under
+    if __name__ == '__main__'.
+
+    The number of starts of a decision depends on the speed of the host, so decisions are not reproducible with
+    random.seed and np.random.seed as the other heuristics are.
+
+    Args:
+            time_budget (float): wall-clock seconds per decision
+            max_starts (int): maximum number of starts per decision, divided over the workers
+            n_workers (int): worker processes, 0 runs the starts in the simulation process
+    '''
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, time_budget=0.5, max_starts=64, n_workers=4):
+        self.time_budget = time_budget
+        self.max_starts = max_starts
+        self.n_workers = n_workers
+        self.starts = []
+
+    def pool(self):
+        # Executor, shared incumbent and decision lock of the pool with n_workers workers
+        with MultiStartGrasp.pools_lock:
+            if self.n_workers not in MultiStartGrasp.pools:
+                context = multiprocessing.get_context('spawn')
+                incumbent = context.Value('d', np.inf)
+                executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=context,
+                                               initializer=init_worker, initargs=(incumbent,))
+                # Start all workers now, so the budget of the first decision is not spent on starting processes
+                list(executor.map(time.sleep, [0.1] * self.n_workers))
+                MultiStartGrasp.pools[self.n_workers] = (executor, incumbent, threading.Lock())
+            return MultiStartGrasp.pools[self.n_workers]
+
+    def solve(self, sim, action, all_picking_items, t):
+        if self.n_workers == 0:
+            deadline = time.time() + self.time_budget
+            incumbent = multiprocessing.Value('d', np.inf)
+            best_result, best_solution, starts = run_starts(sim, action, all_picking_items, t, deadline,
+                                                            self.max_starts, incumbent=incumbent)
+            self.starts.append(starts)
+            return best_solution, best_result
+
+        executor, incumbent, lock = self.pool()
+        deadline = time.time() + self.time_budget
+        solver = make_solver(sim)
+        # Starts per worker, the workers are seeded from the random state of the simulation process
+        max_starts = [len(starts) for starts in np.array_split(np.arange(self.max_starts), self.n_workers)]
+        with lock:
+            incumbent.value = np.inf
+            futures = [executor.submit(run_starts, solver, action, all_picking_items, t, deadline, max(n, 1),
+                                       random.getrandbits(32)) for n in max_starts]
+            results = [future.result() for future in futures]
+
+        self.starts.append(sum(starts for result, solution, starts in results))
+        best_result, best_solution, starts = min((result for result in results if result[1] is not None),
+                                                 key=lambda result: result[0])
+        return best_solution, best_result
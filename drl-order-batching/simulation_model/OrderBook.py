@@ -0,0 +1,107 @@
+import pandas as pd
+import numpy as np
+
+
+class OrderBook:
+    '''
+    Bookkeeping of the open orders of an episode without copying order frames at every dispatch.
+
+    The orders of the episode are kept in one frame with a liveness bitmap. Removing orders clears their bits and
+    marks their categories dirty, which costs O(batch size). Every order category is a list of positions into the
+    frame; the frame of a dirty category is rebuilt from its live positions the next time it is used, so orders
+    that were removed (tombstones) are swept lazily and categories that are not used are never copied.
+
+    The book indexes like the list of category frames it replaces: book[i] is the frame of category i.
+
+    In streaming mode arriving orders are added with extend, which also drops the removed orders, so the frame holds
+    the open orders only.
+
+    With a SimilarityIndex the MinHash signatures of the orders are added with the orders and removed when the orders
+    are removed, so the index holds the open orders of the book.
+
+    Args:
+            data (DataFrame): orders of the episode, sorted on cutoff time
+            similarity (SimilarityIndex): approximate SKU-similarity index of the open orders, None for no index
+    '''
+
+    def __init__(self, data, similarity=None):
+        self.similarity = similarity
+        self.index(data)
+        if similarity is not None:
+            similarity.add(data['orderID'].values, data['skuIDlist'].values)
+
+    def index(self, data):
+        self.data = data
+        self.alive = np.ones(len(data), dtype=bool)
+        order_ids = data['orderID'].values
+        self.id_order = np.argsort(order_ids, kind='stable')
+        self.sorted_ids = order_ids[self.id_order]
+
+        self.positions = []
+        self.frames = []
+        self.dirty = []
+        self.category_of = np.full(len(data), -1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, category):
+        if self.dirty[category]:
+            positions = self.positions[category]
+            positions = positions[self.alive[positions]]
+            self.positions[category] = positions
+            self.frames[category] = self.data.iloc[positions]
+            self.dirty[category] = False
+        return self.frames[category]
+
+    def __iter__(self):
+        return (self[category] for category in range(len(self)))
+
+    def find(self, order_ids):
+        # Positions of orders in the frame of the episode
+        return self.id_order[np.searchsorted(self.sorted_ids, order_ids)]
+
+    def category_positions(self, category, order_ids):
+        # Positions in the frame of a category of the given orders, in frame order, orders of other categories and
+        # removed orders are skipped
+        self[category]
+        positions = self.find(np.fromiter(order_ids, dtype=self.sorted_ids.dtype, count=len(order_ids)))
+        positions = positions[self.category_of[positions] == category]
+        return np.sort(np.searchsorted(self.positions[category], positions))
+
+    def set_categories(self, frames):
+        # Category frames of build_state_representation, derived from the live orders
+        self.category_of[:] = -1
+        self.positions = []
+        for category, frame in enumerate(frames):
+            positions = self.find(frame['orderID'].values)
+            self.category_of[positions] = category
+            self.positions.append(positions)
+        self.frames = list(frames)
+        self.dirty = [False] * len(frames)
+
+    def remove(self, order_ids):
+        positions = self.find(np.unique(order_ids))
+        positions = positions[self.alive[positions]]
+        self.alive[positions] = False
+        if self.similarity is not None:
+            self.similarity.remove(self.data['orderID'].values[positions])
+        for category in np.unique(self.category_of[positions]):
+            if category >= 0:
+                self.dirty[category] = True
+        self.category_of[positions] = -1
+
+    def live_orders(self):
+        return self.data[self.alive]
+
+    def extend(self, data):
+        # Add arrived orders and drop the removed orders, the frame stays sorted on cutoff time. The categories are
+        # invalid until set_categories is called with the categories of the new frame.
+        if len(data) == 0 and self.alive.all():
+            return
+        live = self.live_orders()
+        if len(data) > 0:
+            live = pd.concat([live, data]).sort_values(by='cutoff_time', kind='stable')
+            if self.similarity is not None:
+                self.similarity.add(data['orderID'].values, data['skuIDlist'].values)
+        self.index(live)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+class OrderStream:
+    '''
+    Orders of a streaming simulation, pulled in arrival time order from an iterable of order frames.
+
+    The chunks must be sorted on arrival time and a chunk may not start before the end of the previous chunk, e.g. the
+    frames of OrderGenerator.stream or of read_order_chunks for a csv file that is sorted on arrival time. Only the
+    chunk that holds the next arrival is kept in memory, so a horizon of any length can be streamed.
+
+    Args:
+            chunks (iterable): order frames with the columns of order_generator.COLUMNS
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = None
+        self.arrival = None
+        self.position = 0
+        self.last_arrival = -np.inf
+        self.empty = None
+        self.pulled = 0
+        if not self.fill():
+            raise ValueError('the order stream has no orders')
+
+    def fill(self):
+        # Load the next non-empty chunk when the buffered chunk is used up, False when the stream has ended
+        while self.buffer is None or self.position >= len(self.buffer):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return False
+            if len(chunk) == 0:
+                continue
+            arrival = chunk['arrival_time'].values
+            if arrival[0] < self.last_arrival or np.any(np.diff(arrival) < 0):
+                raise ValueError('order chunks must be sorted on arrival time')
+            self.buffer, self.arrival, self.position = chunk, arrival, 0
+            self.last_arrival = arrival[-1]
+            if self.empty is None:
+                self.empty = chunk.iloc[0:0]
+        return True
+
+    def pull(self, t):
+        # Orders that arrive at or before t and were not pulled before
+        frames = []
+        while self.fill():
+            end = np.searchsorted(self.arrival, t, side='right')
+            if end > self.position:
+                frames.append(self.buffer.iloc[self.position:end])
+                self.position = end
+            if end < len(self.buffer):
+                break
+        if not frames:
+            return self.empty
+        arrived = frames[0] if len(frames) == 1 else pd.concat(frames)
+        self.pulled += len(arrived)
+        return arrived
+
+    def next_arrival(self):
+        # Arrival time of the next order that was not pulled, None when the stream has ended
+        return self.arrival[self.position] if self.fill() else None
+
+    def exhausted(self):
+        return not self.fill()
@@ -0,0 +1,75 @@
+import time
+
+
+class Profiler:
+    '''
+    Collects the wall-clock time of the phases of a simulation step.
+
+    Per phase the number of calls, the total, minimum and maximum time and a histogram with power-of-two
+    buckets in microseconds are kept, so memory does not grow with the number of steps.
+
+    Usage:
+            t = profiler.tick()
+            ...  # phase
+            t = profiler.tock('phase', t)
+    '''
+
+    def __init__(self):
+        self.phases = {}
+
+    def tick(self):
+        return time.perf_counter()
+
+    def tock(self, phase, t_start):
+        t_end = time.perf_counter()
+        duration = t_end - t_start
+
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = {'calls': 0, 'total': 0.0, 'min': duration, 'max': duration,
+                                          'histogram': {}}
+        stats['calls'] += 1
+        stats['total'] += duration
+        if duration < stats['min']:
+            stats['min'] = duration
+        if duration > stats['max']:
+            stats['max'] = duration
+
+        # bucket b holds durations in [2^(b-1), 2^b) microseconds
+        bucket = int(duration * 1e6).bit_length()
+        stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+        return t_end
+
+    def report(self):
+        total = sum(stats['total'] for phase, stats in self.phases.items() if phase != 'step')
+        report = {}
+        for phase, stats in sorted(self.phases.items(), key=lambda x: -x[1]['total']):
+            report[phase] = {'calls': stats['calls'],
+                             'total_s': round(stats['total'], 6),
+                             'mean_us': round(stats['total'] / stats['calls'] * 1e6, 2),
+                             'min_us': round(stats['min'] * 1e6, 2),
+                             'max_us': round(stats['max'] * 1e6, 2),
+                             'share': round(stats['total'] / total, 4) if total > 0 and phase != 'step' else None,
+                             'histogram_us': {2 ** bucket: count for bucket, count in sorted(stats['histogram'].items())}}
+        return report
+
+    def reset(self):
+        self.phases = {}
+
+
+class NullProfiler:
+    '''
+    Profiler that is used when profiling is switched off, it only costs a function call per phase.
+    '''
+
+    def tick(self):
+        return 0
+
+    def tock(self, phase, t_start):
+        return 0
+
+    def report(self):
+        return {}
+
+    def reset(self):
+        pass
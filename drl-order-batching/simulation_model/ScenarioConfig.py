@@ -0,0 +1,261 @@
+from collections.abc import Mapping
+import os
+import numpy as np
+import yaml
+
+# Routes of the actions and order categories of the actions, the structure of the warehouse model
+ACTION_ROUTE = {0: 1, 1: 2, 2: 5, 3: 5, 4: 1, 5: 3, 6: 5, 7: 4, 8: 3, 9: 6}
+ROUTE_ACTIONS = {1: [0, 4], 2: [1], 3: [5, 8], 4: [7], 5: [2, 3, 6], 6: [9]}
+ACTION_CATEGORIES = {0: [0, 1, 2], 1: [0, 1, 2], 2: [3, 4, 5], 3: [3, 4, 5], 4: [6, 7, 8],
+                     5: [6, 7, 8], 6: [9, 10, 11], 7: [9, 10, 11], 8: [12, 13, 14], 9: [12, 13, 14]}
+CATEGORY_ACTIONS = {0: [0, 1], 1: [0, 1], 2: [0, 1], 3: [2, 3], 4: [2, 3], 5: [2, 3], 6: [4, 4],
+                    7: [4, 5], 8: [4, 5], 9: [6, 7], 10: [6, 7], 11: [6, 7], 12: [8, 9],
+                    13: [8, 9], 14: [8, 9]}
+
+# Resource of a route in the state representation, 15: PtG pickers, 16: GtP shuttles
+ROUTE_RESOURCE = {1: 15, 2: 15, 3: 15, 4: 16, 5: 16, 6: 15}
+
+N_CATEGORIES = 15
+N_FEATURES = 20
+
+# Required keys of the simulation section
+RESOURCE_KEYS = ['nPtG_pickers', 'nGtP_shuttles', 'nStO_operators', 'nDtO_operators']
+TIME_KEYS = ['PtG_picking_time', 'PtG_picking_constant', 'GtP_picking_time', 'DtO_time', 'StO_time',
+             'time_step_arrival', 'PtG_Out_time', 'PtG_Pack_time', 'Pack_Out_time', 'GtP_DtO_time', 'DtO_Out_time',
+             'GtP_StO_time', 'StO_Pack_time', 'StO_Out_time', 'PtG_GtP_time']
+SIZE_KEYS = ['virtual_q_ptg', 'virtual_q_gtp', 'virtual_q_dto', 'virtual_q_sto', 'state_clipping',
+             'max_batchsize_ptg', 'max_batchsize_ptg_items', 'max_batchsize_gtp', 'max_batchsize_ptg_gtp']
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def freeze(value):
+    # Read-only copy of a parsed yaml value: dicts become sections and lists become tuples
+    if isinstance(value, dict):
+        return FrozenSection({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    # Plain yaml values of a frozen value
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class FrozenSection(dict):
+    '''
+    Read-only section of a compiled scenario config. It is a dict, so lookups cost the same as in the parsed yaml,
+    but every method that changes it raises a TypeError.
+    '''
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError('scenario config sections are read-only, use ScenarioConfig.replace')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = read_only
+
+    def __reduce__(self):
+        return FrozenSection, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ScenarioConfig(Mapping):
+    '''
+    Validated, immutable scenario config with the values that the simulation derives from it.
+
+    The config is validated once when it is compiled, so a wrong or missing key fails when the scenario is loaded
+    and not in the middle of an episode. The sections index like the parsed yaml (config['simulation'][key]) but
+    are read-only, lists are tuples. Derived values are computed once:
+
+            state_clip, state_scale: clip and scale vectors of the first 19 state features, see clip_state
+            action_route, route_actions, action_categories, category_actions: routing tables of the actions
+            pick_by_batch: set of the pick-by-batch actions
+
+    A compiled config pickles as its parsed yaml and is compiled again on unpickling, so environment workers get it
+    without reading the scenario file. Use replace to change values, e.g. the throughput of a benchmark.
+
+    Args:
+            config (dict): parsed scenario config
+            name (str): name of the scenario, used in error messages
+    '''
+    __slots__ = ('name', 'sections', 'state_clip', 'state_scale', 'action_route', 'route_actions',
+                 'action_categories', 'category_actions', 'pick_by_batch', 'category_action_bits',
+                 'resource_action_bits')
+
+    # Compiled configs of the scenario files read by this process, by path and modification time
+    cache = {}
+
+    def __init__(self, config, name='scenario'):
+        set_slot = object.__setattr__
+        set_slot(self, 'name', name)
+        self.validate(config, name)
+        set_slot(self, 'sections', FrozenSection({section: freeze(values) for section, values in config.items()}))
+        simulation = self.sections['simulation']
+        environment = self.sections['environment']
+
+        # Order categories are clipped to state_clipping, resources (15, 16) are not clipped, the orders in the
+        # system (17) and the tardy orders (18) are clipped to the throughput and half the throughput
+        clip = simulation['state_clipping']
+        throughput = environment['throughput']
+        state_clip = np.array([clip] * N_CATEGORIES + [np.inf, np.inf, throughput, throughput / 2], dtype=np.float64)
+        state_scale = np.array([clip] * N_CATEGORIES + [1, 1, throughput, throughput / 2], dtype=np.float64)
+        state_clip.setflags(write=False)
+        state_scale.setflags(write=False)
+        set_slot(self, 'state_clip', state_clip)
+        set_slot(self, 'state_scale', state_scale)
+
+        set_slot(self, 'action_route', freeze(ACTION_ROUTE))
+        set_slot(self, 'route_actions', freeze(ROUTE_ACTIONS))
+        set_slot(self, 'action_categories', freeze(ACTION_CATEGORIES))
+        set_slot(self, 'category_actions', freeze(CATEGORY_ACTIONS))
+
+        # Actions of every order category and actions of every resource feature as bit sets (bit i is action i), the
+        # tables of the action mask of the simulation
+        set_slot(self, 'category_action_bits', tuple(sum(1 << action for action in set(CATEGORY_ACTIONS[category]))
+                                                     for category in range(N_CATEGORIES)))
+        set_slot(self, 'resource_action_bits', FrozenSection({
+            resource: sum(1 << action for action, route in ACTION_ROUTE.items() if ROUTE_RESOURCE[route] == resource)
+            for resource in sorted(set(ROUTE_RESOURCE.values()))}))
+
+        set_slot(self, 'pick_by_batch', frozenset(simulation['actions_pick_by_batch']))
+
+    @staticmethod
+    def validate(config, name='scenario'):
+        def fail(message):
+            raise ValueError('{0}: {1}'.format(name, message))
+
+        for section in ['simulation', 'environment']:
+            if not isinstance(config.get(section), Mapping):
+                fail('missing section ' + section)
+        simulation = config['simulation']
+        environment = config['environment']
+        missing = [key for key in RESOURCE_KEYS + TIME_KEYS + SIZE_KEYS + ['shift_start', 'Pack_time',
+                                                                          'actions_pick_by_batch']
+                   if key not in simulation]
+        missing += ['environment.' + key for key in ['observation_space', 'action_space', 'throughput', 't_start',
+                                                     'time_window'] if key not in environment]
+        if missing:
+            fail('missing keys ' + ', '.join(missing))
+
+        for key in RESOURCE_KEYS:
+            values = simulation[key]
+            if not isinstance(values, (list, tuple)) or len(values) == 0 or \
+                    not all(isinstance(value, int) and value >= 0 for value in values):
+                fail('{0} must be a list with the number of resources of every shift'.format(key))
+            if len(values) != len(simulation['shift_start']):
+                fail('{0} must have a value for every shift in shift_start'.format(key))
+        shifts = simulation.get('shifts', len(simulation['shift_start']))
+        if not isinstance(shifts, int) or shifts < 1 or shifts != len(simulation['shift_start']):
+            fail('shifts must be the number of shifts in shift_start')
+        if 'shift_length' in simulation and len(simulation['shift_length']) != shifts:
+            fail('shift_length must have a value for every shift in shift_start')
+        for key in TIME_KEYS:
+            if not is_number(simulation[key]) or simulation[key] < 0:
+                fail('{0} must be a number >= 0'.format(key))
+        for key in SIZE_KEYS:
+            if not isinstance(simulation[key], int) or simulation[key] < 1:
+                fail('{0} must be an integer >= 1'.format(key))
+        if simulation.get('rebalance_interval') is not None and \
+                (not is_number(simulation['rebalance_interval']) or simulation['rebalance_interval'] <= 0):
+            fail('rebalance_interval must be a number > 0 or null')
+        share = simulation.get('rebalance_min_share', 0.5)
+        if not is_number(share) or not 0 <= share <= 1:
+            fail('rebalance_min_share must be a number between 0 and 1')
+        if len(simulation['Pack_time']) != 2 or not all(is_number(value) for value in simulation['Pack_time']):
+            fail('Pack_time must be the packing times of SIO and MIO orders')
+
+        if environment['observation_space'] != N_FEATURES:
+            fail('observation_space must be {0}, the number of state features'.format(N_FEATURES))
+        if environment['action_space'] <= max(ACTION_ROUTE):
+            fail('action_space must hold the {0} batching actions and the no-op'.format(len(ACTION_ROUTE)))
+        if not isinstance(environment['throughput'], int) or environment['throughput'] < 1:
+            fail('throughput must be an integer >= 1')
+        if any(action not in ACTION_ROUTE for action in simulation['actions_pick_by_batch']):
+            fail('actions_pick_by_batch must be batching actions 0-{0}'.format(max(ACTION_ROUTE)))
+        if not isinstance(simulation.get('similarity_index', False), bool):
+            fail('similarity_index must be true or false')
+        for key in ['lsh_bands', 'lsh_rows']:
+            if not isinstance(simulation.get(key, 1), int) or simulation.get(key, 1) < 1:
+                fail('{0} must be an integer >= 1'.format(key))
+        share = simulation.get('plan_rebuild_share', 0.5)
+        if not is_number(share) or share <= 0:
+            fail('plan_rebuild_share must be a number > 0')
+        if not isinstance(simulation.get('results_directory', 'results'), str):
+            fail('results_directory must be a directory')
+        if simulation.get('timeline') is not None and not isinstance(simulation['timeline'], str):
+            fail('timeline must be the directory of the timelines or null')
+        if environment.get('warm_start') is not None and not isinstance(environment['warm_start'], str):
+            fail('warm_start must be the path of a warm start library or null')
+        share = environment.get('warm_start_share', 0.5)
+        if not is_number(share) or not 0 <= share <= 1:
+            fail('warm_start_share must be a number between 0 and 1')
+        time_window = environment['time_window']
+        if len(time_window) != 2 or not time_window[0] < time_window[1]:
+            fail('time_window must be [start, end] with start < end')
+
+    @classmethod
+    def load(cls, scenario, directory='config'):
+        # Compiled config of config/<scenario>.yml, a compiled config is returned as it is
+        if isinstance(scenario, ScenarioConfig):
+            return scenario
+        path = os.path.join(directory, scenario + '.yml')
+        key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+        if key not in cls.cache:
+            with open(path) as file:
+                cls.cache[key] = cls(yaml.full_load(file), scenario)
+        return cls.cache[key]
+
+    @classmethod
+    def compile(cls, config, name='scenario'):
+        # Compiled config of a parsed config, a compiled config is returned as it is
+        if isinstance(config, ScenarioConfig):
+            return config
+        return cls(config, name)
+
+    def replace(self, section, **values):
+        # New compiled config with changed values of a section
+        config = self.to_dict()
+        config[section].update(values)
+        return ScenarioConfig(config, self.name)
+
+    def to_dict(self):
+        # Parsed yaml of the config, a mutable copy
+        return thaw(self.sections)
+
+    def __getitem__(self, section):
+        return self.sections[section]
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ScenarioConfig is immutable, use replace')
+
+    def __delattr__(self, name):
+        raise AttributeError('ScenarioConfig is immutable, use replace')
+
+    def __reduce__(self):
+        return ScenarioConfig, (self.to_dict(), self.name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return 'ScenarioConfig({0!r})'.format(self.name)
@@ -1,11 +1,16 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
+import os
+
+from .EpisodeReport import EpisodeReport, order_table, GROUPS
 
 class SimResults:
     def __init__(self, config):
       self.tardy_orders = 0
       self.tardy_orders_list = []
+      # Keep the tardy picking orders for plot_tardy_orders, switched off in streaming mode
+      self.keep_orders = True
       self.tardy_orders_list_all = []
       self.time_register = []
       self.order_progress = []
@@ -52,11 +57,15 @@ class SimResults:
       self.order_progress_individual = []
       
       self.actions_pick_by_batch = config['simulation']['actions_pick_by_batch']
+
+      # Directory of the csv files and figures of the plot functions and of the episode reports
+      self.directory = config['simulation'].get('results_directory', 'results')
       
     def report_tardiness(self, order, current_t):
         if order.cutoff_time < current_t:
             tardiness = True
-            self.tardy_orders_list.append(order)
+            if self.keep_orders:
+                self.tardy_orders_list.append(order)
         else: 
             tardiness = False
         self.tardy_orders += tardiness * order.nOrders     
@@ -85,38 +94,11 @@ class SimResults:
         self.time_register.append(time)
         
     def compute_picking_time_total(self, finished_orders):
-        total_picking_time = []
-        for order in finished_orders:
-            total_time = order.System_out - order.arr_time
-            total_picking_time.append(total_time / order.nOrders)
-        return total_picking_time
+        return order_table(finished_orders)['picking_time'].tolist()
 
     def order_progress_list(self, finished_orders):
-        progress = [[0,0,0,0,0]]
-        
-        time = []
-
-        for idx, i in enumerate(finished_orders):
-            temp = []
-            if i.category in [0,1,2]:
-                temp = 0
-            elif i.category in [3,4,5]:
-                temp = 1
-            elif i.category in [6,7,8]:
-                temp = 2
-            elif i.category in [9,10,11]:
-                temp = 3
-            elif i.category in [12,13,14]:
-                temp = 4
-        
-            temp_list = progress[-1][:]
-            temp_list[temp] += i.nOrders
-            progress.append(temp_list)
-            
-            time.append(i.System_out)
-            
-        progress.remove([0,0,0,0,0])
-        return np.array(progress), time
+        progress = EpisodeReport(order_table(finished_orders)).progress()
+        return progress.values, progress.index.tolist()
        
         
     def register_order_progress(self, order_categories):
@@ -402,9 +384,7 @@ class SimResults:
         fig, axs = plt.subplots(1, 1, figsize=(12,12))
         fig.suptitle('Order progress per category. Model: '+name, fontsize=16)
         progress, time = self.order_progress_list(finished_orders)
-        time_transformed = []
-        for i in range(len(time)):
-            time_transformed.append(time[i]/3600)
+        time_transformed = (np.array(time) / 3600).tolist()
         axs.plot(time_transformed, progress[:,0], label = 'sio_ptg')
         axs.plot(time_transformed, progress[:,1], label = 'sio_gtp')
         axs.plot(time_transformed, progress[:,2], label = 'mio_ptg')
@@ -416,13 +396,14 @@ class SimResults:
         axs.grid(True)
         fig.tight_layout()
         fig.subplots_adjust(top=0.88)
-        plt.savefig(r"C:\Users\nlmbeeks\Desktop\order_progress"+name+".png")
+        os.makedirs(self.directory, exist_ok=True)
+        plt.savefig(os.path.join(self.directory, 'order_progress' + name + '.png'))
 
 
         df = pd.DataFrame(progress)
         df_time = pd.DataFrame(time_transformed)
-        df.to_csv(r"C:\Users\nlmbeeks\Desktop\order_progress"+name+".csv")
-        df_time.to_csv(r"C:\Users\nlmbeeks\Desktop\order_progress_time" + name + ".csv")
+        df.to_csv(os.path.join(self.directory, 'order_progress' + name + '.csv'))
+        df_time.to_csv(os.path.join(self.directory, 'order_progress_time' + name + '.csv'))
         
     def plot_tardy_orders(self):
         category_name = {0: 'sio_ptg', 1: 'sio_ptg', 2:'sio_ptg', 
@@ -439,54 +420,15 @@ class SimResults:
         plt.show()
 
     def plot_cutoff_moments(self, finished_orders):
-        tardy_orders = []
-        cutoff_times = []
-        for order in finished_orders:
-            if order.cutoff_time < order.System_out:
-                tardy_orders.append(order)
-                if order.cutoff_time not in cutoff_times:
-                    cutoff_times.append(order.cutoff_time)
-                
-        graph_data_sio_ptg = []
-        graph_data_sio_gtp = []
-        graph_data_mio_ptg = []
-        graph_data_mio_gtp = []
-        graph_data_mio_ptg_gtp = []
-        
-        for t_order in tardy_orders:
-            if t_order.category in [0,1,2]:
-                graph_data_sio_ptg.append([t_order.cutoff_time, t_order.System_out])
-            elif t_order.category in [3,4,5]:
-                graph_data_sio_gtp.append([t_order.cutoff_time, t_order.System_out])
-            elif t_order.category in [6,7,8]:
-                graph_data_mio_ptg.append([t_order.cutoff_time, t_order.System_out])
-            elif t_order.category in [9,10,11]:
-                graph_data_mio_gtp.append([t_order.cutoff_time, t_order.System_out])
-            elif t_order.category in [12,13,14]:
-                graph_data_mio_ptg_gtp.append([t_order.cutoff_time, t_order.System_out])
-           
-        graph_data_sio_ptg_arr = np.array(graph_data_sio_ptg)
-        graph_data_sio_gtp_arr = np.array(graph_data_sio_gtp)
-        graph_data_mio_ptg_arr = np.array(graph_data_mio_ptg)
-        graph_data_mio_gtp_arr = np.array(graph_data_mio_gtp)
-        graph_data_mio_ptg_gtp_arr = np.array(graph_data_mio_ptg_gtp)
-        
-        
+        tardy = EpisodeReport(order_table(finished_orders)).tardy()
+
         fig, axs = plt.subplots(1, 1, figsize=(6,6))
         fig.suptitle("Tardy orders per cutoff time", fontsize=16)
-        
-        if len(graph_data_sio_ptg_arr) > 0:
-            axs.scatter(graph_data_sio_ptg_arr[:,1], graph_data_sio_ptg_arr[:,0], label = 'sio ptg')
-        if len(graph_data_sio_gtp_arr) > 0:
-            axs.scatter(graph_data_sio_gtp_arr[:,1], graph_data_sio_gtp_arr[:,0], label = 'sio gtp')
-        if len(graph_data_mio_ptg_arr) > 0:
-            axs.scatter(graph_data_mio_ptg_arr[:,1], graph_data_mio_ptg_arr[:,0], label = 'mio ptg')
-        if len(graph_data_mio_gtp_arr) > 0:
-            axs.scatter(graph_data_mio_gtp_arr[:,1], graph_data_mio_gtp_arr[:,0], label = 'mio gtp')
-        if len(graph_data_mio_ptg_gtp_arr) > 0:
-            axs.scatter(graph_data_mio_ptg_gtp_arr[:,1], graph_data_mio_ptg_gtp_arr[:,0], label = 'mio ptg gtp')
-        
-        for line in cutoff_times:
+
+        for group, orders in tardy.groupby('group', sort=False):
+            axs.scatter(orders['System_out'], orders['cutoff_time'], label=group.replace('_', ' '))
+
+        for line in tardy['cutoff_time'].unique():
             axs.vlines(line, ymin=line-500, ymax=line+500, color='r')
         axs.legend()
         axs.set_xlabel('Finish time of order')
@@ -494,81 +436,48 @@ class SimResults:
         axs.grid(True)
         plt.show()
 
-        df_sio_ptg = pd.DataFrame({'sio_ptg': graph_data_sio_ptg})
-        df_sio_gtp = pd.DataFrame({'sio_gtp': graph_data_sio_gtp})
-        df_mio_ptg = pd.DataFrame({'mio_ptg': graph_data_mio_ptg})
-        df_mio_gtp = pd.DataFrame({'mio_gtp': graph_data_mio_gtp})
-        df_mio_ptg_gtp = pd.DataFrame({'mio_ptg_gtp': graph_data_mio_ptg_gtp})
-
-        df_sio_ptg.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_tardy_orders_sio_ptg.csv')
-        df_sio_gtp.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_tardy_orders_sio_gtp.csv')
-        df_mio_ptg.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_tardy_orders_mio_ptg.csv')
-        df_mio_gtp.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_tardy_orders_mio_gtp.csv')
-        df_mio_ptg_gtp.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_tardy_orders_mio_ptg_gtp.csv')
+        os.makedirs(self.directory, exist_ok=True)
+        for group in GROUPS:
+            orders = tardy[tardy['group'] == group]
+            df = pd.DataFrame({group: orders[['cutoff_time', 'System_out']].values.tolist()})
+            df.to_csv(os.path.join(self.directory, 'tardy_orders_' + group + '.csv'))
                     
     def plot_avg_picking_times(self, finished_orders):
-        
-        order_list = []
-        time_list = []
-        for order in finished_orders:
-            order_list.append((order.System_out - order.arr_time) / order.nOrders)
-            time_list.append(order.System_out)
+        orders = order_table(finished_orders)
             
         fig, axs = plt.subplots(1, 1, figsize=(6,6))
         fig.suptitle("Relative picking times per order", fontsize=16)
-        axs.plot(time_list, order_list)
+        axs.plot(orders['System_out'], orders['picking_time'])
         axs.set_xlabel('Time in seconds')
         axs.set_ylabel('Picking time in seconds')
         axs.grid(True)
         plt.show()
         
-        df = pd.DataFrame({'picking_time':order_list, 'time': time_list})
-        df.to_csv(r'C:\Users\nlmbeeks\Desktop\picking_times.csv')
+        os.makedirs(self.directory, exist_ok=True)
+        df = pd.DataFrame({'picking_time': orders['picking_time'], 'time': orders['System_out']})
+        df.to_csv(os.path.join(self.directory, 'picking_times.csv'))
 
     def save_picking_times_storage_area(self, finished_orders):
-        picking_time_list_ptg = []
-        time_list_ptg = []
-        picking_time_list_gtp = []
-        time_list_gtp = []
-
-        for order in finished_orders:
-            if order.route in [1, 2, 3, 6]:
-                picking_time_list_ptg.append((order.PtG_out - order.arr_time ) / order.nOrders)
-                time_list_ptg.append(order.System_out)
-            else:
-                picking_time_list_gtp.append((order.GtP_out - order.arr_time) / order.nOrders)
-                time_list_gtp.append(order.System_out)
-
-        df_ptg = pd.DataFrame({'picking_time': picking_time_list_ptg, 'time': time_list_ptg})
-        df_ptg.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_picking_times_ptg.csv')
-
-        df_gtp = pd.DataFrame({'picking_time': picking_time_list_gtp, 'time': time_list_gtp})
-        df_gtp.to_csv(r'C:\Users\nlmbeeks\Desktop\exD_picking_times_gtp.csv')
-
-    def save_action(self, action_list):
-        action_list_ptg = []
-        time_list_ptg = []
-        action_list_gtp = []
-        time_list_gtp = []
+        picking_times = EpisodeReport(order_table(finished_orders)).storage_picking_times()
 
-        for action, time in action_list:
-            if action in [0, 4, 9]:
-                action_list_ptg.append(0)
-                time_list_ptg.append(time)
-            elif action in [1,5,8]:
-                action_list_ptg.append(1)
-                time_list_ptg.append(time)
+        os.makedirs(self.directory, exist_ok=True)
+        for area in ['ptg', 'gtp']:
+            df = picking_times[picking_times['storage_area'] == area][['picking_time', 'time']].reset_index(drop=True)
+            df.to_csv(os.path.join(self.directory, 'picking_times_' + area + '.csv'))
 
-            if action in [2, 6]:
-                action_list_gtp.append(0)
-                time_list_gtp.append(time)
-            elif action in [3, 7]:
-                action_list_gtp.append(1)
-                time_list_gtp.append(time)
+    def save_action(self, action_list, directory=None, name='actions'):
+        # PtG and GtP decisions, 0 for pick-by-order and 1 for pick-by-batch
+        directory = directory or self.directory
+        actions = pd.DataFrame(action_list, columns=['action', 'time'])
+        ptg = actions['action'].isin([0, 4, 9, 1, 5, 8])
+        gtp = actions['action'].isin([2, 6, 3, 7])
 
-        df_ptg = pd.DataFrame({'action_list': action_list_ptg, 'time': time_list_ptg})
-        df_ptg.to_csv(r'C:\Users\nlmbeeks\Desktop\exC_actions_ptg_BOC.csv')
+        os.makedirs(directory, exist_ok=True)
+        df_ptg = pd.DataFrame({'action_list': actions['action'][ptg].isin([1, 5, 8]).astype(int).values,
+                               'time': actions['time'][ptg].values})
+        df_ptg.to_csv(os.path.join(directory, name + '_ptg.csv'))
 
-        df_gtp = pd.DataFrame({'action_list': action_list_gtp, 'time': time_list_gtp})
-        df_gtp.to_csv(r'C:\Users\nlmbeeks\Desktop\exC_actions_gtp_BOC.csv')
+        df_gtp = pd.DataFrame({'action_list': actions['action'][gtp].isin([3, 7]).astype(int).values,
+                               'time': actions['time'][gtp].values})
+        df_gtp.to_csv(os.path.join(directory, name + '_gtp.csv'))
 
@@ -0,0 +1,94 @@
+import numpy as np
+
+# Mersenne prime of the universal hash functions of the MinHash signatures
+PRIME = 2 ** 31 - 1
+
+
+class SimilarityIndex:
+    '''
+    Approximate SKU-similarity index of the open orders: a MinHash signature per order in LSH buckets.
+
+    The signature of an order holds the minimum of bands * rows universal hash functions over its SKUs, two orders
+    agree on a signature value with a probability equal to the Jaccard similarity of their SKU sets. The signature is
+    split in bands of rows values and every band is a bucket key, orders that share a bucket in any band are
+    candidates of each other. An order with Jaccard similarity s is retrieved with probability 1 - (1 - s^rows)^bands,
+    so fewer rows or more bands retrieve more of the similar orders (recall) at the cost of more candidates to rank
+    (latency). Orders with the same SKU set always share all buckets.
+
+    Orders are added when they arrive in the order book and removed when they are dispatched, a lookup costs the
+    size of the buckets of an order and not the number of open orders.
+
+    Args:
+            bands (int): number of bands of the signature
+            rows (int): number of signature values per band
+            seed (int): seed of the hash functions, the global random state is not used
+    '''
+
+    def __init__(self, bands=16, rows=2, seed=0):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, size=bands * rows).astype(np.int64)
+        self.b = rng.randint(0, PRIME, size=bands * rows).astype(np.int64)
+        self.buckets = [{} for band in range(bands)]
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, order_id):
+        return order_id in self.keys
+
+    def signatures(self, sku_lists):
+        # MinHash signatures of the SKU lists as an (orders, bands * rows) array, every list holds at least one SKU
+        lengths = np.fromiter((len(sku_list) for sku_list in sku_lists), dtype=np.int64, count=len(sku_lists))
+        skus = np.fromiter((sku for sku_list in sku_lists for sku in sku_list), dtype=np.int64,
+                           count=int(lengths.sum())) % PRIME
+        hashes = (self.a[:, None] * skus[None, :] + self.b[:, None]) % PRIME
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return np.minimum.reduceat(hashes, starts, axis=1).T
+
+    def add(self, order_ids, sku_lists, chunk=10000):
+        # Orders without SKUs are not indexed, they are never a candidate
+        orders = [(order_id, sku_list) for order_id, sku_list in zip(order_ids, sku_lists)
+                  if len(sku_list) > 0 and order_id not in self.keys]
+        for start in range(0, len(orders), chunk):
+            part = orders[start:start + chunk]
+            signatures = self.signatures([sku_list for order_id, sku_list in part])
+            for (order_id, sku_list), signature in zip(part, signatures.reshape(len(part), self.bands, self.rows)):
+                keys = [row.tobytes() for row in signature]
+                self.keys[order_id] = keys
+                for bucket, key in zip(self.buckets, keys):
+                    members = bucket.get(key)
+                    if members is None:
+                        bucket[key] = {order_id}
+                    else:
+                        members.add(order_id)
+
+    def remove(self, order_ids):
+        for order_id in order_ids:
+            keys = self.keys.pop(order_id, None)
+            if keys is None:
+                continue
+            for bucket, key in zip(self.buckets, keys):
+                members = bucket[key]
+                members.discard(order_id)
+                if len(members) == 0:
+                    del bucket[key]
+
+    def candidates(self, order_id, seen=None):
+        # Orders that share a bucket with the order in any band, without the order itself. Buckets in seen, the
+        # (band, key) pairs of earlier lookups, are skipped and the buckets of this lookup are added to it, so a
+        # batch that looks up all its orders reads every bucket once
+        keys = self.keys.get(order_id)
+        if keys is None:
+            return set()
+        candidates = set()
+        for band, (bucket, key) in enumerate(zip(self.buckets, keys)):
+            if seen is not None:
+                if (band, key) in seen:
+                    continue
+                seen.add((band, key))
+            candidates.update(bucket[key])
+        candidates.discard(order_id)
+        return candidates
@@ -0,0 +1,91 @@
+class StationQueue:
+    '''
+    Orders at a work station (waiting, in service or travelling to it) with time-weighted statistics.
+
+    The orders are kept in an insertion-ordered dict, so append, remove and membership tests are O(1) and iteration
+    is in arrival order. Every change adds the time since the previous change times the number of orders (WIP), the
+    number of orders in service (busy servers) and the number of servers to running totals, so the statistics use
+    constant memory and the utilization holds when the number of servers changes during the episode.
+    Changes that are registered at an earlier time than the previous change are counted at the time of the
+    previous change.
+
+    Args:
+            station (str): name of the work station
+            servers (int): number of resources of the station, None for a station without resources
+            t (float): simulation time at which the statistics start
+    '''
+
+    def __init__(self, station, servers=None, t=0):
+        self.station = station
+        self.servers = servers
+        self.orders = {}
+        self.in_service = 0
+
+        self.t_start = t
+        self.t_last = t
+        self.wip_time = 0.0
+        self.busy_time = 0.0
+        self.capacity_time = 0.0
+        self.max_wip = 0
+        self.arrivals = 0
+        self.departures = 0
+        self.time_in_station = 0.0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(self.orders)
+
+    def __contains__(self, order):
+        return order in self.orders
+
+    def advance(self, t):
+        if t > self.t_last:
+            self.wip_time += len(self.orders) * (t - self.t_last)
+            self.busy_time += self.in_service * (t - self.t_last)
+            self.capacity_time += (self.servers or 0) * (t - self.t_last)
+            self.t_last = t
+
+    def set_servers(self, servers, t):
+        # Shift change or rebalancing of the resources of the station
+        self.advance(t)
+        self.servers = servers
+
+    def append(self, order, t):
+        self.advance(t)
+        self.orders[order] = [max(t, self.t_last), False]
+        self.arrivals += 1
+        self.max_wip = max(self.max_wip, len(self.orders))
+
+    def start(self, order, t):
+        # A resource of the station starts working on the order
+        self.advance(t)
+        self.orders[order][1] = True
+        self.in_service += 1
+
+    def remove(self, order, t):
+        self.advance(t)
+        t_in, in_service = self.orders.pop(order)
+        self.in_service -= in_service
+        self.departures += 1
+        self.time_in_station += self.t_last - t_in
+
+    def statistics(self, t):
+        '''
+        Statistics from the start of the episode until t.
+
+        Returns:
+                dict with the time-weighted average and the maximum WIP, the utilization of the resources, the
+                throughput in orders per hour, the average time in the station of the departed orders and the
+                average time in the station following from Little's law (average WIP / throughput)
+        '''
+        self.advance(t)
+        duration = self.t_last - self.t_start
+        avg_wip = self.wip_time / duration if duration > 0 else 0.0
+        throughput = self.departures / duration if duration > 0 else 0.0
+        return {'avg_wip': avg_wip, 'max_wip': self.max_wip,
+                'utilization': self.busy_time / self.capacity_time if self.capacity_time > 0 else None,
+                'throughput_per_hour': throughput * 3600,
+                'avg_time_in_station': self.time_in_station / self.departures if self.departures > 0 else 0.0,
+                'littles_law_time_in_station': avg_wip / throughput if throughput > 0 else 0.0}
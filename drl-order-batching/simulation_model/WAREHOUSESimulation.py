@@ -2,12 +2,26 @@
 Code for simulation model that simulates a Markov Decision Process in a warehousing environment
 '''
 from .Order import Order
+from .OrderBook import OrderBook
+from .StationQueue import StationQueue
 from .Event import Event
 from .FES import FES
 from .Distribution import Distribution
 from .SimResults import SimResults
+from .Profiler import Profiler, NullProfiler
+from .MultiStartGrasp import MultiStartGrasp
+from .GVNSEngine import GVNSEngine
+from .BatchPlanner import BatchPlanner
+from .SimilarityIndex import SimilarityIndex
+from .ScenarioConfig import ScenarioConfig, N_CATEGORIES
+from .OrderStream import OrderStream
+from .FinishedOrders import FinishedOrders, RunningMean
+from .ChromeTrace import ChromeTrace
+from .EpisodeReport import EpisodeReport
 from scipy import stats
+import collections
 import random
+import time
 import numpy as np
 
 # This simulation instance contains several functions.
@@ -16,22 +30,55 @@ import numpy as np
 # - rebuild_state_representation --> based on available data of simulate function, build new state representation
 # - clip_state --> clips state representation in order for it to be normalized
 # - action_to_orders --> used by simulate function to transform predicted action into list with orders to be processed
-# - resource_rebalance --> used by simulate function to balance resources between workstations
-# - change_shift --> used by simulate function to set resources per shift
+# - resource_rebalance --> rebalance check of the calendar, moves an idle PtG picker to the DtO work station and back
+# - transfer_pickers --> moves PtG pickers to the DtO work station or back
+# - resource_wait --> time of the next resource change when no departure is scheduled
+# - change_shift --> shift start of the calendar, sets the resources of the new shift
+# - schedule_calendar --> schedules the shift starts and rebalance checks in the future event set
+# - handle_calendar --> used by simulate function to handle the calendar events that are due
 # - custom_heuristic --> batching heuristic that always performs batch action
 # - edd_sequencing --> batching heuristic that performs edd batching
 # - LST_batching --> batching heuristic that performs LST batching
+# - lst_batch_size --> number of orders in the LST batch, computed on the slack and SKU arrays of the candidates
 # - grasp_vnd --> batching heuristic that performs local search method
+# - grasp_multistart --> batching heuristic that runs grasp_vnd starts on a worker pool within a time budget
+# - grasp_construct --> randomized construction of a GRASP start, batched with LST
+# - vnd_grasp --> variable neighborhood descent of a GRASP start
 # - boc_batching --> batching heuristic that performs BOC batching
-# - GVNS_batching --> batching heuristic that performs local search method
+# - boc_batching_index --> BOC batching on the candidates of the MinHash/LSH similarity index
+# - sku_candidates --> positions of the orders of a category that may share SKUs with given orders
+# - GVNS_batching --> batching heuristic that performs an anytime GVNS with the GVNSEngine of the instance
+# - planned_batching --> batching heuristic that pops the next batch of the repaired batch plan of the order category
+# - batch_orders --> applies the batching heuristic of the instance to the orders of an action
+# - remove_orders --> removes the orders of a picking order from the order book
+# - pull_orders --> streaming mode: adds the arrived orders to the order book and retires finished orders
+# - lookahead --> time up to which arrived orders are visible in the state representation
+# - select_picking_order --> computes the picking order (cutoff, orders, items, route) of the selected orders
+# - action_bits --> feasible actions of a state as a bit set, used by check_action and action_mask
+# - action_mask --> feasible actions of a state as a 0/1 list over the action space, as available_actions
+# - step --> fused decision of the gym environment: feasibility, reward, transition, termination and next action mask
+# - profile_report --> timing of the phases of each step, when profiling is switched on in the config
+# - station_report --> WIP, utilization and throughput KPIs of the work stations
+# - report --> vectorized KPIs and tables of the finished picking orders, saved with EpisodeReport.save
+# - resume --> continues a warm state snapshot (warm_start.py) with the weights and heuristic of a new episode
+# - close --> closes the timeline file of the episode, called when the episode terminates
 
 
 class WAREHOUSESimulation:
 
-    def __init__(self, config, data, t, params, heuristic=None):
+    def __init__(self, config, data, t, params, heuristic=None, profiler=None):
         
+        # Validated config with the derived values of the scenario, a compiled config is used as it is
+        config = ScenarioConfig.compile(config)
         self.fes = FES()
         self.res = SimResults(config)
+
+        # Streaming mode: data is an OrderStream, orders are pulled from it as they arrive and finished orders are
+        # retired after their cutoff wave, so memory follows the orders in progress and not the horizon
+        self.order_stream = data if isinstance(data, OrderStream) else None
+        if self.order_stream is not None:
+            data = self.order_stream.pull(self.lookahead(t)).sort_values(by='cutoff_time', kind='stable')
+            self.res.keep_orders = False
         self.config = config['simulation']
         self.config_environment = config['environment']
         
@@ -40,22 +87,38 @@ class WAREHOUSESimulation:
         self.weight_tardy = params[0]
         self.weight_picking = params[1]
 
-        self.PtG_picker_available = config['simulation']['nPtG_pickers'][0]
-        self.GtP_shuttle_available = config['simulation']['nGtP_shuttles'][0]
-        self.DtO_operator_available = config['simulation']['nDtO_operators'][0]
-        self.StO_operator_available = config['simulation']['nStO_operators'][0]
+        # Resources of the shift at the start of the episode, the last shift that started before t
+        self.shifts = config['simulation'].get('shifts', len(config['simulation']['shift_start']))
+        self.shift = self.shift_at(t)
+        self.PtG_picker_available = config['simulation']['nPtG_pickers'][self.shift]
+        self.GtP_shuttle_available = config['simulation']['nGtP_shuttles'][self.shift]
+        self.DtO_operator_available = config['simulation']['nDtO_operators'][self.shift]
+        self.StO_operator_available = config['simulation']['nStO_operators'][self.shift]
         
-        self.rebalance_interval = 300
-
-        self.qPtG = []
-        self.qGtP = []
-        self.qPack = []
-        self.qDtO = []
-        self.qStO = []
-        self.finished_orders = []
+        # Seconds between rebalance checks, None for no rebalancing, and the share of the PtG pickers of a shift that
+        # stays at PtG
+        self.rebalance_interval = config['simulation'].get('rebalance_interval')
+        self.rebalance_min_share = config['simulation'].get('rebalance_min_share', 0.5)
+
+        # Orders per work station with time-weighted WIP, utilization and throughput, see station_report
+        self.qPtG = StationQueue('PtG', self.PtG_picker_available, t)
+        self.qGtP = StationQueue('GtP', self.GtP_shuttle_available, t)
+        self.qPack = StationQueue('Pack', None, t)
+        self.qDtO = StationQueue('DtO', self.DtO_operator_available, t)
+        self.qStO = StationQueue('StO', self.StO_operator_available, t)
+        self.queue_history = config['simulation'].get('queue_history', False)
+        # Chrome trace-event timeline of the episode, switched on with 'timeline: <directory>' in the config
+        self.timeline = None
+        if config['simulation'].get('timeline'):
+            self.timeline = ChromeTrace(ChromeTrace.episode_path(config['simulation']['timeline'], config.name),
+                                        {'PtG': config['simulation']['PtG_Out_time'],
+                                         'DtO': config['simulation']['DtO_Out_time'],
+                                         'StO': config['simulation']['StO_Out_time']})
+        self.finished_orders = FinishedOrders(retire=self.order_stream is not None, timeline=self.timeline)
         
         # Processing times
         self.PtG_picking_item = Distribution(stats.norm(loc=config['simulation']['PtG_picking_time'], scale=10))
+        self.PtG_picking_time = config['simulation']['PtG_picking_time']
         self.PtG_picking_constant = config['simulation']['PtG_picking_constant']
         self.GtP_picking_time = config['simulation']['GtP_picking_time']
         self.Pack_time = config['simulation']['Pack_time']  # [SIO, MIO]
@@ -79,16 +142,15 @@ class WAREHOUSESimulation:
         self.virtual_q_dto = config['simulation']['virtual_q_dto']
         self.virtual_q_sto = config['simulation']['virtual_q_sto']
 
-        self.action_route_mapping = {0: 1, 1: 2, 2: 5, 3: 5, 4:  1, 5: 3, 6: 5, 7: 4, 8: 3, 9: 6}
-
-        self.route_action_mapping = {1: [0, 4], 2: [1], 3: [5, 8], 4: [7], 5: [2, 3, 6], 6: [9]}
-
-        self.action_category_mapping = {0: [0, 1, 2], 1: [0, 1, 2], 2: [3, 4, 5], 3: [3, 4, 5], 4: [6, 7, 8],
-                                        5: [6, 7, 8], 6: [9, 10, 11], 7: [9, 10, 11], 8: [12, 13, 14], 9: [12, 13, 14]}
-
-        self.category_action_mapping = {0: [0, 1], 1: [0, 1], 2: [0, 1], 3: [2, 3], 4: [2, 3], 5: [2, 3], 6: [4, 4],
-                                        7: [4, 5], 8: [4, 5], 9: [6, 7], 10: [6, 7], 11: [6, 7], 12: [8, 9],
-                                        13: [8, 9], 14: [8, 9]}
+        # Routing tables of the actions and the clip and scale vectors of clip_state, computed by the config
+        self.action_route_mapping = config.action_route
+        self.route_action_mapping = config.route_actions
+        self.action_category_mapping = config.action_categories
+        self.category_action_mapping = config.category_actions
+        self.category_action_bits = config.category_action_bits
+        self.resource_action_bits = config.resource_action_bits
+        self.state_clip = config.state_clip
+        self.state_scale = config.state_scale
 
         self.valid_actions = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, 8: 0, 9: 0, 10: 0, 11: 0}
 
@@ -97,14 +159,24 @@ class WAREHOUSESimulation:
         self.action_to_action = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9, 10: 10,
                                  11: 0, 12: 1, 13: 2, 14: 3, 15: 4, 16: 5, 17: 6, 18: 7, 19: 8, 20: 9, 21: 10}
 
-        self.actions_pick_by_batch = [1, 3, 5, 7, 8]
+        self.actions_pick_by_batch = config.pick_by_batch
         self.max_batchsize_ptg = config['simulation']['max_batchsize_ptg']
         self.max_batchsize_ptg_items = config['simulation']['max_batchsize_ptg_items']
         self.max_batchsize_gtp = config['simulation']['max_batchsize_gtp']
         self.max_batchsize_ptg_gtp = config['simulation']['max_batchsize_ptg_gtp']
         
+        # MinHash/LSH index of the SKU-similarity batching (boc_batching, MIO batches of action_to_orders), switched
+        # on with 'similarity_index: true' in the config
+        self.similarity = None
+        if self.config.get('similarity_index', False):
+            self.similarity = SimilarityIndex(self.config.get('lsh_bands', 16), self.config.get('lsh_rows', 2))
+
+        # The orders of the episode, open orders are tracked by the order book that also holds the order categories
         self.order_data = data
+        self.order_book = OrderBook(data, self.similarity)
         self.state_representation, self.order_categories = self.build_state_representation(self.order_data, t)
+        self.order_book.set_categories(self.order_categories)
+        self.order_categories = self.order_book
         self.refresh_state_representation = 30
         self.old_state = self.state_representation[:]
         self.initial_state = self.state_representation[:]
@@ -116,47 +188,74 @@ class WAREHOUSESimulation:
         self.nOrders = len(data)
 
         self.order_batch_ratio_sim = 0
-        self.action_list_render = []
-        self.picking_strategy = []
+        self.action_list_render = collections.deque(maxlen=101)
+        self.picking_strategy = RunningMean()
 
         self.nActions = config['environment']['action_space']
 
         self.infeasible_action_rate = 0
         
         self.DtO_resource_transfer = 0
+        self.DtO_transferred = 0  # PtG pickers that work at the DtO work station
         self.nOrders_hist = 1
         self.nItems_ptg_hist = 0
         self.nItems_gtp_hist = 0
 
-        self.avg_batch_size = []
-        self.avg_size_pick_batch = []
-        self.picking_time = []
-        self.picking_time_total = []
+        self.avg_batch_size = RunningMean()
+        self.avg_size_pick_batch = RunningMean()
+        self.picking_time = RunningMean()
         self.reward_distribution = {'infeasible_action': 0, 'tardy_order': 0, 'batch_action': 0, 'batch_composition': 0,
                                     'final_reward': 0}
 
         self.tardy_order_hist = 0
 
-        self.tardy_order_list_test = []
-        
-        self.shift_change = False
+        # Shift starts and rebalance checks are calendar events, they cost nothing between the events
+        self.schedule_calendar(t)
         
         self.batch_list = []
 
+        # Search engine of the GVNS heuristic
+        self.gvns = GVNSEngine(self.max_batchsize_ptg, self.PtG_picking_time, self.PtG_picking_constant,
+                               neighbourhoods=self.config.get('gvns_neighbourhoods', ['insert', 'swap']),
+                               shake=self.config.get('gvns_shake', 'insert'),
+                               k_max=self.config.get('gvns_k_max', 2),
+                               max_iterations=self.config.get('gvns_max_iterations', 5),
+                               time_budget=self.config.get('gvns_time_budget'),
+                               max_stall=self.config.get('gvns_max_stall'),
+                               vnd_samples=self.config.get('gvns_vnd_samples', 20),
+                               batch_size=self.max_batchsize_ptg - 1)
+
+        # Batch plans of the PLAN heuristic, repaired between the decisions
+        self.batch_planner = BatchPlanner(self.config.get('plan_rebuild_share', 0.5))
+
+        # Multi-start GRASP of the GRASP_MS heuristic, the worker pool is shared by all simulation instances
+        if heuristic == 'GRASP_MS':
+            self.multistart_grasp = self.make_multistart_grasp()
+
+        # Per-phase timing of the simulation steps, switched on with 'profile: true' in the config. A profiler that is
+        # passed in (e.g. by the environment) keeps counting over the simulations of all episodes
+        if profiler is None:
+            profiler = Profiler() if config['simulation'].get('profile', False) else NullProfiler()
+        self.profiler = profiler
+
     def simulate(self, action):
+        t_step = self.profiler.tick()
         self.fes.events.sort()
         current_t = self.state_representation[-1]
 
-        # Register performance of system
-        self.res.register_QL(len(self.qGtP), len(self.qPtG), len(self.qPack), len(self.qDtO), len(self.qStO))
-        self.res.register_resources(self.PtG_picker_available, max(self.GtP_shuttle_available, 0),
-                                    max(self.DtO_operator_available, 0), max(self.StO_operator_available, 0), current_t)
-        self.res.register_time(current_t)
+        # Register queue lengths and resource availability of every step for the plots of SimResults
+        if self.queue_history:
+            self.res.register_QL(len(self.qGtP), len(self.qPtG), len(self.qPack), len(self.qDtO), len(self.qStO))
+            self.res.register_resources(self.PtG_picker_available, max(self.GtP_shuttle_available, 0),
+                                        max(self.DtO_operator_available, 0), max(self.StO_operator_available, 0),
+                                        current_t)
+            self.res.register_time(current_t)
         
         picking_items = None
         if len(self.action_list_render) > 100:
-            self.order_batch_ratio_sim = len([x for x in self.action_list_render[-100 - 1:-1] if x not in self.actions_pick_by_batch]) / len(
-                        self.action_list_render[-100 - 1:-1])
+            # The last 100 actions before the previous action
+            actions = list(self.action_list_render)[:-1]
+            self.order_batch_ratio_sim = len([x for x in actions if x not in self.actions_pick_by_batch]) / len(actions)
         
         # There are two types of actions:
         # 1. Processing some kind of order --> action 0 - 9
@@ -164,21 +263,16 @@ class WAREHOUSESimulation:
         
         # 1. Processing some kind of order
         if action < 10: 
+            t_phase = self.profiler.tick()
             picking_order, picking_items, order_category, all_picking_items = self.action_to_orders(action)
-            
-            if self.heuristic == 'LST':
-                picking_items = self.LST_batching(action, picking_items, current_t)
-                
-            elif self.heuristic == 'GRASP_VND':
-                picking_items = self.grasp_vnd(action, picking_items, all_picking_items, current_t)
-                
-            elif self.heuristic == 'BOC':
-                picking_items = self.boc_batching(action, picking_items, all_picking_items)
-                
-            elif self.heuristic == 'GVNS':
-                picking_items = self.GVNS_batching(action, picking_items, all_picking_items)
+            t_phase = self.profiler.tock('action_to_orders', t_phase)
+
+            picking_items = self.batch_orders(action, picking_items, all_picking_items, current_t)
+            if self.heuristic is not None:
+                t_phase = self.profiler.tock('batching_' + self.heuristic, t_phase)
                 
             picking_order, picking_items = self.remove_orders(action, picking_items, order_category)
+            t_phase = self.profiler.tock('remove_orders', t_phase)
                 
             cutoff_time, nOrders, nItems_ptg, nItems_gtp, route = picking_order
             order = Order(current_t, cutoff_time, nOrders, nItems_ptg, nItems_gtp, route,
@@ -195,7 +289,7 @@ class WAREHOUSESimulation:
 
             # Route 1, 2, 3
             if order.route in [1, 2, 3, 6]:
-                self.qPtG.append(order)
+                self.qPtG.append(order, current_t)
                 arr = Event(Event.ARRIVAL, 'PtG', current_t, order)
                 self.fes.add(arr)
 
@@ -213,13 +307,14 @@ class WAREHOUSESimulation:
                     self.fes.add(dep)  # schedule his departure
                     self.PtG_picker_available -= 1
                     arr_event.order.PtG_in = current_t
+                    self.qPtG.start(arr_event.order, current_t)
 
                 # new simulation time
                 new_t = current_t + self.time_step_arrival
 
             # Route 4, 5
             elif order.route in [4, 5]:
-                self.qGtP.append(order)
+                self.qGtP.append(order, current_t)
                 arr = Event(Event.ARRIVAL, 'GtP', current_t, order)
                 self.fes.add(arr)
 
@@ -235,18 +330,29 @@ class WAREHOUSESimulation:
                     self.fes.add(dep)  # schedule his departure
                     self.GtP_shuttle_available -= 1
                     arr_event.order.GtP_in = current_t
+                    self.qGtP.start(arr_event.order, current_t)
 
                 # new simulation time
                 new_t = current_t + self.time_step_arrival
 
+            self.profiler.tock('event_handling', t_phase)
+
         # 2. Do nothing and wait for state change
         elif action == 10:
+            t_phase = self.profiler.tick()
             order_category = False
             # Sometime, there are no events in the future event set anymore.
             # Resources need to wait until new orders arrive. 
             
             if len(self.fes.events) == 0:
                 new_t = current_t + self.time_step_arrival
+
+                # Streaming mode without orders in the warehouse: skip to the next order arrival
+                if self.order_stream is not None and not any(self.state_representation[:15]):
+                    next_arrival = self.order_stream.next_arrival()
+                    if next_arrival is not None:
+                        new_t = max(new_t, self.visible_from(next_arrival))
+                        self.refresh_state_representation = 0
             
             else:    
                 # Select first event
@@ -255,7 +361,7 @@ class WAREHOUSESimulation:
                     # handle departure for route 1
                     if event.station == 'PtG' and event.order.route == 1:
                         t = event.time
-                        self.qPtG.remove(event.order)
+                        self.qPtG.remove(event.order, t)
                         self.fes.events.remove(event)
                         event.order.System_out = t + self.PtG_Out_time
                         self.finished_orders.append(event.order)
@@ -267,7 +373,7 @@ class WAREHOUSESimulation:
                     elif event.order.route == 2:
                         if event.station == 'PtG':
                             t = event.time
-                            self.qPtG.remove(event.order)
+                            self.qPtG.remove(event.order, t)
                             self.fes.events.remove(event)
                             event.order.System_out = t + self.PtG_Out_time
                             self.finished_orders.append(event.order)
@@ -279,9 +385,9 @@ class WAREHOUSESimulation:
                     elif event.order.route == 3:
                         if event.station == 'PtG':
                             t = event.time
-                            self.qPtG.remove(event.order)
+                            self.qPtG.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qGtP.append(event.order)
+                            self.qGtP.append(event.order, t)
                             self.PtG_picker_available += 1
                             event.order.PtG_out = t
     
@@ -290,9 +396,9 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'GtP':
                             t = event.time
-                            self.qGtP.remove(event.order)
+                            self.qGtP.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qStO.append(event.order)
+                            self.qStO.append(event.order, t)
                             self.GtP_shuttle_available += 1
                             event.order.GtP_out = t
     
@@ -301,7 +407,7 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'StO':
                             t = event.time
-                            self.qStO.remove(event.order)
+                            self.qStO.remove(event.order, t)
                             self.fes.events.remove(event)
                             event.order.System_out = t + self.StO_Out_time
                             self.finished_orders.append(event.order)
@@ -313,9 +419,9 @@ class WAREHOUSESimulation:
                     elif event.order.route == 4:
                         if event.station == 'GtP':
                             t = event.time
-                            self.qGtP.remove(event.order)
+                            self.qGtP.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qStO.append(event.order)
+                            self.qStO.append(event.order, t)
                             self.GtP_shuttle_available += 1
                             event.order.GtP_out = t
     
@@ -324,7 +430,7 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'StO':
                             t = event.time
-                            self.qStO.remove(event.order)
+                            self.qStO.remove(event.order, t)
                             self.fes.events.remove(event)
                             event.order.System_out = t + self.StO_Out_time
                             self.finished_orders.append(event.order)
@@ -336,9 +442,9 @@ class WAREHOUSESimulation:
                     elif event.order.route == 5:
                         if event.station == 'GtP':
                             t = event.time
-                            self.qGtP.remove(event.order)
+                            self.qGtP.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qDtO.append(event.order)
+                            self.qDtO.append(event.order, t)
                             self.GtP_shuttle_available += 1
                             event.order.GtP_out = t
     
@@ -347,7 +453,7 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'DtO':
                             t = event.time
-                            self.qDtO.remove(event.order)
+                            self.qDtO.remove(event.order, t)
                             self.fes.events.remove(event)
                             event.order.System_out = t + self.DtO_Out_time
                             self.finished_orders.append(event.order)
@@ -359,9 +465,9 @@ class WAREHOUSESimulation:
                     elif event.order.route == 6:
                         if event.station == 'PtG':
                             t = event.time
-                            self.qPtG.remove(event.order)
+                            self.qPtG.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qGtP.append(event.order)
+                            self.qGtP.append(event.order, t)
                             self.PtG_picker_available += 1
                             event.order.PtG_out = t
     
@@ -370,9 +476,9 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'GtP':
                             t = event.time
-                            self.qGtP.remove(event.order)
+                            self.qGtP.remove(event.order, t)
                             self.fes.events.remove(event)
-                            self.qDtO.append(event.order)
+                            self.qDtO.append(event.order, t)
                             self.GtP_shuttle_available += 1
                             event.order.GtP_out = t
     
@@ -381,7 +487,7 @@ class WAREHOUSESimulation:
     
                         elif event.station == 'DtO':
                             t = event.time
-                            self.qDtO.remove(event.order)
+                            self.qDtO.remove(event.order, t)
                             self.fes.events.remove(event)
                             event.order.System_out = t + self.DtO_Out_time
                             self.finished_orders.append(event.order)
@@ -404,6 +510,7 @@ class WAREHOUSESimulation:
                         self.PtG_picker_available -= 1
                         state_change = True
                         arr_event.order.PtG_in = t
+                        self.qPtG.start(arr_event.order, t)
     
                     # Arrival at GtP station
                     arr_event = next((x for x in self.fes.events if x.type == Event.ARRIVAL and x.station == 'GtP'),
@@ -417,6 +524,7 @@ class WAREHOUSESimulation:
                         self.GtP_shuttle_available -= 1
                         state_change = True
                         arr_event.order.GtP_in = t
+                        self.qGtP.start(arr_event.order, t)
     
                     # Arrival at DtO station
                     arr_event = next((x for x in self.fes.events if x.type == Event.ARRIVAL and x.station == 'DtO'),
@@ -429,6 +537,7 @@ class WAREHOUSESimulation:
                         self.DtO_operator_available -= 1
                         state_change = True
                         arr_event.order.DtO_in = t
+                        self.qDtO.start(arr_event.order, t)
     
                     # Arrival at StO station
                     arr_event = next((x for x in self.fes.events if x.type == Event.ARRIVAL and x.station == 'StO'),
@@ -441,18 +550,23 @@ class WAREHOUSESimulation:
                         self.StO_operator_available -= 1
                         state_change = True
                         arr_event.order.StO_in = t
+                        self.qStO.start(arr_event.order, t)
     
                     # If there is no picking capacity available, select next departure.
                     # When next departure of some order occurs, picking capacity becomes
                     # available and new orders can be processed.
                     if not state_change:
     
-                        dep_event = next(x for x in self.fes.events if x.type == Event.DEPARTURE)
+                        dep_event = next((x for x in self.fes.events if x.type == Event.DEPARTURE), None)
+                        if dep_event is None:
+                            # The orders wait for resources that no departure releases, e.g. after a shift change:
+                            # wait for the next calendar event or order arrival
+                            dep_event = Event(Event.DEPARTURE, 'DUMMY', self.resource_wait(current_t), None)
                         t = dep_event.time
     
                         # Select earliest departure event at PtG for route 1
                         if dep_event.station == 'PtG' and dep_event.order.route == 1:
-                            self.qPtG.remove(dep_event.order)
+                            self.qPtG.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             dep_event.order.System_out = t + self.PtG_Out_time
                             self.finished_orders.append(dep_event.order)
@@ -462,7 +576,7 @@ class WAREHOUSESimulation:
     
                         # Select earliest departure event at PtG for route 2
                         elif dep_event.station == 'PtG' and dep_event.order.route == 2:
-                            self.qPtG.remove(dep_event.order)
+                            self.qPtG.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             dep_event.order.System_out = t + self.PtG_Out_time
                             self.finished_orders.append(dep_event.order)
@@ -472,9 +586,9 @@ class WAREHOUSESimulation:
     
                         # Select earliest departure event at GtP for route 3
                         elif dep_event.station == 'PtG' and dep_event.order.route == 3:
-                            self.qPtG.remove(dep_event.order)
+                            self.qPtG.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qGtP.append(dep_event.order)
+                            self.qGtP.append(dep_event.order, t)
                             self.PtG_picker_available += 1
                             dep_event.order.PtG_out = t
     
@@ -482,9 +596,9 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'GtP' and dep_event.order.route == 3:
-                            self.qGtP.remove(dep_event.order)
+                            self.qGtP.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qStO.append(dep_event.order)
+                            self.qStO.append(dep_event.order, t)
                             self.GtP_shuttle_available += 1
                             dep_event.order.GtP_out = t
     
@@ -492,7 +606,7 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'StO' and dep_event.order.route == 3:
-                            self.qStO.remove(dep_event.order)
+                            self.qStO.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             dep_event.order.System_out = t + self.StO_Out_time
                             self.finished_orders.append(dep_event.order)
@@ -502,9 +616,9 @@ class WAREHOUSESimulation:
     
                         # Select earliest departure event at GtP for route 4
                         elif dep_event.station == 'GtP' and dep_event.order.route == 4:
-                            self.qGtP.remove(dep_event.order)
+                            self.qGtP.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qStO.append(dep_event.order)
+                            self.qStO.append(dep_event.order, t)
                             self.GtP_shuttle_available += 1
                             dep_event.order.GtP_out = t
     
@@ -512,7 +626,7 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'StO' and dep_event.order.route == 4:
-                            self.qStO.remove(dep_event.order)
+                            self.qStO.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             dep_event.order.System_out = t + self.StO_Out_time
                             self.finished_orders.append(dep_event.order)
@@ -522,9 +636,9 @@ class WAREHOUSESimulation:
     
                         # Select earliest departure event at GtP for route 5
                         elif dep_event.station == 'GtP' and dep_event.order.route == 5:
-                            self.qGtP.remove(dep_event.order)
+                            self.qGtP.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qDtO.append(dep_event.order)
+                            self.qDtO.append(dep_event.order, t)
                             self.GtP_shuttle_available += 1
                             dep_event.order.GtP_out = t
     
@@ -532,7 +646,7 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'DtO' and dep_event.order.route == 5:
-                            self.qDtO.remove(dep_event.order)
+                            self.qDtO.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             dep_event.order.System_out = t + self.DtO_Out_time
                             self.finished_orders.append(dep_event.order)
@@ -542,9 +656,9 @@ class WAREHOUSESimulation:
     
                         # Select earliest departure event at GtP for route 6
                         elif dep_event.station == 'PtG' and dep_event.order.route == 6:
-                            self.qPtG.remove(dep_event.order)
+                            self.qPtG.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qGtP.append(dep_event.order)
+                            self.qGtP.append(dep_event.order, t)
                             self.PtG_picker_available += 1
                             dep_event.order.PtG_out = t
     
@@ -552,9 +666,9 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'GtP' and dep_event.order.route == 6:
-                            self.qGtP.remove(dep_event.order)
+                            self.qGtP.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
-                            self.qDtO.append(dep_event.order)
+                            self.qDtO.append(dep_event.order, t)
                             self.GtP_shuttle_available += 1
                             dep_event.order.GtP_out = t
     
@@ -562,7 +676,7 @@ class WAREHOUSESimulation:
                             self.fes.add(arr)
     
                         elif dep_event.station == 'DtO' and dep_event.order.route == 6:
-                            self.qDtO.remove(dep_event.order)
+                            self.qDtO.remove(dep_event.order, t)
                             self.fes.events.remove(dep_event)
                             # self.qPack.append(dep_event.order)
                             dep_event.order.System_out = t + self.DtO_Out_time
@@ -573,16 +687,50 @@ class WAREHOUSESimulation:
     
                 # Simulation time
                 new_t = t
+
+            self.profiler.tock('event_handling', t_phase)
         
-        # Check if shift 1 is done and shift 2 starts
-        # self.change_shift(new_t)
+        # Shift starts and rebalance checks that are due at the new simulation time
+        if new_t >= self.fes.next_calendar_time():
+            self.handle_calendar(new_t)
         
         # Update state representation
+        t_phase = self.profiler.tick()
         self.old_state = self.state_representation[:]
         norm_state_rep = self.rebuild_state_representation(action, new_t, picking_items, order_category)
+        t_phase = self.profiler.tock('state_rebuild', t_phase)
+        if self.timeline is not None:
+            self.timeline.counters(new_t, [self.qPtG, self.qGtP, self.qDtO, self.qStO])
+        self.profiler.tock('step', t_step)
         
         return norm_state_rep
 
+    def batch_orders(self, action, picking_items, all_picking_items, t):
+        # Apply the batching heuristic of this instance to the orders selected by action_to_orders
+        if self.heuristic == 'LST':
+            picking_items = self.LST_batching(action, picking_items, t)
+
+        elif self.heuristic == 'GRASP_VND':
+            picking_items = self.grasp_vnd(action, picking_items, all_picking_items, t)
+
+        elif self.heuristic == 'GRASP_MS':
+            picking_items = self.grasp_multistart(action, picking_items, all_picking_items, t)
+
+        elif self.heuristic == 'BOC':
+            picking_items = self.boc_batching(action, picking_items, all_picking_items)
+
+        elif self.heuristic == 'GVNS':
+            picking_items = self.GVNS_batching(action, picking_items, all_picking_items)
+
+        elif self.heuristic == 'PLAN':
+            picking_items = self.planned_batching(action, picking_items, all_picking_items)
+
+        return picking_items
+
+    def profile_report(self):
+        # Calls, total/mean/min/max time, share of the step time and a latency histogram per phase
+        return self.profiler.report()
+
     def get_state(self):
         state = self.clip_state(self.state_representation[:])
         return state
@@ -590,7 +738,11 @@ class WAREHOUSESimulation:
     def rebuild_state_representation(self, action, new_t, picking_items, order_category):
         
         if self.refresh_state_representation == 0:
-            self.state_representation, self.order_categories = self.build_state_representation(self.order_data, new_t)
+            if self.order_stream is not None:
+                self.pull_orders(new_t)
+            self.state_representation, order_categories = self.build_state_representation(
+                self.order_book.live_orders(), new_t)
+            self.order_book.set_categories(order_categories)
             self.refresh_state_representation = 20
             
         else:
@@ -599,7 +751,7 @@ class WAREHOUSESimulation:
             
             self.state_representation[15] = PtG_available
             self.state_representation[16] = GtP_available
-            self.state_representation[17] = self.res.finished_orders(self.finished_orders)
+            self.state_representation[17] = self.finished_orders.n_orders
             self.state_representation[18] = self.res.tardy_orders
             self.state_representation[19] = new_t
             
@@ -615,7 +767,7 @@ class WAREHOUSESimulation:
 
     def build_state_representation(self, sample_data, current_time):
         # adjust sample data for orders that not have been arrived yet
-        sample_data = sample_data[sample_data['arrival_time'] <= current_time * 1.05] 
+        sample_data = sample_data[sample_data['arrival_time'] <= self.lookahead(current_time)]
         
         sample_data_sio = sample_data[sample_data['comp'] == 'SIO']  # 1. Order composition: SIO
         sample_data_sio_ptg = sample_data_sio[((sample_data_sio['nItems_ptg'] > 0) &
@@ -659,7 +811,7 @@ class WAREHOUSESimulation:
                                 len(sample_data_mio_ptg_gtp_e1), len(sample_data_mio_ptg_gtp_e2), len(sample_data_mio_ptg_gtp_e3),
                                 PtG_available,
                                 GtP_available,
-                                self.res.finished_orders(self.finished_orders),
+                                self.finished_orders.n_orders,
                                 self.res.tardy_orders,
                                 current_time]
             
@@ -667,29 +819,14 @@ class WAREHOUSESimulation:
 
     def clip_state(self, state):
         # Clipping and normalization operation
-        # x_norm = (x - min(x)) / (max(x) - min(x))
-        state_norm = []
-        for index, state in enumerate(state):
-            if index < 15:
-                clipped_value = min(state, self.config['state_clipping'])
-                state_norm.append(clipped_value / (self.config['state_clipping']))
-                
-            elif index == 15 or index == 16:
-                state_norm.append(state)
-
-            elif index == 17:
-                clipped_value = min(state, self.config_environment['throughput'])
-                state_norm.append(clipped_value / (self.config_environment['throughput']))
-
-            elif index == 18:
-                clipped_value = min(state, self.config_environment['throughput'] / 2)
-                state_norm.append(clipped_value / (self.config_environment['throughput'] / 2))
-                
-            elif index == 19:
-                if state > 24 * 3600:
-                    state -= 24 * 3600
-                time = (state / 3600) / 24
-                state_norm.append(time)
+        # x_norm = min(x, clip) / scale, with the clip and scale vectors of the scenario config
+        state_norm = (np.minimum(state[:19], self.state_clip) / self.state_scale).tolist()
+
+        # Time of day
+        time = state[19]
+        if time > 24 * 3600:
+            time -= 24 * 3600
+        state_norm.append((time / 3600) / 24)
         return state_norm
 
     def action_to_orders(self, action):
@@ -701,6 +838,11 @@ class WAREHOUSESimulation:
             
         picking_items = self.order_categories[order_category]
         all_picking_items = self.order_categories[order_category]
+
+        if self.heuristic == 'PLAN' and action in self.actions_pick_by_batch and len(all_picking_items) > 1:
+            # The batch is popped from the batch plan of the category by planned_batching, the picking order is
+            # computed by remove_orders
+            return None, picking_items, order_category, all_picking_items
         
         if action not in self.actions_pick_by_batch:  # pick-by-order decision
             
@@ -753,8 +895,9 @@ class WAREHOUSESimulation:
                 elif action == 5:  # MIO order
                     picking_items_batch = picking_items.iloc[0:1]
                     sku_list = picking_items_batch['skuIDlist'].iloc[0]
+                    candidates = self.sku_candidates(order_category, picking_items, [0])
                     for sku in sku_list:
-                        for item in range(len(picking_items)):
+                        for item in candidates:
                             test_item = picking_items['skuIDlist'].iloc[item]
                             if sku in test_item and item > 0:
                                 picking_items_batch = picking_items_batch.append(picking_items.iloc[item])
@@ -805,8 +948,9 @@ class WAREHOUSESimulation:
                 else:  # MIO order
                     picking_items_batch = picking_items.iloc[0:1]
                     sku_list = picking_items_batch['skuIDlist'].iloc[0]
+                    candidates = self.sku_candidates(order_category, picking_items, [0])
                     for sku in sku_list:
-                        for item in range(len(picking_items)):
+                        for item in candidates:
                             test_item = picking_items['skuIDlist'].iloc[item]
                             if sku in test_item and item > 0:
                                 picking_items_batch = picking_items_batch.append(picking_items.iloc[item])
@@ -829,28 +973,94 @@ class WAREHOUSESimulation:
         return picking_order, picking_items, order_category, all_picking_items
     
     def resource_rebalance(self, t):
-        # If PtG operator is idle for 15 minutes, allocate to DtO work station 1 operator at a time
-        if self.DtO_resource_transfer == 0:
-            if self.PtG_picker_available > 0:
-                self.DtO_resource_transfer = t
+        # If a PtG picker is idle at two checks in a row (rebalance_interval apart), allocate it to the DtO work
+        # station, 1 operator at a time, as long as PtG keeps the minimum of the shift. A transferred picker goes back
+        # to PtG when orders wait at PtG and a DtO operator is idle.
+        if self.DtO_transferred > 0 and len(self.qPtG) > self.qPtG.in_service and self.DtO_operator_available > 0:
+            self.transfer_pickers(-1, t)
+            self.DtO_resource_transfer = 0
+
+        elif self.PtG_picker_available <= 0 or self.qPtG.servers <= self.PtG_minimum():
+            self.DtO_resource_transfer = 0
+
+        elif self.DtO_resource_transfer == 0:
+            self.DtO_resource_transfer = t
                 
-        elif self.DtO_resource_transfer != 0 and t - self.DtO_resource_transfer > self.rebalance_interval:
-            self.PtG_picker_available -= 1  
-            self.DtO_operator_available += 1
+        elif t - self.DtO_resource_transfer >= self.rebalance_interval:
+            self.transfer_pickers(1, t)
             self.DtO_resource_transfer = 0
-            
-        elif self.DtO_resource_transfer != 0:
-            if self.PtG_picker_available == 0:
-                self.DtO_resource_transfer = t
+
+    def transfer_pickers(self, n, t):
+        # n PtG pickers to the DtO work station, a negative n moves transferred pickers back to PtG
+        self.PtG_picker_available -= n
+        self.DtO_operator_available += n
+        self.qPtG.set_servers(self.qPtG.servers - n, t)
+        self.qDtO.set_servers(self.qDtO.servers + n, t)
+        self.DtO_transferred += n
+
+    def PtG_minimum(self):
+        # PtG pickers of the shift that are never moved to DtO
+        return int(np.ceil(self.rebalance_min_share * self.config['nPtG_pickers'][self.shift]))
+
+    def resource_wait(self, t):
+        # Time of the next resource change when orders wait for resources and no departure is scheduled: the next
+        # calendar event or, in streaming mode, the next order arrival
+        t_next = self.fes.next_calendar_time()
+        if self.order_stream is not None:
+            next_arrival = self.order_stream.next_arrival()
+            if next_arrival is not None:
+                t_next = min(t_next, self.visible_from(next_arrival))
+        if t_next == float('inf'):
+            return t + self.time_step_arrival
+        return max(t_next, t + self.time_step_arrival)
                 
-    def change_shift(self, time):
-        if not self.shift_change:
-            if time > self.config['shift_start'][1]*3600:
-                self.PtG_picker_available += (self.config['nPtG_pickers'][1] - self.config['nPtG_pickers'][0])
-                self.GtP_shuttle_available += (self.config['nGtP_shuttles'][1] - self.config['nGtP_shuttles'][0])
-                self.DtO_operator_available += (self.config['nDtO_operators'][1] - self.config['nDtO_operators'][0])
-                self.StO_operator_available += (self.config['nStO_operators'][1] - self.config['nStO_operators'][0])
-                self.shift_change = True
+    def change_shift(self, shift, t):
+        # Resources of the new shift. Busy resources finish their order, a station with less resources in the new
+        # shift gets negative availability until enough resources are released.
+        for resources, queue, available in [('nPtG_pickers', self.qPtG, 'PtG_picker_available'),
+                                            ('nGtP_shuttles', self.qGtP, 'GtP_shuttle_available'),
+                                            ('nDtO_operators', self.qDtO, 'DtO_operator_available'),
+                                            ('nStO_operators', self.qStO, 'StO_operator_available')]:
+            change = self.config[resources][shift] - self.config[resources][self.shift]
+            setattr(self, available, getattr(self, available) + change)
+            queue.set_servers(queue.servers + change, t)
+        self.shift = shift
+
+        # Transferred pickers go back to PtG when PtG has less than the minimum of the new shift
+        missing = min(self.PtG_minimum() - self.qPtG.servers, self.DtO_transferred)
+        if missing > 0:
+            self.transfer_pickers(-missing, t)
+
+    def shift_at(self, t):
+        # Shift of time t: the shift that started last, shifts start at the same hours every day
+        time_of_day = t % (24 * 3600)
+        started = [shift for shift in range(self.shifts) if self.config['shift_start'][shift] * 3600 <= time_of_day]
+        if not started:
+            return self.shifts - 1
+        return max(started, key=lambda shift: self.config['shift_start'][shift])
+
+    def schedule_calendar(self, t):
+        # First start of every other shift after t and the first rebalance check, handle_calendar schedules the
+        # next ones
+        if self.shifts > 1:
+            for shift, start in enumerate(self.config['shift_start']):
+                t_shift = t - t % (24 * 3600) + start * 3600
+                if t_shift <= t:
+                    t_shift += 24 * 3600
+                self.fes.schedule(Event(Event.SHIFT, None, t_shift, None, shift))
+        if self.rebalance_interval:
+            self.fes.schedule(Event(Event.REBALANCE, None, t + self.rebalance_interval, None))
+
+    def handle_calendar(self, t):
+        for event in self.fes.pop_calendar(t):
+            if event.type == Event.SHIFT:
+                if event.shift != self.shift:
+                    self.change_shift(event.shift, event.time)
+                self.fes.schedule(Event(Event.SHIFT, None, event.time + 24 * 3600, None, event.shift))
+
+            elif event.type == Event.REBALANCE:
+                self.resource_rebalance(event.time)
+                self.fes.schedule(Event(Event.REBALANCE, None, event.time + self.rebalance_interval, None))
                 
     def custom_heuristic(self, state):
         resource_availability = {1: state[15], 2: state[15],
@@ -970,114 +1180,54 @@ class WAREHOUSESimulation:
         return chosen_action
     
     def LST_batching(self, action, picking_items, t):
-        if action in [1,5]:
-            if action in self.actions_pick_by_batch:
-                new_batch = picking_items.iloc[0:self.max_batchsize_ptg]
-                slack_batch = picking_items.iloc[0][7] - t
-                
-                slack_batch -= (self.config['PtG_picking_constant'] + self.PtG_Out_time)
-                
-                if action == 5:
-                    slack_batch -= (self.PtG_GtP_time + self.StO_time + self.GtP_StO_time)
-                
-                for order in range(len(new_batch)):
-                    if action == 1: # only for SIO PtG batching
-                        processing_time = picking_items.iloc[order][4] * self.config['PtG_picking_time']
-                    elif action == 5: # only for MIO PtG batching
-                        processing_time = picking_items.iloc[order][4] * self.config['PtG_picking_time'] + self.GtP_picking_time * new_batch.iloc[order][5]
-                    
-                    slack_batch -= processing_time
-                    
-                for order in range(len(new_batch)):
-                    if slack_batch < 0:
-                        new_batch = new_batch[:-1]
-                        
-                        if action == 1: # only for SIO PtG batching
-                            processing_time = picking_items.iloc[order][4] * self.config['PtG_picking_time']
-                        elif action == 5: # only for MIO PtG batching
-                            processing_time = picking_items.iloc[order][4] * self.config['PtG_picking_time'] + self.GtP_picking_time * picking_items.iloc[order][5]
-                    
-                        slack_batch += processing_time
-                        
-                        if len(new_batch) == 0:
-                            new_batch = picking_items.iloc[0:1]
-                            break
-                        if slack_batch >= 0:
-                            break
-                        
-                # Check if items constraint of batch is not violated
-                item_list = list(set(x for item in new_batch['skuIDlist'].tolist() for x in item))
-                if len(item_list) > self.max_batchsize_ptg_items:
-                    for order in range(len(new_batch)):
-                        new_batch = new_batch[:-1]
-                        item_list = list(set(x for item in new_batch['skuIDlist'].to_list() for x in item))   
-                        
-                        if len(item_list) == 0:
-                            new_batch = picking_items.iloc[0:1]
-                            break
-                        
-                        if len(item_list) <= self.max_batchsize_ptg_items:
-                            break
-                        
-            else:
-                new_batch = picking_items
+        if action in [1,5] and action in self.actions_pick_by_batch:
+            new_batch = picking_items.iloc[0:self.lst_batch_size(action, picking_items, t)]
         else:
             new_batch = picking_items
 
         self.batch_list.append(len(new_batch))
         return new_batch
+
+    def lst_batch_size(self, action, picking_items, t):
+        # Number of orders at the front of picking_items in the LST batch: the first max_batchsize_ptg orders,
+        # trimmed from the back until the slack of the first order is not negative and the batch holds at most
+        # max_batchsize_ptg_items unique SKUs. Every trim gives back the processing time of the next order from
+        # the front of the batch, and a batch keeps at least one order.
+        n = min(self.max_batchsize_ptg, len(picking_items))
+        slack_batch = picking_items['cutoff_time'].iat[0] - t
+        slack_batch -= (self.PtG_picking_constant + self.PtG_Out_time)
+        if action == 5:
+            slack_batch -= (self.PtG_GtP_time + self.StO_time + self.GtP_StO_time)
+
+        processing_time = picking_items['nItems_ptg'].values[:n] * self.PtG_picking_time
+        if action == 5: # MIO orders are also picked at the GtP station
+            processing_time = processing_time + self.GtP_picking_time * picking_items['nItems_gtp'].values[:n]
+
+        # Slack of the full batch, then the slack after every trim; cumsum adds in the same order as the loops did
+        slack = np.cumsum(np.concatenate(([slack_batch], -processing_time)))[-1]
+        slack = np.cumsum(np.concatenate(([slack], processing_time)))
+        size = max(n - np.searchsorted(slack[:n], 0, side='left'), 1)
+
+        # Running count of the unique SKUs of every prefix of the batch (at most max_batchsize_ptg orders)
+        skus = set()
+        unique_skus = []
+        for sku_list in picking_items['skuIDlist'].values[:size]:
+            skus.update(sku_list)
+            unique_skus.append(len(skus))
+        if unique_skus[-1] > self.max_batchsize_ptg_items:
+            size = np.searchsorted(unique_skus, self.max_batchsize_ptg_items, side='right')
+            if size == 0 or unique_skus[size - 1] == 0:
+                size = 1
+        return int(size)
     
     def grasp_vnd(self, action, picking_items, all_picking_items, t):
         if action in [1, 5] and len(picking_items) > 1:
-            # GRASP batching method --> constructive method
-            alpha = random.random()
-            batch_list = all_picking_items.iloc[0:1]
-            all_picking_items = all_picking_items[~all_picking_items['orderID'].isin(batch_list['orderID'])]
-            
-            for i in range(len(all_picking_items)):
-                threshold = int(round(all_picking_items['cutoff_time'].argmin() - alpha * (all_picking_items['cutoff_time'].argmin() - all_picking_items['cutoff_time'].argmax())))
-                threshold = min(threshold, len(all_picking_items))
-                threshold = max(1, threshold)
-                restricted_order_list = all_picking_items.iloc[0:threshold]
-                selected_order = restricted_order_list.sample(n=1)
-    
-                batch_list = batch_list.append(selected_order)
-            
-            # batch_list contains sorted orders that need to be arranged in batches of max 10
-            # These are initially batched using the LST batching algorithm
-            new_batch_list = []
-            while len(all_picking_items) > 0:
-                new_batch = self.LST_batching(action, all_picking_items, t)
-                new_batch_list.append(new_batch)
-                all_picking_items = all_picking_items[~all_picking_items['orderID'].isin(new_batch['orderID'])]
-                
-            # new_batch_list contains a list with batches compiled by the constructor and the LST heuristic
-            # Now Variable Neighborhood Descent will be applied to perform insert and swap moves
-            k = 1
-            k_max = 7
-            
-            best_solution = new_batch_list
+            new_batch_list = self.grasp_construct(action, all_picking_items, t)
             if len(new_batch_list) == 0:
                 print('Batch list is empty !')
                 print(picking_items)
-            best_solution_result = self.evaluate_solution(new_batch_list)
-            
-            while k != k_max:
-                if k in [1, 4, 7, 10]:
-                    solution = self.local_search_grasp(best_solution, 1)
-                elif k in [2, 5, 8, 11]:
-                    solution = self.local_search_grasp(best_solution, 2)
-                elif k in [3, 6, 9, 12]:
-                    solution = self.local_search_grasp(best_solution, 3)
-                
-                solution_result = self.evaluate_solution(solution)
-                if solution_result < best_solution_result:
-                    best_solution = solution
-                    best_solution_result = solution_result
-                    k = 1
-                else:
-                    k += 1
-            
+            best_solution, best_solution_result = self.vnd_grasp(new_batch_list)
+
             # return the first batch of best solution
             new_solution = best_solution[0]
                     
@@ -1085,6 +1235,76 @@ class WAREHOUSESimulation:
             new_solution = picking_items
         
         return new_solution
+
+    def grasp_multistart(self, action, picking_items, all_picking_items, t):
+        # Multi-start GRASP: independent constructions plus VND within the time budget of the decision
+        if action in [1, 5] and len(picking_items) > 1:
+            best_solution, best_solution_result = self.multistart_grasp.solve(self, action, all_picking_items, t)
+            new_solution = best_solution[0]
+        else:
+            new_solution = picking_items
+
+        return new_solution
+
+    def grasp_construct(self, action, all_picking_items, t):
+        # GRASP batching method --> constructive method
+        alpha = random.random()
+        batch_list = all_picking_items.iloc[0:1]
+        all_picking_items = all_picking_items[~all_picking_items['orderID'].isin(batch_list['orderID'])]
+        
+        for i in range(len(all_picking_items)):
+            threshold = int(round(all_picking_items['cutoff_time'].argmin() - alpha * (all_picking_items['cutoff_time'].argmin() - all_picking_items['cutoff_time'].argmax())))
+            threshold = min(threshold, len(all_picking_items))
+            threshold = max(1, threshold)
+            restricted_order_list = all_picking_items.iloc[0:threshold]
+            selected_order = restricted_order_list.sample(n=1)
+
+            batch_list = batch_list.append(selected_order)
+        
+        # batch_list contains sorted orders that need to be arranged in batches of max 10
+        # These are initially batched using the LST batching algorithm
+        new_batch_list = []
+        while len(all_picking_items) > 0:
+            new_batch = self.LST_batching(action, all_picking_items, t)
+            new_batch_list.append(new_batch)
+            all_picking_items = all_picking_items[~all_picking_items['orderID'].isin(new_batch['orderID'])]
+
+        return new_batch_list
+
+    def vnd_grasp(self, new_batch_list, deadline=None, copy_moves=False):
+        # new_batch_list contains a list with batches compiled by the constructor and the LST heuristic
+        # Now Variable Neighborhood Descent will be applied to perform insert and swap moves
+        # The search stops early when the time.time() deadline of a multi-start decision has passed
+        # local_search_grasp changes the batch list in place, so a rejected move also changes the best solution. With
+        # copy_moves the moves are applied to a copy and the best result describes the best solution, which the
+        # multi-start GRASP needs to compare its starts. GRASP_VND keeps the in-place moves of the original heuristic
+        k = 1
+        k_max = 7
+        
+        best_solution = new_batch_list
+        best_solution_result = self.evaluate_solution(new_batch_list)
+        
+        while k != k_max:
+            if deadline is not None and time.time() >= deadline:
+                break
+
+            solution = list(best_solution) if copy_moves else best_solution
+            if k in [1, 4, 7, 10]:
+                solution = self.local_search_grasp(solution, 1)
+            elif k in [2, 5, 8, 11]:
+                solution = self.local_search_grasp(solution, 2)
+            elif k in [3, 6, 9, 12]:
+                solution = self.local_search_grasp(solution, 3)
+            
+            solution_result = self.evaluate_solution(solution)
+            if solution_result < best_solution_result:
+                best_solution = solution
+                best_solution_result = solution_result
+                k = 1
+            else:
+                k += 1
+
+        return best_solution, best_solution_result
     
     def evaluate_solution(self, batch_list):
         # all batches in batch list are either MIO or SIO PtG orders
@@ -1191,7 +1411,11 @@ class WAREHOUSESimulation:
     
     def boc_batching(self, action, picking_items, all_picking_items):
         # BOC batching method
-        if action in [1, 5] and len(picking_items) > 1 and len(all_picking_items) > 1:
+        if action in [1, 5] and len(picking_items) > 1 and len(all_picking_items) > 1 and self.indexed():
+            order_category = next(i for i in self.action_category_mapping[action] if len(self.order_categories[i]) > 0)
+            picking_items_batch = self.boc_batching_index(action, all_picking_items, order_category)
+
+        elif action in [1, 5] and len(picking_items) > 1 and len(all_picking_items) > 1:
             
             if action == 1:  # SIO order
                 # 1. select seed order with the most items
@@ -1279,122 +1503,94 @@ class WAREHOUSESimulation:
         
         return picking_items_batch
 
+    def boc_batching_index(self, action, all_picking_items, order_category):
+        # boc_batching on the LSH candidates of the batch: the similarity coefficients are only computed for the
+        # candidates of the orders in the batch, the batch equals the batch of boc_batching when every order that
+        # shares SKUs with the batch is a candidate
+        sku_lists = all_picking_items['skuIDlist'].values
+        cutoff_times = all_picking_items['cutoff_time'].values
+        remaining = np.ones(len(all_picking_items), dtype=bool)
+
+        # 1. select the seed order, the most frequent SKU list (SIO) or the order with the most items (MIO)
+        if action == 1:
+            sku_item = all_picking_items["skuIDlist"].value_counts().index[0]
+            seed = next(order for order in range(len(sku_lists)) if sku_lists[order] == sku_item)
+        else:
+            seed = int(np.argmax([len(sku_list) for sku_list in sku_lists]))
+        batch = [seed]
+        batch_skus = collections.Counter(sku_lists[seed])
+        seen = set()
+        candidates = set(self.sku_candidates(order_category, all_picking_items, [seed], seen))
+
+        # 2. add the candidate with the highest similarity coefficient, the order with the most imminent cutoff time
+        # when no candidate is similar
+        for i in range(self.max_batchsize_ptg - 1):
+            if action == 1 and remaining.sum() <= 1:
+                break
+            remaining[batch] = False
+            if not remaining.any():
+                break
+
+            index_order, max_similarity = None, 0
+            for order in sorted(candidates):
+                if remaining[order]:
+                    similarity = sum(batch_skus[sku] for sku in sku_lists[order]) / len(sku_lists[order])
+                    if similarity > max_similarity:
+                        index_order, max_similarity = order, similarity
+            if index_order is None:
+                orders = np.flatnonzero(remaining)
+                index_order = int(orders[np.argmin(cutoff_times[orders])])
+
+            batch.append(index_order)
+            batch_skus.update(sku_lists[index_order])
+            candidates.update(self.sku_candidates(order_category, all_picking_items, [index_order], seen))
+
+        return all_picking_items.iloc[batch]
+
+    def indexed(self):
+        # The similarity index is used when the order categories are the categories of the order book
+        return self.similarity is not None and self.order_categories is self.order_book
+
+    def sku_candidates(self, order_category, picking_items, members, seen=None):
+        # Positions in picking_items (the frame of the order category) of the orders that may share SKUs with the
+        # orders at the positions members: every position, or the LSH candidates of the members with the index.
+        # Buckets in seen are not read again, see SimilarityIndex.candidates
+        if not self.indexed():
+            return range(len(picking_items))
+        order_ids = picking_items['orderID'].values[members]
+        candidates = set().union(*(self.similarity.candidates(order_id, seen) for order_id in order_ids))
+        return self.order_book.category_positions(order_category, candidates).tolist()
+
     def GVNS_batching(self, action, picking_items, all_picking_items):
-        # 1. Compute constructive solution with EDD batching heuristic
+        # Anytime GVNS from the EDD construction, see GVNSEngine for the neighbourhoods and termination criteria
         all_picking_items = all_picking_items.sort_values(by='cutoff_time', ascending=True)
-        batches = []
         if action in [1, 5] and len(picking_items) > 1:
-            for order in range(len(all_picking_items)):
-                if len(all_picking_items) > 0:
-                    # Compile batch
-                    batch = all_picking_items.iloc[0:self.max_batchsize_ptg-1]
-                    batches.append(batch)
-                    
-                    # Remove batched orders from all_picking_items
-                    all_picking_items = all_picking_items[~all_picking_items['orderID'].isin(batch['orderID'])]  
-
-            # 2. Execute neighborhood search
-            max_steps = 5
-            k_max = 2
-            best_solution = batches
-            best_solution_result = self.evaluate_solution(batches)
-            
-            for step in range(max_steps):
-                for k in range(1, k_max):
-                    solution_1 = self.local_search_gnvs(best_solution, 1, k) # SHAKE
-                    solution_2 = self.vnd_gnvs(best_solution, k_max) # VND
-                    
-                    solution_1_result = self.evaluate_solution(solution_1)
-                    solution_2_result = self.evaluate_solution(solution_2)
-                    
-                    if best_solution_result > solution_1_result and solution_2_result > solution_1_result:
-                        best_solution = solution_1
-                        best_solution_result = solution_1_result
-                        
-                    elif best_solution_result > solution_2_result and solution_1_result > solution_2_result:
-                        best_solution = solution_2
-                        best_solution_result = solution_2_result
-                        
-            picking_items_batch = best_solution[0]
-                
+            picking_items_batch = all_picking_items.iloc[self.gvns.solve(all_picking_items)]
         else:
             picking_items_batch = picking_items
         
         return picking_items_batch
-    
-    def local_search_gnvs(self, batch_list, move, k=1):
-        if move == 1:
-            for i in range(k):
-                no_batches = len(batch_list)
-                # Collect batches where an order can be inserted
-                batches_available_in = [idx for idx, batch in enumerate(batch_list) if len(batch) < self.max_batchsize_ptg]
-                if len(batches_available_in) > 0:
-                    # sample batch and order
-                    batch_out = random.sample(range(0, no_batches), k=1)[0]
-                    batch_in = random.sample(batches_available_in, k = 1)[0]
-                    if batch_out == batch_in:
-                        batch_out = random.sample(range(0, no_batches), k=1)[0]
-                    
-                    sample_batch_out = batch_list[batch_out]
-                    
-                    # insert order
-                    order_out = random.sample(range(0,len(sample_batch_out)), k=1)[0]
-                    sample_order_out = sample_batch_out.iloc[order_out-1:order_out]
-                    
-                    # append order to new batch
-                    batch_list[batch_in] = batch_list[batch_in].append(sample_order_out)
-                    
-                    # remove order from old batch
-                    batch_list[batch_out] = batch_list[batch_out][~batch_list[batch_out]['orderID'].isin(sample_order_out['orderID'])]                                          
 
-        elif move == 2:
-            # Swap move 1: randomly swap a single order between two batches
-            no_batches = len(batch_list)
-            
-            batch_out = random.sample(range(0, no_batches), k=1)[0]
-            batch_in = random.sample (range(0, no_batches), k = 1)[0]
-            if batch_out == batch_in:
-                batch_out = random.sample(range(0, no_batches), k=1)[0]
-                
-            sample_batch_out = batch_list[batch_out]
-            sample_batch_in = batch_list[batch_in]
-            
-            # select order
-            order_out = random.sample(range(0,len(sample_batch_out)), k=1)[0]
-            order_in = random.sample(range(0,len(sample_batch_in)), k=1)[0]
-            
-            # swap orders and remove order from old batch
-            sample_order_out = sample_batch_out.iloc[order_out-1:order_out]
-            batch_list[batch_in] = batch_list[batch_in].append(sample_order_out)
-            batch_list[batch_out] = batch_list[batch_out][~batch_list[batch_out]['orderID'].isin(sample_order_out['orderID'])]
-            
-            sample_order_in = sample_batch_in.iloc[order_in-1:order_in]
-            batch_list[batch_out] = batch_list[batch_out].append(sample_order_in)
-            batch_list[batch_in] = batch_list[batch_in][~batch_list[batch_in]['orderID'].isin(sample_order_in['orderID'])]
-            
-        return batch_list
-    
-    def vnd_gnvs(self, batches, k_max):
-        best_solution = batches
-        best_solution_result = self.evaluate_solution(batches)
-        for x in range(k_max):
-            solution_1 = self.local_search_gnvs(batches, 1, k=k_max)
-            solution_2 = self.local_search_gnvs(batches, 2, k=k_max)
-            
-            solution_1_result = self.evaluate_solution(solution_1)
-            solution_2_result = self.evaluate_solution(solution_2)
-            
-            if best_solution_result > solution_1_result and solution_2_result > solution_1_result:
-                best_solution = solution_1
-                best_solution_result = solution_1_result
-                
-            elif best_solution_result > solution_2_result and solution_1_result > solution_2_result:
-                best_solution = solution_2
-                best_solution_result = solution_2_result
-                
-        return best_solution
-                
-            
+    def planned_batching(self, action, picking_items, all_picking_items):
+        # Next batch of the batch plan of the order category, the plan is repaired and not solved again. The plans
+        # of the PtG actions keep the item constraint of the PtG batches and fill batches with dissimilar orders, the
+        # plans of the GtP actions only batch orders with a common SKU.
+        if action in self.actions_pick_by_batch and len(all_picking_items) > 1:
+            order_category = next(i for i in self.action_category_mapping[action] if len(self.order_categories[i]) > 0)
+            if action in [1, 5]:
+                batch = self.batch_planner.next_batch(order_category, all_picking_items, self.max_batchsize_ptg,
+                                                      self.max_batchsize_ptg_items)
+            elif action == 8:
+                batch = self.batch_planner.next_batch(order_category, all_picking_items, self.max_batchsize_ptg_gtp,
+                                                      fill=False)
+            else:
+                batch = self.batch_planner.next_batch(order_category, all_picking_items, self.max_batchsize_gtp,
+                                                      fill=False)
+            picking_items_batch = all_picking_items[all_picking_items['orderID'].isin(batch)]
+        else:
+            picking_items_batch = picking_items
+
+        return picking_items_batch
 
     def random_policy(self, state):
         # Compute action availability based on resources
@@ -1424,8 +1620,34 @@ class WAREHOUSESimulation:
     
     # @profile
     def remove_orders(self, action, picking_items, order_category):
+        picking_order, picking_items = self.select_picking_order(action, picking_items)
+
+        # Mark the orders as removed, the frame of their category is rebuilt when it is used again
+        self.order_book.remove(picking_items['orderID'].values)
+        return picking_order, picking_items
+
+    def pull_orders(self, t):
+        # Streaming mode: add the orders that are visible at t to the order book and retire the finished orders of
+        # the cutoff waves that have closed
+        arrived = self.order_stream.pull(self.lookahead(t))
+        self.nOrders += len(arrived)
+        self.order_book.extend(arrived)
+        self.finished_orders.retire(t)
+
+    @staticmethod
+    def lookahead(t):
+        # Orders are visible in the state representation from 5% of the time of day before their arrival
+        return t * 1.05 - 0.05 * (t - t % (24 * 3600))
+
+    @staticmethod
+    def visible_from(arrival_time):
+        # Time from which an order that arrives at arrival_time is visible, the inverse of lookahead within a day
+        day = arrival_time - arrival_time % (24 * 3600)
+        return day + (arrival_time - day) / 1.05
+
+    def select_picking_order(self, action, picking_items):
+        # cutoff_time, nOrders, nItems_ptg, nItems_gtp, route of the orders that are picked with this action
         if action in self.actions_pick_by_batch:
-            self.order_data = self.order_data[~self.order_data['orderID'].isin(picking_items['orderID'])]
             batch_size = len(picking_items)
 
             if len(picking_items) == 1:
@@ -1446,15 +1668,9 @@ class WAREHOUSESimulation:
                 
         else:
             picking_items = picking_items.iloc[0:1]
-            self.order_data = self.order_data[~self.order_data['orderID'].isin(picking_items['orderID'])]
             picking_order = [picking_items['cutoff_time'].iloc[0], len(picking_items['nItems_ptg']),
                              sum(picking_items['nItems_ptg']), sum(picking_items['nItems_gtp']),
                              self.action_route_mapping[action]]
-            
-        # Remove orders from order_categories
-        all_picking_items = self.order_categories[order_category]
-        filtered_picking_items = all_picking_items[~all_picking_items['orderID'].isin(picking_items['orderID'])]
-        self.order_categories[order_category] = filtered_picking_items
 
         # change route if batch contains only 1 order and is considered as pick-by-order
         if action in self.actions_pick_by_batch:
@@ -1474,75 +1690,29 @@ class WAREHOUSESimulation:
 
         return picking_order, picking_items
     
-    def check_action(self, action, state):
-        # Compute action availability based on resources
-        resource_availability = {1: state[15], 2: state[15],
-                                 3: state[15], 4: state[16],
-                                 5: state[16], 6: state[15]}
-        routes_available = [x for x in resource_availability.keys() if resource_availability[x] > 0]
-
-        actions_available_resource = [self.route_action_mapping[x] for x in routes_available]
-        actions_available_resource = list(set(x for action in actions_available_resource for x in action))
-
-        # Compute action availability based on order categories
-        order_categories_available = [idx for idx, x in enumerate(state) if state[idx] > 0 and idx <= 14]
-
-        actions_available_orders = [self.category_action_mapping[x] for x in order_categories_available]
-        actions_available_orders = list(set(x for action in actions_available_orders for x in action))
+    def action_bits(self, state):
+        # Feasible actions of a state as a bit set: a batching action needs orders in one of its order categories and
+        # an available resource on its route (15: PtG pickers, 16: GtP shuttles), the no-op (10) is only feasible when
+        # no batching action is
+        orders = 0
+        for category in range(N_CATEGORIES):
+            if state[category] > 0:
+                orders |= self.category_action_bits[category]
+        resources = 0
+        for resource, actions in self.resource_action_bits.items():
+            if state[resource] > 0:
+                resources |= actions
+        return orders & resources or 1 << 10
+
+    def action_mask(self, state):
+        bits = self.action_bits(state)
+        return [bits >> action & 1 for action in range(self.nActions)]
 
-        # Concatenate both lists
-        actions_available = []
-        for i in actions_available_orders:
-            if i in actions_available_resource:
-                actions_available.append(i)
-                
-        if action != 10:
-            if action in actions_available:
-                feasibility = True
-            else:
-                feasibility = False
-        
-        if action == 10:
-            if len(actions_available) == 0:
-                feasibility = True
-            else:
-                feasibility = False
-                
-        return feasibility
+    def check_action(self, action, state):
+        return bool(self.action_bits(state) >> action & 1)
 
     def available_actions(self, state):
-        resource_availability = {1: state[15], 2: state[15],
-                                 3: state[15], 4: state[16],
-                                 5: state[16], 6: state[15]}
-
-        order_categories_available = [idx for idx, x in enumerate(state)
-                                      if x > 0 and idx <= 14]
-
-        actions_available_orders = [self.category_action_mapping[x] for x in order_categories_available]
-        actions_available_orders = list(set(x for j in actions_available_orders for x in j))
-
-        # 2. Resource availability
-        actions_available_resources = [x for x in self.action_route_mapping.keys() if
-                                       resource_availability[self.action_route_mapping[x]] > 0]
-        actions_available = []
-        for i in actions_available_orders:
-            if i in actions_available_resources:
-                actions_available.append(i)
-
-        valid_actions = []
-        if len(actions_available) > 0:
-            for i in range(self.nActions):
-                if i in actions_available:
-                    valid_actions.append(1)
-                else:
-                    valid_actions.append(0)
-        else:
-            for i in range(self.nActions):
-                if i != 10:
-                    valid_actions.append(0)
-                else:
-                    valid_actions.append(1)
-        return valid_actions
+        return self.action_mask(state)
 
     def set_weight_settings(self, weights, t):
         t_hours = t / 3600
@@ -1574,14 +1744,16 @@ class WAREHOUSESimulation:
 
         return weight_tardy
 
-    def get_reward(self, action):
+    def get_reward(self, action, feasibility=None):
         # set correct weight settings
         # self.set_weight_settings(self.weights, self.state_representation[:][-1])
+        t_phase = self.profiler.tick()
 
         self.reward_action = 0
-        feasibility = self.check_action(action, self.state_representation[:])
-        tardy_orders = self.state_representation[:][-2] - self.tardy_order_hist
-        self.tardy_order_hist = self.state_representation[:][-2]
+        if feasibility is None:
+            feasibility = self.check_action(action, self.state_representation)
+        tardy_orders = self.state_representation[-2] - self.tardy_order_hist
+        self.tardy_order_hist = self.state_representation[-2]
 
         if not feasibility:
             self.reward_action += self.reward_structure['infeasible_action']
@@ -1621,15 +1793,18 @@ class WAREHOUSESimulation:
                     self.avg_size_pick_batch.append(self.nOrders_hist / self.max_batchsize_ptg_gtp)
 
         self.reward_episode += self.reward_action
+        self.profiler.tock('reward', t_phase)
         return self.reward_action
 
-    def get_reward_mo(self, action):
+    def get_reward_mo(self, action, feasibility=None):
         # Compared to the traditional reward function, this needs to output a vector of results
+        t_phase = self.profiler.tick()
 
         self.reward_action = [0, 0]
-        feasibility = self.check_action(action, self.state_representation[:])
-        tardy_orders = self.state_representation[:][-2] - self.tardy_order_hist
-        self.tardy_order_hist = self.state_representation[:][-2]
+        if feasibility is None:
+            feasibility = self.check_action(action, self.state_representation)
+        tardy_orders = self.state_representation[-2] - self.tardy_order_hist
+        self.tardy_order_hist = self.state_representation[-2]
 
         converted_action = self.action_to_action[action]
 
@@ -1681,21 +1856,45 @@ class WAREHOUSESimulation:
                 if converted_action in self.actions_pick_by_batch:
                     self.avg_size_pick_batch.append(self.nOrders_hist / self.max_batchsize_ptg_gtp)
 
+        self.profiler.tock('reward', t_phase)
         return self.reward_action
 
+    def step(self, action, objective='scalar'):
+        # One decision of the gym environment in a single pass: the action mask is computed once and gives the
+        # feasibility of the action to the reward, the reward is booked before the transition (as get_reward followed
+        # by simulate) and the mask of the next state is returned, so the policy masks its next action without another
+        # pass over the state. Returns the next state, the reward (scalar or the vector of get_reward_mo), done, the
+        # feasibility of the action and the action mask of the next state
+        feasibility = bool(self.action_bits(self.state_representation) >> action & 1)
+        if objective == 'mo':
+            reward = self.get_reward_mo(action, feasibility)
+        else:
+            reward = self.get_reward(action, feasibility)
+
+        if feasibility:
+            state = self.simulate(action)
+        else:
+            state = self.get_state()
+        return state, reward, self.check_termination(), feasibility, self.action_mask(self.state_representation)
+
     def check_termination(self):
-        if self.res.finished_orders(self.finished_orders) >= self.nOrders:
-            return True
+        if self.order_stream is not None:
+            # Streaming mode: all orders are pulled, picked and out of the system
+            terminated = self.order_stream.exhausted() and not self.order_book.alive.any() and \
+                len(self.fes.events) == 0
         else:
-            return False
+            terminated = self.finished_orders.n_orders >= self.nOrders
+        if terminated:
+            self.close()
+        return terminated
 
     def episode_render(self):
         if len(self.picking_strategy) > 100:
             tardy_orders = self.state_representation[-2] / self.state_representation[-3]
-            batch_decision = self.picking_strategy.count(1) / len(self.picking_strategy)
-            batch_size = round(sum(self.avg_batch_size) / len(self.avg_batch_size), 3)
-            picking_time = round(sum(self.picking_time) / len(self.picking_time), 3)
-            batch_size_pick_batch = round(sum(self.avg_size_pick_batch) / len(self.avg_size_pick_batch), 3)
+            batch_decision = self.picking_strategy.mean()
+            batch_size = round(self.avg_batch_size.mean(), 3)
+            picking_time = round(self.picking_time.mean(), 3)
+            batch_size_pick_batch = round(self.avg_size_pick_batch.mean(), 3)
         else:
             tardy_orders = 0
             batch_decision = 0
@@ -1709,15 +1908,57 @@ class WAREHOUSESimulation:
         print('Batch size: ', batch_size)
         print('Batch size pick by batch: ', batch_size_pick_batch)
         print('Picking time: ', picking_time)
+        for station, statistics in self.station_report().items():
+            print('{0:<4} WIP avg {1:.2f} max {2}, utilization {3}, throughput {4:.1f}/h'.format(
+                station, statistics['avg_wip'], statistics['max_wip'],
+                'n/a' if statistics['utilization'] is None else '{0:.3f}'.format(statistics['utilization']),
+                statistics['throughput_per_hour']))
+        self.reward_episode = 0
+
+    def make_multistart_grasp(self):
+        return MultiStartGrasp(self.config.get('grasp_time_budget', 0.5), self.config.get('grasp_max_starts', 64),
+                               self.config.get('grasp_workers', 4))
+
+    def resume(self, params, heuristic=None, profiler=None):
+        # Continue a snapshot of the simulation with the reward weights and batching heuristic of a new episode. The
+        # state, orders and KPIs of the snapshot are kept, the episode reward starts at zero.
+        if profiler is not None:
+            self.profiler = profiler
+        self.weight_tardy = params[0]
+        self.weight_picking = params[1]
+        self.heuristic = heuristic
+        if heuristic == 'GRASP_MS' and not hasattr(self, 'multistart_grasp'):
+            self.multistart_grasp = self.make_multistart_grasp()
         self.reward_episode = 0
+        self.reward_distribution = dict.fromkeys(self.reward_distribution, 0)
+        return self
+
+    def close(self):
+        # The timeline is complete when the episode ends, an episode that is abandoned closes it here as well
+        if self.timeline is not None:
+            self.timeline.close()
+
+    def __getstate__(self):
+        # The timeline holds an open file, a pickled simulation (warm start snapshot, checkpoint) has no timeline
+        state = self.__dict__.copy()
+        state['timeline'] = None
+        return state
+
+    def report(self):
+        return EpisodeReport.from_simulation(self)
+
+    def station_report(self):
+        # Time-weighted WIP, utilization, throughput and time in station per work station up to the current time
+        t = self.state_representation[-1]
+        return {queue.station: queue.statistics(t) for queue in [self.qPtG, self.qGtP, self.qDtO, self.qStO]}
 
     def episode_render_test(self):
         if len(self.picking_strategy) > 100:
             tardy_orders = self.state_representation[-2] / self.state_representation[-3]
-            batch_decision = self.picking_strategy.count(1) / len(self.picking_strategy)
-            batch_size = round(sum(self.avg_batch_size) / len(self.avg_batch_size), 3)
-            pick_time = round(sum(self.picking_time) / len(self.picking_time), 3)
-            batch_size_batch = round(sum(self.avg_size_pick_batch) / len(self.avg_size_pick_batch), 3)
+            batch_decision = self.picking_strategy.mean()
+            batch_size = round(self.avg_batch_size.mean(), 3)
+            pick_time = round(self.picking_time.mean(), 3)
+            batch_size_batch = round(self.avg_size_pick_batch.mean(), 3)
         else:
             tardy_orders = 0
             batch_decision = 0
@@ -0,0 +1,40 @@
+'''
+Streaming scenario_day episodes with resource rebalancing, run from drl-order-batching with
+
+    python -m pytest tests
+'''
+from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+from simulation_model.ScenarioConfig import ScenarioConfig
+from simulation_model.OrderStream import OrderStream
+from order_generator import OrderGenerator
+import random
+import numpy as np
+import pytest
+
+ORDERS_PER_DAY = 3000
+MAX_STEPS = 100000
+
+
+@pytest.mark.parametrize('min_share', [0.5, 0])
+def test_streamed_day_terminates(min_share):
+    # A day of streamed orders from midnight with both shifts and a rebalance check every 10 minutes
+    config = ScenarioConfig.load('scenario_day').replace('simulation', rebalance_interval=600,
+                                                         rebalance_min_share=min_share)
+    random.seed(0)
+    np.random.seed(0)
+    stream = OrderStream(OrderGenerator(n_skus=2000, seed=0).stream(ORDERS_PER_DAY, 1))
+    sim = WAREHOUSESimulation(config, stream, 0, (1, 1), None)
+
+    state_rep = sim.get_state()
+    steps = 0
+    while not sim.check_termination():
+        state_rep = sim.simulate(sim.edd_sequencing(state_rep))
+        steps += 1
+        assert steps < MAX_STEPS
+
+        # PtG keeps the minimum of the shift, DtO keeps at least the operators of the shift
+        assert sim.qPtG.servers >= min(sim.PtG_minimum(), config['simulation']['nPtG_pickers'][sim.shift])
+        assert sim.qDtO.servers >= config['simulation']['nDtO_operators'][sim.shift]
+
+    assert stream.exhausted()
+    assert sim.DtO_transferred == sim.qDtO.servers - config['simulation']['nDtO_operators'][sim.shift]
@@ -0,0 +1,149 @@
+'''
+Code for building a library of warm simulation states, so training episodes can start in the middle of a day
+
+Every reset of WAREHOUSE starts a new simulation at t_start with empty queues and idle resources, so a large part of
+every episode is the same ramp-up. This script pre-simulates episodes with a base heuristic on a pool of worker
+processes and stores the simulation at several times of day as compressed snapshots. With warm_start set to the
+library file in the environment section of the scenario config, reset continues a sampled snapshot for a share of
+the episodes (warm_start_share) and the agent spends its steps in the congested part of the day.
+
+Usage:
+    python warm_start.py scenario_2 --episodes 20 --times 15.5 16 16.5 --heuristic BOC --workers 4
+'''
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import argparse
+import pickle
+import random
+import zlib
+import os
+import numpy as np
+
+from simulation_model.ScenarioConfig import ScenarioConfig
+
+# Scenario config and order index of a worker process, built once by init_worker
+worker = {}
+
+
+class WarmStartLibrary:
+    '''
+    Compressed snapshots of simulations of a scenario at several times of day. A snapshot is a pickled
+    WAREHOUSESimulation, so every sample is a new simulation that continues exactly where the snapshot was taken.
+    Snapshots are drawn with the global numpy random state, so np.random.seed makes the sampled start reproducible.
+
+    Args:
+            snapshots (list): (time in seconds, compressed pickle) of every snapshot
+            scenario (str): name of the scenario of the simulations
+            throughput (int): number of orders of the simulated episodes
+            heuristic (str): base heuristic that made the batching decisions up to the snapshots
+    '''
+
+    def __init__(self, snapshots, scenario, throughput, heuristic=None):
+        self.snapshots = snapshots
+        self.scenario = scenario
+        self.throughput = throughput
+        self.heuristic = heuristic
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def times(self):
+        return np.array([t for t, snapshot in self.snapshots])
+
+    def sample(self):
+        t, snapshot = self.snapshots[np.random.randint(len(self.snapshots))]
+        return pickle.loads(zlib.decompress(snapshot))
+
+    def check(self, config):
+        # A library only fits environments with the scenario and throughput of its episodes
+        if self.scenario != config.name or self.throughput != config['environment']['throughput']:
+            raise ValueError('warm start library of {0} with {1} orders does not fit {2} with {3} orders'.format(
+                self.scenario, self.throughput, config.name, config['environment']['throughput']))
+        if len(self.snapshots) == 0:
+            raise ValueError('warm start library of {0} has no snapshots'.format(self.scenario))
+
+    def save(self, path):
+        # Stored as a dict, so the file does not depend on the module that built the library
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as file:
+            pickle.dump({'snapshots': self.snapshots, 'scenario': self.scenario, 'throughput': self.throughput,
+                         'heuristic': self.heuristic}, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            return WarmStartLibrary(**pickle.load(file))
+
+
+def snapshot(sim):
+    return zlib.compress(pickle.dumps(sim, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def init_worker(scenario, order_path):
+    from order_generator import read_orders
+    from order_index import OrderIndex
+    worker['config'] = ScenarioConfig.load(scenario)
+    worker['order_index'] = OrderIndex(read_orders(order_path))
+
+
+def simulate_episode(heuristic, times, seed):
+    # Snapshots of one episode of the base heuristic, taken at the first decision at or after every time (hours)
+    from simulation_model.WAREHOUSESimulation import WAREHOUSESimulation
+    config = worker['config']
+    random.seed(seed)
+    np.random.seed(seed)
+    data = worker['order_index'].sample(config['environment']['throughput'], config['environment']['time_window'])
+    sim = WAREHOUSESimulation(config, data, config['environment']['t_start'], (1, 1), heuristic)
+
+    pending = sorted(time * 3600 for time in times)
+    snapshots = []
+    state = sim.get_state()
+    while pending and not sim.check_termination():
+        t = sim.state_representation[-1]
+        if t >= pending[0]:
+            snapshots.append((t, snapshot(sim)))
+            pending = [time for time in pending if time > t]
+            continue
+        action = sim.edd_sequencing(state)
+        sim.get_reward(action)
+        state = sim.simulate(action)
+    return snapshots
+
+
+def build_library(scenario='scenario_2', heuristic='BOC', episodes=20, times=(15.5, 16, 16.5), seed=0, n_workers=4,
+                  order_path=r'data/dummy_order_data.csv'):
+    config = ScenarioConfig.load(scenario)
+
+    # Spawned workers, every worker loads the order data once
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=init_worker,
+                             initargs=(scenario, order_path)) as executor:
+        results = list(executor.map(simulate_episode, [heuristic] * episodes, [times] * episodes,
+                                    range(seed, seed + episodes)))
+
+    snapshots = [snapshot for episode in results for snapshot in episode]
+    return WarmStartLibrary(snapshots, config.name, config['environment']['throughput'], heuristic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a warm start library of simulation snapshots')
+    parser.add_argument('scenario', nargs='?', default='scenario_2')
+    parser.add_argument('--heuristic', default='BOC', help='base heuristic of the pre-simulated episodes')
+    parser.add_argument('--episodes', type=int, default=20)
+    parser.add_argument('--times', type=float, nargs='+', default=[15.5, 16, 16.5], help='snapshot times in hours')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--orders', default=r'data/dummy_order_data.csv')
+    parser.add_argument('--output', default=None, help='default warm_states/<scenario>.pkl')
+    args = parser.parse_args()
+
+    heuristic = None if args.heuristic == 'None' else args.heuristic
+    library = build_library(args.scenario, heuristic, args.episodes, args.times, args.seed, args.workers,
+                            args.orders)
+    output = args.output or os.path.join('warm_states', args.scenario + '.pkl')
+    library.save(output)
+    print('{0} snapshots of {1} episodes saved to {2}'.format(len(library), args.episodes, output))
+
+
+if __name__ == '__main__':
+    main()